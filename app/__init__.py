@@ -11,10 +11,10 @@ from app.extensions import login_manager, bcrypt, socketio, init_app as init_ext
 from oauthlib.oauth2 import WebApplicationClient
 import requests
 import json
-from datetime import datetime
-from bson.objectid import ObjectId
+from datetime import datetime, timedelta
 from app.models.notifications import Notification
 from app.models.users import User
+from app.utils.user_loader import get_user
 from flask_apscheduler import APScheduler # Import APScheduler
 
 # Google OAuth Configuration
@@ -73,10 +73,92 @@ def create_app(config_class=None):
             process_payouts.callback() # Call the underlying function of the click command
             current_app.logger.info("Scheduled payout processing completed.")
 
+    # Search box autocomplete: the in-memory index is built on the first lookup
+    # in each worker and periodically rebuilt to pick up other workers' writes.
+    from app.services.autocomplete_service import autocomplete_service
+    autocomplete_service.init_app(app)
+
+    # Marketplace pages and filter counts are cached per filter set; listing
+    # writes bump the cache generation
+    from app.services.marketplace_cache import marketplace_cache
+    marketplace_cache.init_app(app)
+
+    @scheduler.task('interval', id='rebuild_autocomplete_index', minutes=10, misfire_grace_time=300)
+    def scheduled_rebuild_autocomplete_index():
+        with app.app_context():
+            autocomplete_service.refresh()
+
+    # Header badge: unread notification counters are kept on the user
+    # document and periodically reconciled against the notifications
+    from app.services.notification_counter import notification_counter
+    notification_counter.init_app(app)
+
+    # Online presence is tracked in memory; last_seen and online_until are written in batches
+    from app.services.presence_service import presence_tracker
+    presence_tracker.init_app(app)
+
+    @scheduler.task('interval', id='flush_presence', minutes=1, misfire_grace_time=60)
+    def scheduled_flush_presence():
+        with app.app_context():
+            presence_tracker.flush()
+
+    # Every worker schedules the job; the first to claim the hour runs it
+    @scheduler.task('interval', id='reconcile_notification_counters', hours=1, misfire_grace_time=900)
+    def scheduled_reconcile_notification_counters():
+        with app.app_context():
+            from app.models.watermarks import Watermark
+            if not Watermark.claim_interval('reconcile_notification_counters', timedelta(hours=1)):
+                return
+            corrected = notification_counter.reconcile()
+            if corrected:
+                current_app.logger.warning(f"Reconciled unread notification counters for {corrected} users")
+
+    from app.services.session_principal import session_principals
+    session_principals.init_app(app)
+
+    # Follower timelines are written by the job worker when listings are created
+    from app.services.timeline_service import timeline_service
+    timeline_service.init_app(app)
+
+    # Recommendations score listings against an in-memory feature matrix.
+    # Every worker runs the job each minute: the one that claims the rebuild
+    # interval scans the listings and publishes the matrix, the others load it.
+    @scheduler.task('interval', id='sync_listing_features', minutes=1, misfire_grace_time=60)
+    def scheduled_sync_listing_features():
+        with app.app_context():
+            from app.services.recommendation_service import listing_features
+            rebuilt = listing_features.sync()
+            if rebuilt:
+                count, seconds = rebuilt
+                current_app.logger.info(f"Rebuilt recommendation features for {count} listings in {seconds:.2f}s")
+
+    # Activity logging is buffered and written in batches by a background thread
+    from app.services.activity_writer import activity_writer
+    activity_writer.init_app(app)
+
+    # Raw activity expires (TTL index); per-day rollups are kept. Today is
+    # rolled up through the day and yesterday once more to pick up late writes.
+    # Every worker schedules the job; the first to claim the hour runs it.
+    @scheduler.task('interval', id='rollup_user_activity', hours=1, misfire_grace_time=900)
+    def scheduled_rollup_user_activity():
+        with app.app_context():
+            from app.models.activity_rollups import ActivityRollup
+            from app.models.watermarks import Watermark
+            if not Watermark.claim_interval('rollup_user_activity', timedelta(hours=1)):
+                return
+            today = ActivityRollup.day_start(datetime.utcnow())
+            ActivityRollup.rollup(
+                today - timedelta(days=1),
+                today + timedelta(days=1),
+                retention=timedelta(days=app.config['ACTIVITY_RETENTION_DAYS'])
+            )
+
     @login_manager.user_loader
     def load_user(user_id):
         try:
-            return User.objects(id=ObjectId(user_id)).first()
+            # A cached, projected principal; the full User only loads if a
+            # route touches a field the principal does not carry
+            return session_principals.load(user_id)
         except Exception as e:
             app.logger.error(f"Error loading user {user_id}: {e}")
             return None
@@ -90,8 +172,8 @@ def create_app(config_class=None):
         @app.context_processor
         def inject_notifications():
             if current_user.is_authenticated:
-                unread_count = Notification.objects(user=current_user.id, is_read=False).count()
-                return dict(unread_notifications=unread_count)
+                # Maintained by notification_counter, so the badge costs no queries
+                return dict(unread_notifications=max(current_user.unread_notifications or 0, 0))
             return dict(unread_notifications=0)
 
         @app.errorhandler(403)
@@ -230,8 +312,7 @@ def create_app(config_class=None):
     @socketio.on('connect')
     def handle_connect():
         if current_user.is_authenticated:
-            current_user.last_seen = datetime.utcnow()
-            current_user.save()
+            presence_tracker.connect(current_user.id)
             socketio.join_room(str(current_user.id))
             current_app.logger.info(f"Client connected: {current_user.username} (ID: {current_user.id})")
         else:
@@ -240,8 +321,7 @@ def create_app(config_class=None):
     @socketio.on('disconnect')
     def handle_disconnect():
         if current_user.is_authenticated:
-            current_user.last_seen = datetime.utcnow()
-            current_user.save()
+            presence_tracker.disconnect(current_user.id)
             socketio.leave_room(str(current_user.id))
             current_app.logger.info(f"Client disconnected: {current_user.username} (ID: {current_user.id})")
         else:
@@ -250,7 +330,7 @@ def create_app(config_class=None):
     @socketio.on('send_message')
     def handle_send_message(data):
         from app.models.messages import Message
-        from app.models.users import User
+        from app.models.conversations import Conversation
 
         sender_id = data.get('sender_id')
         recipient_id = data.get('recipient_id')
@@ -261,8 +341,8 @@ def create_app(config_class=None):
             return
 
         try:
-            sender = User.objects(id=sender_id).first()
-            recipient = User.objects(id=recipient_id).first()
+            sender = get_user(sender_id)
+            recipient = get_user(recipient_id)
 
             if not (sender and recipient):
                 current_app.logger.warning(f"Sender or recipient not found. Sender ID: {sender_id}, Recipient ID: {recipient_id}")
@@ -274,6 +354,7 @@ def create_app(config_class=None):
                 content=message_content
             )
             new_message.save()
+            Conversation.record_message(new_message)
 
             message_data = new_message.to_dict()
 
@@ -291,11 +372,10 @@ def create_app(config_class=None):
     def handle_mark_notification_read(data):
         notification_id = data.get('notification_id')
         if notification_id and current_user.is_authenticated:
-            notification = Notification.objects(id=notification_id, user=current_user.id).first()
-            if notification and not notification.is_read:
-                notification.is_read = True
-                notification.save()
-                unread_count = Notification.objects(user=current_user.id, is_read=False).count()
+            # Only the request that actually flips is_read decrements the counter
+            if Notification.objects(id=notification_id, user=current_user.id, is_read=False).update_one(set__is_read=True):
+                notification_counter.decr(current_user.id)
+                unread_count = notification_counter.get(current_user.id)
                 socketio.emit('update_notification_count', {'count': unread_count}, room=str(current_user.id))
                 current_app.logger.info(f"Notification {notification_id} marked as read for user {current_user.id}")
             else:
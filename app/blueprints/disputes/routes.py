@@ -62,7 +62,7 @@ def raise_dispute(entity_type, entity_id):
             # flash('Listing is not related to either party.', 'danger')
 
         dispute = Dispute(
-            initiator=current_user,
+            initiator=current_user.id,
             respondent=respondent,
             listing=listing,
             reason=reason,
@@ -96,8 +96,8 @@ def my_disputes():
     """
     Displays disputes initiated by or involving the current user.
     """
-    initiated_disputes = Dispute.objects(initiator=current_user).order_by('-date_raised')
-    received_disputes = Dispute.objects(respondent=current_user).order_by('-date_raised')
+    initiated_disputes = Dispute.objects(initiator=current_user.id).order_by('-date_raised')
+    received_disputes = Dispute.objects(respondent=current_user.id).order_by('-date_raised')
     
     return render_template('disputes/my_disputes.html', 
                            title='My Disputes', 
@@ -1,18 +1,52 @@
-from flask import render_template, Blueprint, flash, redirect, url_for, request
+from flask import render_template, Blueprint, flash, redirect, url_for, request, current_app
 from flask_login import login_required, current_user
 from app.blueprints.feeds import feeds_bp
 from app.models.user_activity import UserActivity
+from app.models.activity_rollups import ActivityRollup
+from app.utils.cache import TTLCache
+from app.utils.pagination import paginate_keyset, InvalidCursor
 from mongoengine.queryset.visitor import Q # Import Q for complex queries
 from datetime import datetime # Import datetime
 
 FEEDS_PER_PAGE = 20 # Define pagination constant
 
+# Sort options offered by the feed, each ending in the id so the keyset cursor
+# is unique, and each backed by an index on user_activities
+FEED_SORTS = {
+    '-timestamp': ('-timestamp', '-id'),
+    'timestamp': ('timestamp', 'id'),
+    'action_type': ('action_type', '-timestamp', '-id'),
+}
+DEFAULT_FEED_SORT = '-timestamp'
+
+# The action-type vocabulary only grows when a new kind of activity is logged,
+# so each worker refreshes it every few minutes instead of on every page load
+ACTION_TYPES_TTL = 300
+_action_types_cache = TTLCache(maxsize=1, ttl=ACTION_TYPES_TTL)
+
+
+def get_action_types():
+    """The distinct activity types for the filter dropdown, cached per worker."""
+    action_types = _action_types_cache.get('action_types')
+    if action_types is None:
+        try:
+            action_types = ActivityRollup.action_types()
+        except Exception as e:
+            current_app.logger.error(f"Failed to load activity types: {e}")
+            return []
+        _action_types_cache.set('action_types', action_types)
+    return action_types
+
+
 @feeds_bp.route('/')
 @login_required
 def index():
-    page = request.args.get('page', 1, type=int)
     activity_type = request.args.get('activity_type', 'all')
-    sort_by = request.args.get('sort_by', '-timestamp') # Default to newest first
+    sort_by = request.args.get('sort_by', DEFAULT_FEED_SORT) # Default to newest first
+    if sort_by not in FEED_SORTS:
+        sort_by = DEFAULT_FEED_SORT
+    after = request.args.get('after') or None
+    before = request.args.get('before') or None
 
     query = Q()
 
@@ -21,16 +55,17 @@ def index():
 
     # Add more filtering options here if needed, e.g., by user, by specific payload data
 
-    activities_pagination = UserActivity.objects(query).order_by(sort_by).paginate(page=page, per_page=FEEDS_PER_PAGE)
-
-    # Get distinct activity types for filter dropdown
-    distinct_activity_types = UserActivity.objects.distinct('action_type')
-    distinct_activity_types.sort() # Sort alphabetically
+    activities = UserActivity.objects(query)
+    try:
+        activities_page = paginate_keyset(activities, FEED_SORTS[sort_by], FEEDS_PER_PAGE, after=after, before=before)
+    except InvalidCursor as e:
+        current_app.logger.warning(f"Ignoring invalid feed cursor: {e}")
+        activities_page = paginate_keyset(activities, FEED_SORTS[sort_by], FEEDS_PER_PAGE)
 
     return render_template('feeds/index.html',
-                           activities_pagination=activities_pagination,
+                           activities_page=activities_page,
                            title='Activity Feed',
                            current_activity_type=activity_type,
                            current_sort_by=sort_by,
-                           distinct_activity_types=distinct_activity_types,
+                           distinct_activity_types=get_action_types(),
                            datetime=datetime) # Pass datetime to the template
@@ -2,6 +2,9 @@ from flask import Blueprint, flash, redirect, url_for, render_template
 from flask_login import login_required, current_user
 from app.models.users import User
 from app.models.follows import Follow
+from app.models.listings import Listing
+from app.services.job_queue import job_queue
+from app.services.timeline_service import timeline_service
 from mongoengine.errors import NotUniqueError
 
 follows_bp = Blueprint('follows', __name__)
@@ -18,6 +21,8 @@ def follow_user(user_id):
     try:
         follow = Follow(follower=current_user.id, followed=user_to_follow.id)
         follow.save()
+        # Their recent listings are added to this user's timeline in the background
+        job_queue.enqueue('timeline.backfill', follower_id=str(current_user.id), followed_id=str(user_to_follow.id))
         flash(f'You are now following {user_to_follow.username}!', 'success')
     except NotUniqueError:
         flash(f'You are already following {user_to_follow.username}.', 'info')
@@ -39,6 +44,7 @@ def unfollow_user(user_id):
         follow = Follow.objects(follower=current_user.id, followed=user_to_unfollow.id).first()
         if follow:
             follow.delete()
+            timeline_service.remove_author(current_user.id, user_to_unfollow.id)
             flash(f'You have unfollowed {user_to_unfollow.username}.', 'success')
         else:
             flash(f'You are not following {user_to_unfollow.username}.', 'info')
@@ -50,5 +56,5 @@ def unfollow_user(user_id):
 @follows_bp.route('/feed')
 @login_required
 def feed():
-    listings = current_user.get_followed_users_listings()
+    listings = Listing.to_dicts(current_user.get_followed_users_listings())
     return render_template('follows/feed.html', listings=listings, title='Your Feed')
\ No newline at end of file
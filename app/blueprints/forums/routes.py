@@ -55,14 +55,14 @@ def new_topic():
         topic = Topic(
             title=form.title.data,
             forum=forum,
-            author=current_user._get_current_object()
+            author=current_user.id
         )
         topic.save()
 
         post = Post(
             content=form.content.data,
             topic=topic,
-            author=current_user._get_current_object()
+            author=current_user.id
         )
         post.save()
 
@@ -89,7 +89,7 @@ def new_post(topic_id):
         post = Post(
             content=form.content.data,
             topic=topic,
-            author=current_user._get_current_object()
+            author=current_user.id
         )
         post.save()
 
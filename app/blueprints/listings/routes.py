@@ -4,7 +4,6 @@ from flask_login import login_required, current_user
 from app.models.listings import Listing
 from app.models.users import User
 from app.models.wishlist import WishlistItem
-from app.models.saved_search import SavedSearch
 from app.extensions import db, csrf
 from app.blueprints.listings.forms import ListingForm, BulkUploadForm # Update this import
 from app.blueprints.payments.forms import ProcessPaymentForm
@@ -12,7 +11,6 @@ from werkzeug.utils import secure_filename
 import os
 import secrets
 import json
-from urllib.parse import parse_qs
 from app.models.swaps import SwapRequest # Import SwapRequest model
 from app.models.orders import Order # Import Order model
 from app.models.donations import Donation # Import Donation model
@@ -25,11 +23,21 @@ from PIL import Image # Import Image from Pillow
 # Import the add_notification helper function
 from app.blueprints.notifications.routes import add_notification
 # Import the activity logger
-from app.utils.activity_logger import log_activity
+from app.utils.activity_logger import log_activity, get_client_ip
 from app.utils.security import roles_required # Import roles_required
 from app.services.fraud_detection_service import FraudDetectionService
 from app.services.paystack import PaystackService # Import PaystackService
 from app.services.recommendation_service import RecommendationService # Import RecommendationService
+from app.services.search_service import SearchService, search_service
+from app.services.autocomplete_service import autocomplete_service
+from app.services.facet_service import facet_service
+from app.services.marketplace_cache import marketplace_cache
+from app.services.listing_jobs import enqueue_listing_created
+from app.services.timeline_service import timeline_service
+from app.utils.pagination import paginate_keyset, paginate_ranked, InvalidCursor
+
+# Sort order for the marketplace grid; backed by the Listing marketplace index.
+MARKETPLACE_SORT = ('-is_premium', '-date_posted', '-id')
 
 listings_bp = Blueprint('listings', __name__)
 
@@ -135,56 +143,16 @@ def create_listing():
                         color=listing_data.get('color'),
                         image_files=listing_data.get('image_files', ['default.jpg']),
                         is_premium=listing_data.get('is_premium', False),
-                        user=current_user
+                        user=current_user.id
                     )
                     listing.save()
-                    FraudDetectionService.analyze_listing_for_suspicion(listing.id)
+                    # Fraud checks, activity logging and saved-search notifications
+                    # run on the job worker so the redirect is not held up
+                    enqueue_listing_created(listing, ip_address=get_client_ip(request))
 
                     flash('Your listing has been created!', 'success')
                     session.pop('listing_data', None)
 
-                    log_activity(
-                        user_id=current_user.id,
-                        action_type='listing_created',
-                        description=f"Created new listing: '{listing.title}' (ID: {listing.id})",
-                        payload={'listing_id': str(listing.id), 'listing_type': listing.listing_type},
-                        request_obj=request
-                    )
-
-                    all_saved_searches = SavedSearch.objects()
-                    for saved_search in all_saved_searches:
-                        saved_params = parse_qs(saved_search.search_query_params)
-                        match = True
-                        if 'search_term' in saved_params and not any(term.lower() in (listing.title.lower() or '') or term.lower() in (listing.description.lower() or '') or term.lower() in (listing.school_name.lower() or '') or term.lower() in (listing.brand.lower() or '') for term in saved_params['search_term']):
-                            match = False
-                        if 'location' in saved_params and saved_params['location'][0].lower() not in listing.location.lower():
-                            match = False
-                        if 'uniform_type' in saved_params and saved_params['uniform_type'][0] != 'All' and saved_params['uniform_type'][0] != listing.uniform_type:
-                            match = False
-                        if 'brand' in saved_params and saved_params['brand'][0] != 'All' and saved_params['brand'][0].lower() not in (listing.brand or '').lower():
-                            match = False
-                        if 'color' in saved_params and saved_params['color'][0] != 'All' and saved_params['color'][0].lower() not in (listing.color or '').lower():
-                            match = False
-                        if 'condition' in saved_params and saved_params['condition'][0] != 'All' and saved_params['condition'][0] != listing.condition:
-                            match = False
-                        if 'listing_type' in saved_params and saved_params['listing_type'][0] != 'All' and saved_params['listing_type'][0] != listing.listing_type:
-                            match = False
-                        if 'gender' in saved_params and saved_params['gender'][0] != 'All' and saved_params['gender'][0] != listing.gender:
-                            match = False
-                        if 'size' in saved_params and saved_params['size'][0] != 'All' and saved_params['size'][0] != listing.size:
-                            match = False
-                        if 'min_price' in saved_params and listing.price is not None and float(saved_params['min_price'][0]) > listing.price:
-                            match = False
-                        if 'max_price' in saved_params and listing.price is not None and float(saved_params['max_price'][0]) < listing.price:
-                            match = False
-                        if match and saved_search.user.id != current_user.id:
-                            add_notification(
-                                user_id=saved_search.user.id,
-                                message=f"New listing matching your saved search '{saved_search.name or 'Unnamed Search'}': {listing.title}",
-                                notification_type='saved_search_match',
-                                payload={'listing_id': str(listing.id)}
-                            )
-
                     return redirect(url_for('listings.dashboard'))
                 except NotUniqueError as e:
                     flash('A listing with this title already exists. Please choose a different title.', 'danger')
@@ -215,7 +183,7 @@ def create_listing():
 @login_required
 def edit_listing(listing_id):
     listing = Listing.objects(id=listing_id).first_or_404()
-    if listing.user != current_user:
+    if listing.owner_id != current_user.id:
         flash('You do not have permission to edit this listing.', 'danger')
         return redirect(url_for('listings.listing_detail', listing_id=listing.id))
 
@@ -284,7 +252,7 @@ def edit_listing(listing_id):
 def initiate_premium_payment(listing_id):
     listing = Listing.objects(id=listing_id).first_or_404()
 
-    if listing.user != current_user:
+    if listing.owner_id != current_user.id:
         flash('You do not have permission to make this listing premium.', 'danger')
         return redirect(url_for('listings.listing_detail', listing_id=listing.id))
 
@@ -321,7 +289,7 @@ def initiate_premium_payment(listing_id):
 def verify_premium_payment(listing_id):
     listing = Listing.objects(id=listing_id).first_or_404()
 
-    if listing.user != current_user:
+    if listing.owner_id != current_user.id:
         flash('You do not have permission to verify payment for this listing.', 'danger')
         return redirect(url_for('listings.listing_detail', listing_id=listing.id))
 
@@ -417,7 +385,7 @@ def bulk_upload():
                     brand=brand,
                     color=color,
                     image_files=['default.jpg'], # Default image for bulk uploads
-                    user=current_user
+                    user=current_user.id
                 )
                 listing.save()
                 successful_uploads += 1
@@ -441,14 +409,8 @@ def search_suggestions():
     if not query:
         return jsonify([])
 
-    # Search for titles, descriptions, school names, brands that match the query
-    # Using distinct() to avoid duplicates
-    titles = [listing.title for listing in Listing.objects(title__icontains=query).limit(5)]
-    descriptions = [listing.description for listing in Listing.objects(description__icontains=query).limit(5)]
-    school_names = [listing.school_name for listing in Listing.objects(school_name__icontains=query).limit(5) if listing.school_name]
-    brands = [listing.brand for listing in Listing.objects(brand__icontains=query).limit(5) if listing.brand]
-
-    suggestions = list(set(titles + descriptions + school_names + brands))
+    # Served from the in-memory prefix index; no database round trip per keystroke
+    suggestions = autocomplete_service.suggest(query, limit=10)
     return jsonify(suggestions)
 
 @listings_bp.route("/marketplace")
@@ -461,13 +423,12 @@ def marketplace():
 
     # --- Search and Filtering Logic ---
     search_term = request.args.get('search_term')
-    if search_term:
-        query = query.filter(
-            Q(title__icontains=search_term) |
-            Q(description__icontains=search_term) |
-            Q(school_name__icontains=search_term) |
-            Q(brand__icontains=search_term)
-        )
+    sort_by = request.args.get('sort_by', SearchService.SORT_NEWEST)
+    if sort_by not in SearchService.SORT_OPTIONS:
+        sort_by = SearchService.SORT_NEWEST
+    if search_service.normalise_term(search_term) is None:
+        # Relevance only makes sense with something to rank against
+        sort_by = SearchService.SORT_NEWEST
 
     location_filter = request.args.get('location')
     if location_filter:
@@ -508,16 +469,38 @@ def marketplace():
     if max_price is not None:
         query = query.filter(price__lte=max_price)
     
-    premium_listings = list(query.filter(is_premium=True).order_by('-date_posted'))
-    
-    non_premium_listings = list(query.filter(is_premium=False).order_by('-date_posted'))
+    per_page = 12
+    after = request.args.get('after')
+    before = request.args.get('before')
+    filters = marketplace_cache.normalise_filters(request.args)
+    cache_key = marketplace_cache.page_key(filters, sort_by, after=after, before=before)
+    listings_page = marketplace_cache.get_page(cache_key)
+
+    if listings_page is None:
+        if sort_by == SearchService.SORT_RELEVANCE:
+            query = search_service.rank(query, search_term)
+        else:
+            query = search_service.filter(query, search_term)
 
-    listings = premium_listings + non_premium_listings
+        def fetch_page(after=None, before=None):
+            if sort_by == SearchService.SORT_RELEVANCE:
+                return paginate_ranked(query, per_page=per_page, after=after, before=before)
+            # Premium listings first, newest first, with the id as a tie-breaker so
+            # the keyset cursor always points at a single document.
+            return paginate_keyset(query, sort=MARKETPLACE_SORT, per_page=per_page, after=after, before=before)
 
-    page = request.args.get('page', 1, type=int)
-    per_page = 12
-    paginated_listings = listings[(page - 1) * per_page : page * per_page]
-    total_pages = (len(listings) + per_page - 1) // per_page
+        try:
+            listings_page = fetch_page(after=after, before=before)
+        except InvalidCursor as e:
+            current_app.logger.warning(f"Ignoring invalid marketplace cursor: {e}")
+            listings_page = fetch_page()
+
+        # Serialise for the template with the owners loaded in one batch
+        listings_page = listings_page.freeze(Listing.to_dicts(listings_page.items))
+        marketplace_cache.set_page(cache_key, listings_page)
+
+    # Filters to carry over into the Previous/Next links (cursors are added per link)
+    pagination_args = {k: v for k, v in request.args.items() if k not in ('after', 'before', 'page')}
 
     uniform_types = ['All', 'School Uniform', 'Sports Kit', 'Casual Wear', 'Formal Wear']
     conditions = ['All', 'New', 'Used - Like New', 'Used - Good', 'Used - Fair', 'Used - Poor']
@@ -527,20 +510,37 @@ def marketplace():
     brands = ['All', 'Nike', 'Adidas', 'Puma', 'Under Armour', 'Reebok', 'School Brand', 'Other']
     colors = ['All', 'Red', 'Blue', 'Green', 'Yellow', 'Black', 'White', 'Grey', 'Brown', 'Pink', 'Purple', 'Orange', 'Multi-color']
 
-    # Prepare listings for template, ensuring image_files is handled
-    listings_for_template = []
-    for listing in paginated_listings:
-        listing_dict = listing.to_dict() # Use the custom to_dict method
-        # Ensure image_file is set to the first image in image_files for compatibility
-        listing_dict['image_file'] = listing.image_files[0] if listing.image_files else 'default.jpg'
-        listings_for_template.append(listing_dict)
+    # Per-value counts for the filter dropdowns, from one cached $facet aggregation.
+    # The lists above are only used, without counts, if the aggregation fails.
+    try:
+        facets = facet_service.get_facets(filters)
+    except Exception as e:
+        current_app.logger.error(f"Failed to compute marketplace facets: {e}")
+        facets = None
+
+    def facet_options(field, defaults, selected):
+        if facets is None:
+            return [(value, None) for value in defaults]
+        options = [('All', None)] + facets[field]
+        if selected and selected != 'All' and selected not in [value for value, _ in options]:
+            options.insert(1, (selected, 0))
+        return options
+
+    uniform_types = facet_options('uniform_type', uniform_types, uniform_type_filter)
+    conditions = facet_options('condition', conditions, condition_filter)
+    listing_types = facet_options('listing_type', listing_types, listing_type_filter)
+    genders = facet_options('gender', genders, gender_filter)
+    sizes = facet_options('size', sizes, size_filter)
+    brands = facet_options('brand', brands, brand_filter)
+    colors = facet_options('color', colors, color_filter)
 
     return render_template(
         'listings/marketplace.html',
-        listings=listings_for_template, # Pass the modified list
-        page=page,
-        total_pages=total_pages,
+        listings=listings_page.items, # Serialised listing dicts
+        listings_page=listings_page,
+        pagination_args=pagination_args,
         search_term=search_term if search_term else '',
+        sort_by=sort_by,
         location_filter=location_filter if location_filter else '',
         uniform_type_filter=uniform_type_filter if uniform_type_filter else 'All',
         brand_filter=brand_filter if brand_filter else 'All',
@@ -586,6 +586,16 @@ def listing_detail(listing_id):
         if listing.user.id == current_user.id:
             is_owner = True
     
+    # Viewing history feeds the recommendation engine
+    if current_user.is_authenticated and not is_owner:
+        log_activity(
+            user_id=current_user.id,
+            action_type='viewed_listing',
+            description=f"Viewed listing: '{listing.title}' (ID: {listing.id})",
+            payload={'listing_id': str(listing.id)},
+            request_obj=request
+        )
+
     process_payment_form = ProcessPaymentForm() # Instantiate the form
     
     return render_template('listings/listing_detail.html', 
@@ -616,7 +626,7 @@ def delete_listing(listing_id):
     #     return redirect(url_for('listings.dashboard')) # Or a more appropriate error page
 
     listing = Listing.objects(id=listing_id).first_or_404()
-    if listing.user != current_user:
+    if listing.owner_id != current_user.id:
         flash('You do not have permission to delete this listing.', 'danger')
         return redirect(url_for('listings.dashboard'))
     
@@ -645,7 +655,6 @@ def delete_listing(listing_id):
     return redirect(url_for('listings.dashboard'))
 
 from app.models.follows import Follow # Import Follow model
-from app.models.user_activity import UserActivity # Import UserActivity model
 
 @listings_bp.route("/dashboard")
 @login_required
@@ -657,21 +666,13 @@ def dashboard():
     user_role = current_user.role
     listings = Listing.objects(user=current_user.id).order_by('-date_posted')
 
-    # Fetch followed users' IDs
-    followed_users = Follow.objects(follower=current_user.id)
-    followed_user_ids = [follow.followed.id for follow in followed_users]
-
-    # Fetch recent activities (e.g., new listings) from followed users
-    recent_activities = []
-    if followed_user_ids:
-        recent_activities = UserActivity.objects(
-            user__in=followed_user_ids,
-            action_type='listing_created'
-        ).order_by('-timestamp').limit(10) # Limit to 10 recent activities
+    # Recent new listings from followed users, read from the user's timeline.
+    # Entries are dicts: listing, author, action_type, description, created_at
+    recent_activities = timeline_service.get_entries(current_user.id, limit=10)
 
     # Get personalized recommendations
     recommendation_service = RecommendationService()
-    recommended_listings = recommendation_service.get_recommendations(current_user)
+    recommended_listings = Listing.to_dicts(recommendation_service.get_recommendations(current_user))
 
     if user_role == 'parent':
         # Fetch pending and accepted swaps for the current user
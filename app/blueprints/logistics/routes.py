@@ -88,7 +88,7 @@ def setup_logistics(transaction_type, transaction_id):
         logistics = Logistics(
             transaction_id=transaction_id,
             transaction_type=transaction_type,
-            sender=current_user._get_current_object(), # The user setting up logistics
+            sender=current_user.id, # The user setting up logistics
             receiver=User.objects(id=receiver_id).first(), # The other party
             shipping_method=form.shipping_method.data,
             courier_name=form.courier_name.data,
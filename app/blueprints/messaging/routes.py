@@ -1,13 +1,75 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
 from flask_login import login_required, current_user
 from app.models.messages import Message
+from app.models.conversations import Conversation
 from app.models.users import User # Import User model to fetch sender/receiver info
 from app.extensions import db
 from mongoengine.queryset.visitor import Q # Import Q for complex queries
+from app.utils.pagination import paginate_keyset, InvalidCursor
+from app.services.presence_service import presence_tracker
 from .forms import MessageForm # Import the new MessageForm
 
 messaging_bp = Blueprint('messaging', __name__)
 
+# Thread history pages: newest first, backed by the Message (pair_key, -timestamp, -id) index
+MESSAGE_HISTORY_SORT = ('-timestamp', '-id')
+MESSAGES_PER_PAGE = 30
+MAX_MESSAGES_PER_PAGE = 100
+
+def _conversation_partners(conversations):
+    """
+    Returns the other participant of each conversation, in the same order,
+    loaded with a single projected query.
+    """
+    partner_ids = [conversation.partner_id(current_user.id) for conversation in conversations]
+    partners = {user.id: user for user in User.objects(id__in=partner_ids).only('id', 'username', 'image_file')}
+    return [partners[partner_id] for partner_id in partner_ids if partner_id in partners]
+
+def _thread_messages(partner_id):
+    """
+    The messages between the current user and partner_id, unloaded references.
+    Messages stored before pair_key existed are matched by sender and
+    receiver until Message.backfill_pair_keys (rebuild-conversations) has run.
+    """
+    legacy = Q(pair_key__exists=False) & (
+        (Q(sender=current_user.id) & Q(receiver=partner_id)) |
+        (Q(sender=partner_id) & Q(receiver=current_user.id))
+    )
+    return Message.objects(Q(pair_key=Conversation.make_pair_key(current_user.id, partner_id)) | legacy).no_dereference()
+
+def _thread_page(partner_id, limit=MESSAGES_PER_PAGE, before=None):
+    """
+    One page of the thread, newest first, keyset on (timestamp, _id) over the
+    (pair_key, -timestamp, -id) index. Raises InvalidCursor for a bad `before`.
+    """
+    return paginate_keyset(_thread_messages(partner_id), MESSAGE_HISTORY_SORT, limit, after=before)
+
+def mark_thread_read(partner_id):
+    """
+    Marks every unread message from partner_id to the current user as read with
+    one update_many, clears the conversation's unread counter and sends the
+    partner a single 'messages_read' read receipt for the whole batch.
+    Returns the number of messages marked.
+    """
+    from flask import current_app
+    from datetime import datetime
+    from app.extensions import socketio
+
+    marked = Message.objects(sender=partner_id, receiver=current_user.id, read_status=False).update(set__read_status=True)
+    if not marked:
+        return 0
+
+    Conversation.mark_read(current_user.id, partner_id)
+    try:
+        socketio.emit(
+            'messages_read',
+            {'reader_id': str(current_user.id), 'count': marked, 'read_at': datetime.utcnow().isoformat() + 'Z'},
+            room=str(partner_id)
+        )
+    except Exception as e:
+        current_app.logger.error(f"Error emitting read receipt to user {partner_id}: {e}")
+    return marked
+
 @messaging_bp.route('/inbox')
 @login_required
 def inbox():
@@ -15,48 +77,26 @@ def inbox():
     Displays the user's inbox, showing a list of active conversations
     and the messages within a selected conversation.
     """
-    # Get all unique users current_user has exchanged messages with
-    sender_users = Message.objects(receiver=current_user).distinct('sender')
-    receiver_users = Message.objects(sender=current_user).distinct('receiver')
-
-    # Combine results and exclude current_user themselves
-    conversation_partners = list(set(sender_users + receiver_users))
-    if current_user in conversation_partners:
-        conversation_partners.remove(current_user)
-
-    # Sort conversations by the latest message
-    sorted_partners = []
-    for partner in conversation_partners:
-        latest_message = Message.objects(
-            (Q(sender=current_user) & Q(receiver=partner)) |
-            (Q(sender=partner) & Q(receiver=current_user))
-        ).order_by('-timestamp').first()
-        if latest_message:
-            sorted_partners.append((partner, latest_message.timestamp))
-    
-    # Sort partners by the timestamp of their latest message (most recent first)
-    sorted_partners.sort(key=lambda x: x[1], reverse=True)
-    conversation_partners = [partner for partner, _ in sorted_partners]
-
+    # One indexed query over the conversation summaries, most recent first,
+    # and one projected query for the partners
+    conversations = Conversation.objects(participants=current_user.id).order_by('-last_message_at')
+    conversation_partners = _conversation_partners(conversations)
 
     selected_conversation_id = request.args.get('user_id', type=str)
     messages = []
+    next_before = None
     selected_partner = None
 
     if selected_conversation_id:
         selected_partner = User.objects(id=selected_conversation_id).first()
         if selected_partner and selected_partner.id != current_user.id:
-            # Fetch messages between current_user and selected_partner
-            messages = Message.objects(
-                (Q(sender=current_user) & Q(receiver=selected_partner)) |
-                (Q(sender=selected_partner) & Q(receiver=current_user))
-            ).order_by('timestamp')
+            # The latest page only; older pages are fetched from api_get_messages on scroll
+            page = _thread_page(selected_partner.id)
+            messages = Message.to_dicts(reversed(page.items))
+            next_before = page.next_cursor
 
             # Mark messages sent *to* the current user as read
-            for message in messages:
-                if message.receiver == current_user and not message.read_status:
-                    message.read_status = True
-                    message.save() # Save the updated message
+            mark_thread_read(selected_partner.id)
 
     # Pass the form to the template
     form = MessageForm()
@@ -65,6 +105,7 @@ def inbox():
         'messaging/inbox.html',
         conversation_partners=conversation_partners,
         messages=messages,
+        next_before=next_before,
         selected_partner=selected_partner,
         form=form
     )
@@ -86,11 +127,12 @@ def send_message(receiver_id):
 
         try:
             new_message = Message(
-                sender=current_user,
+                sender=current_user.id,
                 receiver=receiver,
                 content=content
             )
             new_message.save()
+            Conversation.record_message(new_message)
             flash('Message sent!', 'success')
             return redirect(url_for('messaging.inbox', user_id=receiver_id))
         except Exception as e:
@@ -109,24 +151,32 @@ def send_message(receiver_id):
 def api_get_messages(partner_id):
     """
     API endpoint to fetch messages between the current user and a specific partner.
+    Returns the latest page of the thread, oldest first; pass the returned
+    `next_before` cursor as `before` to load the page of older messages.
+    `limit` sets the page size (default 30, at most 100).
     """
-    partner = User.objects(id=partner_id).first()
+    partner = User.objects(id=partner_id).only('id').first()
     if not partner:
         return jsonify({'error': 'Partner not found'}), 404
 
-    messages = Message.objects(
-        (Q(sender=current_user) & Q(receiver=partner)) |
-        (Q(sender=partner) & Q(receiver=current_user))
-    ).order_by('timestamp')
+    limit = min(max(request.args.get('limit', MESSAGES_PER_PAGE, type=int), 1), MAX_MESSAGES_PER_PAGE)
+    before = request.args.get('before') or None
 
-    # Mark messages sent *to* the current user as read
-    for message in messages:
-        if message.receiver == current_user and not message.read_status:
-            message.read_status = True
-            message.save()
+    try:
+        page = _thread_page(partner.id, limit, before)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
 
-    messages_data = [msg.to_dict() for msg in messages]
-    return jsonify(messages_data)
+    # Mark messages sent *to* the current user as read when the thread is opened
+    if before is None:
+        mark_thread_read(partner.id)
+
+    # Pages are fetched newest first; return them in reading order
+    return jsonify({
+        'messages': Message.to_dicts(reversed(page.items)),
+        'next_before': page.next_cursor,
+        'has_more': page.has_next
+    })
 
 @messaging_bp.route('/api/conversations')
 @login_required
@@ -134,36 +184,22 @@ def api_get_conversations():
     """
     API endpoint to fetch a list of conversation partners for the current user.
     """
-    sender_users = Message.objects(receiver=current_user).distinct('sender')
-    receiver_users = Message.objects(sender=current_user).distinct('receiver')
-
-    conversation_partners = list(set(sender_users + receiver_users))
-    if current_user in conversation_partners:
-        conversation_partners.remove(current_user)
+    conversations = list(Conversation.objects(participants=current_user.id).order_by('-last_message_at'))
+    partners = {partner.id: partner for partner in _conversation_partners(conversations)}
+    online = presence_tracker.online_now(partners)
 
     partners_data = []
-    for partner in conversation_partners:
-        latest_message = Message.objects(
-            (Q(sender=current_user) & Q(receiver=partner)) |
-            (Q(sender=partner) & Q(receiver=current_user))
-        ).order_by('-timestamp').first()
-
-        unread_count = Message.objects(
-            sender=partner,
-            receiver=current_user,
-            read_status=False
-        ).count()
-
-        if latest_message:
+    for conversation in conversations:
+        partner = partners.get(conversation.partner_id(current_user.id))
+        if partner:
             partners_data.append({
                 'id': str(partner.id),
                 'username': partner.username,
-                'latest_message_content': latest_message.content,
-                'latest_message_timestamp': latest_message.timestamp.isoformat() + 'Z',
+                'latest_message_content': conversation.last_message_snippet,
+                'latest_message_timestamp': conversation.last_message_at.isoformat() + 'Z',
                 'profile_pic': partner.image_file,
-                'unread_count': unread_count
+                'unread_count': conversation.unread_for(current_user.id),
+                'is_online': partner.id in online
             })
-    
-    partners_data.sort(key=lambda x: x['latest_message_timestamp'], reverse=True)
 
     return jsonify(partners_data)
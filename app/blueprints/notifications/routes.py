@@ -6,6 +6,8 @@ from app.models.users import User # Needed to get user info if displaying sender
 from app.extensions import db
 import json
 from app.blueprints.notifications.forms import NotificationSettingsForm
+from app.services.notification_counter import notification_counter
+from app.utils.user_loader import get_user
 
 notifications_bp = Blueprint('notifications', __name__)
 
@@ -31,10 +33,11 @@ def mark_read(notification_id):
     """
     Marks a specific notification as read.
     """
-    notification = Notification.objects(id=notification_id, user=current_user.id).first()
+    notification = Notification.objects(id=notification_id, user=current_user.id).only('is_read').first()
     if notification:
-        notification.is_read = True
-        notification.save()
+        # Conditional update: only a real unread -> read transition touches the counter
+        if Notification.objects(id=notification.id, is_read=False).update_one(set__is_read=True):
+            notification_counter.decr(current_user.id)
         flash('Notification marked as read.', 'success')
     else:
         flash('Notification not found or unauthorized.', 'danger')
@@ -46,7 +49,10 @@ def mark_all_read():
     """
     Marks all of the current user's unread notifications as read.
     """
-    Notification.objects(user=current_user.id, is_read=False).update(set__is_read=True)
+    marked = Notification.objects(user=current_user.id, is_read=False).update(set__is_read=True)
+    if marked:
+        # Decrement by what was actually marked, so notifications arriving meanwhile stay counted
+        notification_counter.decr(current_user.id, marked)
     flash('All notifications marked as read.', 'success')
     return redirect(url_for('notifications.index'))
 
@@ -56,9 +62,7 @@ def delete_notification(notification_id):
     """
     Deletes a specific notification for the current user.
     """
-    notification = Notification.objects(id=notification_id, user=current_user.id).first()
-    if notification:
-        notification.delete()
+    if notification_counter.delete(Notification.objects(id=notification_id, user=current_user.id)):
         flash('Notification deleted.', 'success')
     else:
         flash('Notification not found or unauthorized.', 'danger')
@@ -70,7 +74,7 @@ def api_unread_count():
     """
     API endpoint to get the count of unread notifications for the current user.
     """
-    unread_count = Notification.objects(user=current_user.id, is_read=False).count()
+    unread_count = notification_counter.get(current_user.id)
     return jsonify({'unread_count': unread_count})
 
 # Helper function to create and add a notification
@@ -88,7 +92,7 @@ def add_notification(user_id, message, notification_type='general', payload=None
     from flask import current_app
     from app.extensions import socketio
 
-    user = User.objects(id=user_id).first()
+    user = get_user(user_id)
     if not user:
         current_app.logger.warning(f"Attempted to add notification for non-existent user ID: {user_id}")
         return
@@ -103,7 +107,8 @@ def add_notification(user_id, message, notification_type='general', payload=None
 
     # Emit SocketIO event for real-time notification
     try:
-        unread_count = Notification.objects(user=user.id, is_read=False).count()
+        # new_notification.save() has already bumped the counter via its post_save signal
+        unread_count = notification_counter.get(user.id)
         socketio.emit(
             'new_notification',
             {'message': message, 'count': unread_count, 'notification_type': notification_type, 'payload': payload},
@@ -115,6 +120,81 @@ def add_notification(user_id, message, notification_type='general', payload=None
 
     return new_notification
 
+def add_notifications_bulk(entries):
+    """
+    Creates many notifications at once, e.g. when fanning one event out to
+    several users. All notifications are written with a single insert_many,
+    the recipients' unread counters are bumped in one bulk write and read back
+    in one query, and each recipient room receives one coalesced
+    'new_notification' event however many notifications it was sent.
+
+    Args:
+        entries (iterable of dict): One dict per notification with the keyword
+            arguments of add_notification (user_id, message and optionally
+            notification_type and payload).
+
+    Returns:
+        int: The number of notifications created.
+    """
+    from flask import current_app
+    from bson import ObjectId
+    from app.extensions import socketio
+
+    entries = list(entries)
+    if not entries:
+        return 0
+
+    recipient_ids = {ObjectId(str(entry['user_id'])) for entry in entries}
+    existing_ids = set(User.objects(id__in=list(recipient_ids)).scalar('id'))
+    for missing_id in recipient_ids - existing_ids:
+        current_app.logger.warning(f"Attempted to add notification for non-existent user ID: {missing_id}")
+
+    notifications = []
+    per_recipient = {}
+    for entry in entries:
+        user_id = ObjectId(str(entry['user_id']))
+        if user_id not in existing_ids:
+            continue
+        notification = Notification(
+            user=user_id,
+            message=entry['message'],
+            notification_type=entry.get('notification_type', 'general'),
+            payload=entry.get('payload')
+        )
+        notifications.append(notification)
+        per_recipient.setdefault(user_id, []).append(notification)
+    if not notifications:
+        return 0
+
+    # Bulk inserts bypass the post_save signal, so the counters are bumped here
+    Notification.objects.insert(notifications, load_bulk=False)
+    notification_counter.incr_many({user_id: len(sent) for user_id, sent in per_recipient.items()})
+
+    # Emit one SocketIO event per recipient room
+    try:
+        unread_counts = notification_counter.get_many(per_recipient)
+        for user_id, sent in per_recipient.items():
+            latest = sent[-1]
+            socketio.emit(
+                'new_notification',
+                {
+                    'message': latest.message if len(sent) == 1 else f"You have {len(sent)} new notifications.",
+                    'count': unread_counts.get(user_id, 0),
+                    'notification_type': latest.notification_type,
+                    'payload': latest.payload,
+                    'notifications': [
+                        {'message': n.message, 'notification_type': n.notification_type, 'payload': n.payload}
+                        for n in sent
+                    ]
+                },
+                room=str(user_id)
+            )
+        current_app.logger.info(f"Emitted new_notification to {len(per_recipient)} users for {len(notifications)} notifications")
+    except Exception as e:
+        current_app.logger.error(f"Error emitting bulk SocketIO notifications: {e}")
+
+    return len(notifications)
+
 @notifications_bp.route('/notifications/settings', methods=['GET', 'POST'])
 @login_required
 def notification_settings():
@@ -6,7 +6,7 @@ from app.models.users import User
 from app.models.listings import Listing # Needed to verify reported listings
 from app.blueprints.reports.forms import ReportForm, ResolveReportForm
 from app.extensions import db
-from app.blueprints.notifications.routes import add_notification # Import for report notifications
+from app.blueprints.notifications.routes import add_notification, add_notifications_bulk # Import for report notifications
 from datetime import datetime
 
 reports_bp = Blueprint('reports', __name__)
@@ -70,14 +70,15 @@ def submit_report(entity_type, entity_id):
         # In a real application, you might have a specific admin group or role to notify.
         # For simplicity, we'll assume admins will check the admin dashboard.
         # However, a notification can be sent to all admins for immediate attention.
-        admins = User.objects(role='admin')
-        for admin in admins:
-            add_notification(
-                user_id=admin.id,
-                message=f"New report submitted for {entity_type} '{entity_name}' (ID: {entity_id}).",
-                notification_type='new_report',
-                payload={'report_id': report.id, 'entity_type': entity_type, 'entity_id': entity_id}
-            )
+        add_notifications_bulk(
+            {
+                'user_id': admin_id,
+                'message': f"New report submitted for {entity_type} '{entity_name}' (ID: {entity_id}).",
+                'notification_type': 'new_report',
+                'payload': {'report_id': str(report.id), 'entity_type': entity_type, 'entity_id': entity_id}
+            }
+            for admin_id in User.objects(role='admin').scalar('id')
+        )
 
         return redirect(url_for('reports.my_reports'))
     
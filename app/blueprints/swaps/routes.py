@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from app.models.swaps import SwapRequest
 from app.models.listings import Listing
 from app.models.notifications import Notification # For sending notifications
+from app.services.notification_counter import notification_counter
 from app.blueprints.swaps.forms import ProposeSwapForm, AcceptSwapForm, RejectSwapForm, CancelSwapForm, CompleteSwapForm
 from app.utils.security import roles_required
 from datetime import datetime
@@ -96,7 +97,7 @@ def propose_swap(listing_id):
         # Emit a SocketIO event to the recipient to notify them of a new swap request
         current_app.extensions['socketio'].emit(
             'new_notification',
-            {'message': notification.message, 'count': Notification.objects(user=desired_listing.user, is_read=False).count()},
+            {'message': notification.message, 'count': notification_counter.get(desired_listing.user)},
             room=str(desired_listing.user.id)
         )
 
@@ -197,7 +198,7 @@ def accept_swap(swap_request_id):
         notification.save()
         current_app.extensions['socketio'].emit(
             'new_notification',
-            {'message': notification.message, 'count': Notification.objects(user=swap_request.requester, is_read=False).count()},
+            {'message': notification.message, 'count': notification_counter.get(swap_request.requester)},
             room=str(swap_request.requester.id)
         )
 
@@ -248,7 +249,7 @@ def reject_swap(swap_request_id):
         notification.save()
         current_app.extensions['socketio'].emit(
             'new_notification',
-            {'message': notification.message, 'count': Notification.objects(user=swap_request.requester, is_read=False).count()},
+            {'message': notification.message, 'count': notification_counter.get(swap_request.requester)},
             room=str(swap_request.requester.id)
         )
 
@@ -299,7 +300,7 @@ def cancel_swap(swap_request_id):
         notification.save()
         current_app.extensions['socketio'].emit(
             'new_notification',
-            {'message': notification.message, 'count': Notification.objects(user=swap_request.responder, is_read=False).count()},
+            {'message': notification.message, 'count': notification_counter.get(swap_request.responder)},
             room=str(swap_request.responder.id)
         )
 
@@ -358,7 +359,7 @@ def complete_swap(swap_request_id):
         notification_req.save()
         current_app.extensions['socketio'].emit(
             'new_notification',
-            {'message': notification_req.message, 'count': Notification.objects(user=swap_request.requester, is_read=False).count()},
+            {'message': notification_req.message, 'count': notification_counter.get(swap_request.requester)},
             room=str(swap_request.requester.id)
         )
 
@@ -375,7 +376,7 @@ def complete_swap(swap_request_id):
         notification_res.save()
         current_app.extensions['socketio'].emit(
             'new_notification',
-            {'message': notification_res.message, 'count': Notification.objects(user=swap_request.responder, is_read=False).count()},
+            {'message': notification_res.message, 'count': notification_counter.get(swap_request.responder)},
             room=str(swap_request.responder.id)
         )
 
@@ -16,7 +16,18 @@ def wishlist():
     """
     Displays the current user's wishlist items.
     """
-    wishlist_items = WishlistItem.objects(user=current_user)
+    items = list(WishlistItem.objects(user=current_user.id).no_dereference())
+    listing_ids = [item.listing.id for item in items if item.listing]
+    listings_by_id = {}
+    if listing_ids:
+        for listing_dict in Listing.to_dicts(Listing.objects(id__in=listing_ids)):
+            listings_by_id[listing_dict['id']] = listing_dict
+    # Items whose listing has since been deleted are skipped
+    wishlist_items = [
+        {'listing': listings_by_id[str(item.listing.id)], 'date_added': item.date_added}
+        for item in items
+        if item.listing and str(item.listing.id) in listings_by_id
+    ]
     remove_form = RemoveFromWishlistForm()
     return render_template('wishlist/wishlist.html', wishlist_items=wishlist_items, title="My Wishlist", remove_form=remove_form)
 
@@ -27,10 +38,10 @@ def add_to_wishlist(listing_id):
     Adds a listing to the current user's wishlist.
     """
     listing = Listing.objects(id=listing_id).first_or_404()
-    if WishlistItem.objects(user=current_user, listing=listing).first():
+    if WishlistItem.objects(user=current_user.id, listing=listing).first():
         flash('This item is already in your wishlist!', 'info')
     else:
-        wishlist_item = WishlistItem(user=current_user, listing=listing)
+        wishlist_item = WishlistItem(user=current_user.id, listing=listing)
         try:
             wishlist_item.save()
             flash('Item added to wishlist!', 'success')
@@ -46,7 +57,7 @@ def remove_from_wishlist(listing_id):
     """
     form = RemoveFromWishlistForm()
     if form.validate_on_submit():
-        wishlist_item = WishlistItem.objects(user=current_user, listing=listing_id).first_or_404()
+        wishlist_item = WishlistItem.objects(user=current_user.id, listing=listing_id).first_or_404()
         wishlist_item.delete()
         flash('Item removed from wishlist.', 'success')
         # Redirect to wishlist page or back to listing detail
@@ -61,7 +72,7 @@ def saved_searches():
     """
     Displays the current user's saved search queries.
     """
-    saved_searches = SavedSearch.objects(user=current_user).order_by('-date_saved')
+    saved_searches = SavedSearch.objects(user=current_user.id).order_by('-date_saved')
     delete_form = DeleteSavedSearchForm()
     return render_template('wishlist/saved_searches.html', saved_searches=saved_searches, title="My Saved Searches", delete_form=delete_form)
 
@@ -91,7 +102,7 @@ def save_search():
     if form.validate_on_submit():
         # Check if an identical search query (excluding name) already exists for the user
         existing_search = SavedSearch.objects(
-            user=current_user,
+            user=current_user.id,
             search_query_params=clean_query_params
         ).first()
 
@@ -99,7 +110,7 @@ def save_search():
             flash('You already have this search saved!', 'info')
         else:
             new_saved_search = SavedSearch(
-                user=current_user,
+                user=current_user.id,
                 name=form.name.data,
                 search_query_params=clean_query_params
             )
@@ -131,7 +142,7 @@ def delete_saved_search(search_id):
     """
     form = DeleteSavedSearchForm()
     if form.validate_on_submit():
-        saved_search = SavedSearch.objects(id=search_id, user=current_user).first_or_404()
+        saved_search = SavedSearch.objects(id=search_id, user=current_user.id).first_or_404()
         saved_search.delete()
         flash('Saved search deleted.', 'success')
         return redirect(url_for('wishlist.saved_searches'))
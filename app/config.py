@@ -62,5 +62,41 @@ class Config:
     WTF_CSRF_SECRET_KEY = os.environ.get('WTF_CSRF_SECRET_KEY')
     print(f"DEBUG: WTF_CSRF_SECRET_KEY loaded: {WTF_CSRF_SECRET_KEY[:5]}...") # Print first 5 chars for security
 
+    # Flask-Caching settings
+    # Cache invalidation (marketplace generations, session principal versions)
+    # goes through this backend. SimpleCache is local to one process: with
+    # several workers or nodes a change made in one is only seen by the others
+    # once their generation counters expire, after LOCAL_GENERATION_TTL
+    # seconds. Set CACHE_TYPE=RedisCache and CACHE_REDIS_URL (e.g.
+    # redis://localhost:6379/1) for immediate invalidation everywhere, and
+    # REQUIRE_SHARED_CACHE=true to refuse to start without a shared backend.
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'SimpleCache')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 300))
+    REQUIRE_SHARED_CACHE = os.environ.get('REQUIRE_SHARED_CACHE', 'false').lower() in ['true', 'on', '1']
+    LOCAL_GENERATION_TTL = int(os.environ.get('LOCAL_GENERATION_TTL', 15)) # Seconds
+
+    # Flask-SocketIO deployment settings
+    # 'threading' suits a single development process. In production run
+    # eventlet or gevent workers (see gunicorn.conf.py) and point
+    # SOCKETIO_MESSAGE_QUEUE at a broker, e.g. redis://localhost:6379/0 or any
+    # kombu URL, so that emits reach clients connected to every worker and node.
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'flask-socketio')
+    SOCKETIO_LOGGER = os.environ.get('SOCKETIO_LOGGER', 'false').lower() in ['true', 'on', '1']
+
+    # Buffered activity logging (see app/services/activity_writer.py)
+    ACTIVITY_BUFFER_SIZE = int(os.environ.get('ACTIVITY_BUFFER_SIZE', 10000)) # Records held before new ones are dropped
+    ACTIVITY_BATCH_SIZE = int(os.environ.get('ACTIVITY_BATCH_SIZE', 500))
+    ACTIVITY_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 2.0)) # Seconds
+    # Raw activity events are deleted by a TTL index after this many days;
+    # per-day rollups are kept. Apply changes with 'manage.py activities apply-retention'.
+    ACTIVITY_RETENTION_DAYS = int(os.environ.get('ACTIVITY_RETENTION_DAYS', 180))
+
+    # Follower timelines (see app/services/timeline_service.py)
+    TIMELINE_MAX_ENTRIES = int(os.environ.get('TIMELINE_MAX_ENTRIES', 500)) # Entries kept per follower
+    TIMELINE_FANOUT_LIMIT = int(os.environ.get('TIMELINE_FANOUT_LIMIT', 5000)) # Above this many followers, fan out on read
+
     # Pagination settings (example, adjust as needed)
     POSTS_PER_PAGE = 10
@@ -5,6 +5,8 @@ from flask_mail import Mail
 from flask_socketio import SocketIO
 from flask_wtf.csrf import CSRFProtect
 from flask_moment import Moment
+from flask_caching import Cache
+from app.utils.cache import require_shared_cache
 
 # Initialize extensions
 db = MongoEngine()
@@ -14,6 +16,7 @@ mail = Mail()
 socketio = SocketIO()
 csrf = CSRFProtect()
 moment = Moment() # Initialize Moment here
+cache = Cache()
 
 def init_app(app):
     """
@@ -41,12 +44,28 @@ def init_app(app):
     mail.init_app(app)
 
     # Initialize Flask-SocketIO for real-time features.
-    # 'async_mode' can be 'eventlet', 'gevent', 'threading', or 'auto'.
-    # Using 'eventlet' or 'gevent' is recommended for production.
-    socketio.init_app(app, cors_allowed_origins="*", async_mode='threading', logger=True, engineio_logger=True)
+    # SOCKETIO_ASYNC_MODE can be 'eventlet', 'gevent', 'threading', or 'auto';
+    # 'eventlet' or 'gevent' is recommended for production. With a
+    # SOCKETIO_MESSAGE_QUEUE every emit is published to the broker and
+    # delivered by whichever worker holds the recipient's connection.
+    socketio.init_app(
+        app,
+        cors_allowed_origins="*",
+        async_mode=app.config.get('SOCKETIO_ASYNC_MODE', 'threading'),
+        message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'),
+        channel=app.config.get('SOCKETIO_CHANNEL', 'flask-socketio'),
+        logger=app.config.get('SOCKETIO_LOGGER', False),
+        engineio_logger=app.config.get('SOCKETIO_LOGGER', False)
+    )
 
     # Initialize CSRF protection for the application
     # csrf.init_app(app)
 
     # Initialize Flask-Moment for time and date rendering
-    moment.init_app(app)
\ No newline at end of file
+    moment.init_app(app)
+
+    # Initialize Flask-Caching. Defaults to a per-process SimpleCache;
+    # REQUIRE_SHARED_CACHE makes startup refuse anything but a shared backend.
+    if app.config.get('REQUIRE_SHARED_CACHE'):
+        require_shared_cache(app.config, "REQUIRE_SHARED_CACHE is set")
+    cache.init_app(app)
@@ -0,0 +1,119 @@
+# app/models/activity_rollups.py
+from datetime import datetime, timedelta
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+from app.extensions import db
+from mongoengine.fields import ReferenceField, StringField, DateTimeField, IntField
+
+DUPLICATE_KEY = 11000
+
+class ActivityRollup(db.Document):
+    """
+    ActivityRollup Model: The number of activities of one type a user performed
+    on one (UTC) day, rolled up from user_activities by the hourly rollup job.
+    The rows outlive the raw events, which expire after
+    ACTIVITY_RETENTION_DAYS; the feed's action type filter is read from them.
+    """
+    day = DateTimeField(required=True) # Midnight UTC of the day
+    user = ReferenceField('User') # None for anonymous activity
+    action_type = StringField(max_length=100, required=True)
+    count = IntField(required=True, default=0)
+    first_at = DateTimeField()
+    last_at = DateTimeField()
+
+    meta = {
+        'collection': 'activity_rollups',
+        'index_background': True,
+        'indexes': [
+            # One row per (day, user, action); also the upsert key of the rollup job
+            {'fields': ('day', 'user', 'action_type'), 'unique': True},
+            # Per-user history by action
+            {'fields': ('user', 'action_type', '-day')},
+            # Distinct action types for the feed filter, and per-action queries by date
+            {'fields': ('action_type', '-day')},
+        ]
+    }
+
+    def __repr__(self):
+        return f"ActivityRollup({self.day.date()}, User: {self.user.id if self.user else None}, Action: {self.action_type}, Count: {self.count})"
+
+    @staticmethod
+    def day_start(moment):
+        """Midnight (UTC) of the day `moment` falls on."""
+        return datetime(moment.year, moment.month, moment.day)
+
+    @classmethod
+    def rollup(cls, start, end=None, retention=None):
+        """
+        (Re)computes the rollups for every day from `start` up to, but not
+        including, `end` (default: the day after `start`): one aggregation over
+        user_activities, written back as one bulk of upserts. Rows are
+        replaced, so rolling up a day again (e.g. today, while it is still
+        filling up) is safe. Once raw events expire, pass the `retention`
+        (timedelta) in effect: days that may have lost events are skipped
+        rather than replaced with smaller counts. Returns the number of rollup
+        rows written.
+        """
+        from app.models.user_activity import UserActivity
+
+        start = cls.day_start(start)
+        end = cls.day_start(end) if end is not None else start + timedelta(days=1)
+        if retention is not None:
+            # The first day whose events are all still stored
+            start = max(start, cls.day_start(datetime.utcnow() - retention) + timedelta(days=1))
+        if start >= end:
+            return 0
+        pipeline = [
+            {'$match': {'timestamp': {'$gte': start, '$lt': end}}},
+            {'$group': {
+                '_id': {
+                    'day': {'$dateFromParts': {
+                        'year': {'$year': '$timestamp'},
+                        'month': {'$month': '$timestamp'},
+                        'day': {'$dayOfMonth': '$timestamp'}
+                    }},
+                    'user': '$user',
+                    'action_type': '$action_type'
+                },
+                'count': {'$sum': 1},
+                'first_at': {'$min': '$timestamp'},
+                'last_at': {'$max': '$timestamp'}
+            }}
+        ]
+        operations = []
+        for row in UserActivity._get_collection().aggregate(pipeline, allowDiskUse=True):
+            key = {
+                'day': row['_id']['day'],
+                'user': row['_id'].get('user'),
+                'action_type': row['_id']['action_type']
+            }
+            operations.append(ReplaceOne(
+                key,
+                dict(key, count=row['count'], first_at=row['first_at'], last_at=row['last_at']),
+                upsert=True
+            ))
+        if operations:
+            try:
+                cls._get_collection().bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                if any(error.get('code') != DUPLICATE_KEY for error in e.details.get('writeErrors', [])):
+                    raise
+                # A concurrent rollup inserted some of the same rows first; the
+                # rows now exist, so replacing them again succeeds
+                cls._get_collection().bulk_write(operations, ordered=False)
+        return len(operations)
+
+    @classmethod
+    def action_types(cls):
+        """The distinct action types that have been rolled up."""
+        return sorted(cls.objects.distinct('action_type'))
+
+    def to_dict(self):
+        return {
+            'day': self.day.date().isoformat(),
+            'user_id': str(self.user.id) if self.user else None,
+            'action_type': self.action_type,
+            'count': self.count,
+            'first_at': self.first_at.isoformat() + 'Z' if self.first_at else None,
+            'last_at': self.last_at.isoformat() + 'Z' if self.last_at else None
+        }
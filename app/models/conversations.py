@@ -0,0 +1,124 @@
+# app/models/conversations.py
+from datetime import datetime
+from app.extensions import db
+from mongoengine.errors import NotUniqueError
+from mongoengine.fields import ReferenceField, ListField, StringField, DateTimeField, DictField
+
+class Conversation(db.Document):
+    """
+    Conversation Model: A materialised summary of the messages exchanged
+    between two users, kept up to date on every send. It backs the inbox, which
+    can then list conversations with one indexed query instead of scanning the
+    messages collection per partner.
+    """
+    pair_key = StringField(max_length=49, required=True, unique=True) # '<lower user id>:<higher user id>'
+    participants = ListField(ReferenceField('User'), required=True)
+    last_message_snippet = StringField(max_length=200)
+    last_message_at = DateTimeField(default=datetime.utcnow)
+    last_sender = ReferenceField('User')
+    unread_counts = DictField() # str(user id) -> number of messages that user has not read
+
+    meta = {
+        'collection': 'conversations',
+        'index_background': True,
+        'indexes': [
+            # The inbox: a user's conversations, most recent first
+            {'fields': ('participants', '-last_message_at')},
+        ]
+    }
+
+    SNIPPET_LENGTH = 200
+
+    def __repr__(self):
+        return f"Conversation('{self.pair_key}', {self.last_message_at})"
+
+    @staticmethod
+    def make_pair_key(user_id, other_user_id):
+        return ':'.join(sorted((str(user_id), str(other_user_id))))
+
+    @classmethod
+    def record_message(cls, message):
+        """
+        Folds a newly sent message into its conversation summary: one atomic
+        upsert moves last_message_at forward ($max) and increments the
+        receiver's unread counter, then the snippet and sender are replaced
+        only if this message is still the newest, so a slower concurrent send
+        can never move the summary backwards.
+        """
+        # Stored references, so neither user is loaded
+        sender_id = message._ref_id('sender')
+        receiver_id = message._ref_id('receiver')
+        pair_key = cls.make_pair_key(sender_id, receiver_id)
+        snippet = (message.content or '')[:cls.SNIPPET_LENGTH]
+        # MongoDB stores milliseconds; truncated so the newest-message check below compares equal
+        sent_at = message.timestamp.replace(microsecond=message.timestamp.microsecond // 1000 * 1000)
+        update = dict(
+            set_on_insert__participants=sorted([sender_id, receiver_id], key=str),
+            set_on_insert__last_message_snippet=snippet,
+            set_on_insert__last_sender=sender_id,
+            max__last_message_at=sent_at,
+            **{f"inc__unread_counts__{receiver_id}": 1}
+        )
+        try:
+            cls.objects(pair_key=pair_key).update_one(upsert=True, **update)
+        except NotUniqueError:
+            # Another first message created the conversation concurrently
+            cls.objects(pair_key=pair_key).update_one(**update)
+        cls.objects(pair_key=pair_key, last_message_at=sent_at).update_one(
+            set__last_message_snippet=snippet,
+            set__last_sender=sender_id
+        )
+
+    @classmethod
+    def mark_read(cls, user_id, partner_id):
+        """Clears user_id's unread counter on their conversation with partner_id."""
+        cls.objects(pair_key=cls.make_pair_key(user_id, partner_id)).update_one(
+            **{f"set__unread_counts__{user_id}": 0}
+        )
+
+    def partner_id(self, user_id):
+        """The id of the other participant, without dereferencing either user."""
+        return next((ref.id for ref in self._data['participants'] if str(ref.id) != str(user_id)), None)
+
+    def unread_for(self, user_id):
+        return (self.unread_counts or {}).get(str(user_id), 0)
+
+    @classmethod
+    def rebuild_all(cls):
+        """
+        Recomputes every conversation summary from the messages collection with
+        one aggregation. Used to backfill summaries for existing messages.
+        Returns the number of conversations written.
+        """
+        from app.models.messages import Message
+
+        lower = {'$cond': [{'$lt': ['$sender', '$receiver']}, '$sender', '$receiver']}
+        pipeline = [
+            {'$sort': {'timestamp': 1}},
+            {'$group': {
+                '_id': {
+                    'a': lower,
+                    'b': {'$cond': [{'$lt': ['$sender', '$receiver']}, '$receiver', '$sender']}
+                },
+                'last_content': {'$last': '$content'},
+                'last_at': {'$last': '$timestamp'},
+                'last_sender': {'$last': '$sender'},
+                # Unread messages received by the lower / higher id participant
+                'unread_a': {'$sum': {'$cond': [{'$and': [{'$ne': ['$read_status', True]}, {'$eq': ['$receiver', lower]}]}, 1, 0]}},
+                'unread_b': {'$sum': {'$cond': [{'$and': [{'$ne': ['$read_status', True]}, {'$ne': ['$receiver', lower]}]}, 1, 0]}}
+            }}
+        ]
+        written = 0
+        for row in Message.objects.aggregate(pipeline, allowDiskUse=True):
+            user_a, user_b = row['_id']['a'], row['_id']['b']
+            unread_counts = {str(user_a): row['unread_a'], str(user_b): row['unread_b']}
+            cls.objects(pair_key=cls.make_pair_key(user_a, user_b)).update_one(
+                upsert=True,
+                set__participants=sorted([user_a, user_b], key=str),
+                set__last_message_snippet=(row['last_content'] or '')[:cls.SNIPPET_LENGTH],
+                set__last_message_at=row['last_at'],
+                set__last_sender=row['last_sender'],
+                set__unread_counts=unread_counts
+            )
+            written += 1
+        return written
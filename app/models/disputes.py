@@ -1,6 +1,7 @@
 # app/models/disputes.py
 from datetime import datetime
 from app.extensions import db
+from app.utils.user_loader import get_user_loader
 from mongoengine.fields import ReferenceField, IntField, StringField, DateTimeField, BooleanField
 
 class Dispute(db.Document):
@@ -24,12 +25,15 @@ class Dispute(db.Document):
         """
         Converts the Dispute object to a dictionary.
         """
+        loader = get_user_loader()
+        initiator = loader.resolve_summary(self, 'initiator')
+        respondent = loader.resolve_summary(self, 'respondent')
         return {
             'id': str(self.id),
-            'initiator_id': str(self.initiator.id),
-            'initiator_username': self.initiator.username,
-            'respondent_id': str(self.respondent.id),
-            'respondent_username': self.respondent.username,
+            'initiator_id': str(initiator.id),
+            'initiator_username': initiator.username,
+            'respondent_id': str(respondent.id),
+            'respondent_username': respondent.username,
             'listing_id': str(self.listing.id) if self.listing else None,
             'listing_title': self.listing.title if self.listing else None,
             'reason': self.reason,
@@ -1,4 +1,5 @@
 from app.extensions import db
+from app.utils.user_loader import get_user_loader
 from datetime import datetime
 
 class Donation(db.Document):
@@ -75,14 +76,17 @@ class Donation(db.Document):
         """
         Converts the Donation object to a dictionary.
         """
+        loader = get_user_loader()
+        donor = loader.resolve_summary(self, 'donor')
+        recipient = loader.resolve_summary(self, 'recipient')
         return {
             'id': str(self.id), # Convert ObjectId to string
-            'donor_id': str(self.donor.id) if self.donor else None,
-            'donor_username': self.donor.username if self.donor else None,
+            'donor_id': str(donor.id) if donor else None,
+            'donor_username': donor.username if donor else None,
             'donated_listing_id': str(self.donated_listing.id) if self.donated_listing else None,
             'donated_listing_title': self.donated_listing.title if self.donated_listing else None,
-            'recipient_id': str(self.recipient.id) if self.recipient else None,
-            'recipient_username': self.recipient.username if self.recipient else None,
+            'recipient_id': str(recipient.id) if recipient else None,
+            'recipient_username': recipient.username if recipient else None,
             'status': self.status,
             'quantity': self.quantity,
             
@@ -0,0 +1,57 @@
+# app/models/jobs.py
+from datetime import datetime
+from app.extensions import db
+from mongoengine.fields import StringField, DictField, IntField, FloatField, DateTimeField
+
+class Job(db.Document):
+    """
+    Job Model: A unit of background work in the Mongo-backed job queue.
+    Jobs move from 'queued' to 'running' and end as 'done', or as 'dead'
+    (the dead-letter state) once they have exhausted their attempts.
+    """
+    name = StringField(max_length=100, required=True) # Registered task name, e.g. 'listing.percolate_saved_searches'
+    payload = DictField() # Keyword arguments for the task
+    status = StringField(max_length=20, required=True, default='queued', choices=('queued', 'running', 'done', 'dead'))
+    attempts = IntField(default=0)
+    max_attempts = IntField(default=5)
+    run_after = DateTimeField(default=datetime.utcnow) # Not claimed before this time (used for retry backoff)
+    locked_by = StringField(max_length=100) # Worker id holding the job while it runs
+    created_at = DateTimeField(default=datetime.utcnow)
+    started_at = DateTimeField()
+    heartbeat_at = DateTimeField() # Refreshed by the worker while the job runs
+    finished_at = DateTimeField()
+    duration_ms = FloatField() # Wall time of the last attempt
+    last_error = StringField()
+
+    meta = {
+        'collection': 'jobs',
+        'index_background': True,
+        'indexes': [
+            # Claiming the next runnable job
+            {'fields': ('status', 'run_after')},
+            # Reaping jobs whose worker died mid-run
+            {'fields': ('status', 'heartbeat_at')},
+            # Finished jobs are kept for a week for inspection, dead letters are kept until handled
+            {'fields': ('finished_at',), 'expireAfterSeconds': 7 * 24 * 3600, 'partialFilterExpression': {'status': 'done'}},
+        ]
+    }
+
+    def __repr__(self):
+        return f"Job(ID: {self.id}, Name: {self.name}, Status: {self.status}, Attempts: {self.attempts})"
+
+    def to_dict(self):
+        return {
+            'id': str(self.id),
+            'name': self.name,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_after': self.run_after.isoformat() + 'Z' if self.run_after else None,
+            'created_at': self.created_at.isoformat() + 'Z' if self.created_at else None,
+            'started_at': self.started_at.isoformat() + 'Z' if self.started_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() + 'Z' if self.heartbeat_at else None,
+            'finished_at': self.finished_at.isoformat() + 'Z' if self.finished_at else None,
+            'duration_ms': self.duration_ms,
+            'last_error': self.last_error
+        }
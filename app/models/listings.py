@@ -1,10 +1,29 @@
 from datetime import datetime
 from app.extensions import db
 from mongoengine.fields import ReferenceField, StringField, IntField, FloatField, DateTimeField, BooleanField, ListField
-from mongoengine.errors import DoesNotExist
 
 class Listing(db.Document):
-    meta = {'strict': False}
+    meta = {
+        'strict': False,
+        'index_background': True,
+        'indexes': [
+            # Marketplace grid: keyset pagination over (is_premium desc, date_posted desc, _id desc)
+            {'fields': ('is_available', '-is_premium', '-date_posted', '-id')},
+            # Dashboards, my listings, public profiles and the followed-users feed
+            {'fields': ('user', 'is_available', '-date_posted')},
+            {'fields': ('user', '-date_posted')},
+            # Time-window scans in the saved search / wishlist / deactivation scripts
+            {'fields': ('-date_posted',)},
+            {'fields': ('listing_type',)},
+            # Marketplace search: weighted, stemmed text index used by SearchService
+            {
+                'fields': ['$title', '$brand', '$school_name', '$description'],
+                'default_language': 'english',
+                'weights': {'title': 10, 'brand': 5, 'school_name': 5, 'description': 1},
+                'name': 'listing_text_search'
+            },
+        ]
+    }
     """
     Listing Model: Represents an item posted for swap, sale, or donation.
     This model captures all relevant details about the item, including its
@@ -41,9 +60,40 @@ class Listing(db.Document):
         """
         return f"Listing('{self.title}', '{self.date_posted}', '{self.listing_type}', '{self.is_available}')"
 
-    def to_dict(self):
+    @property
+    def owner_id(self):
+        """
+        The ObjectId of the owning user, read from the stored reference without
+        dereferencing it (no query).
+        """
+        value = self._data.get('user')
+        return getattr(value, 'id', value)
+
+    @classmethod
+    def to_dicts(cls, listings):
+        """
+        Serialises many listings at once. All owners not already in the
+        request's identity map are fetched in a single projected $in query
+        (see UserLoader.load_summaries) instead of one dereference per listing.
+        Each dict also carries 'image_file', the first image, for card templates.
+        """
+        from app.utils.user_loader import get_user_loader # Imported here; users.py imports this module
+
+        listings = list(listings)
+        owners = get_user_loader().resolve_summaries(listings, 'user')
+
+        results = []
+        for listing in listings:
+            data = listing.to_dict(owners=owners)
+            data['image_file'] = listing.image_files[0] if listing.image_files else 'default.jpg'
+            results.append(data)
+        return results
+
+    def to_dict(self, owners=None):
         """
         Converts the Listing object to a dictionary, useful for JSON serialization.
+        Pass `owners` (a dict of user id -> User) to resolve the owner from a
+        preloaded batch instead of dereferencing self.user.
         """
         data = {
             'id': str(self.id),
@@ -67,11 +117,18 @@ class Listing(db.Document):
             'user_id': None,
             'username': None
         }
-        try:
-            if self.user:
-                data['user_id'] = str(self.user.id)
-                data['username'] = self.user.username
-        except DoesNotExist:
-            # If the user does not exist, user_id and username will remain None
-            pass
+        if owners is not None:
+            owner = owners.get(self.owner_id)
+            if owner:
+                data['user_id'] = str(owner.id)
+                data['username'] = owner.username
+            return data
+        from app.utils.user_loader import get_user_loader
+
+        # Resolved through the request's identity map; a missing user leaves
+        # user_id and username as None
+        owner = get_user_loader().resolve_summary(self, 'user')
+        if owner:
+            data['user_id'] = str(owner.id)
+            data['username'] = owner.username
         return data
\ No newline at end of file
@@ -1,6 +1,7 @@
 # app/models/messages.py
 from datetime import datetime
 from app.extensions import db
+from app.utils.user_loader import get_user_loader
 from mongoengine.fields import ReferenceField, StringField, BooleanField, DateTimeField
 
 class Message(db.Document):
@@ -12,6 +13,19 @@ class Message(db.Document):
     swap_request = ReferenceField('SwapRequest') # Optional: Link to a SwapRequest
     order = ReferenceField('Order') # Optional: Link to an Order
     donation = ReferenceField('Donation') # Optional: Link to a Donation
+    pair_key = StringField(max_length=49) # '<lower user id>:<higher user id>', same as Conversation.pair_key
+
+    meta = {
+        'index_background': True,
+        'indexes': [
+            # Conversation threads (queried in both directions) and sent-to lists
+            {'fields': ('sender', 'receiver', '-timestamp')},
+            # Unread counts, read receipts and received-from lists
+            {'fields': ('receiver', 'sender', 'read_status')},
+            # Paginated thread history: newest first, keyset on (timestamp, _id)
+            {'fields': ('pair_key', '-timestamp', '-id')},
+        ]
+    }
 
     def __repr__(self):
         """
@@ -19,20 +33,104 @@ class Message(db.Document):
         """
         return f'<Message {self.id} from {self.sender.username} to {self.receiver.username} at {self.timestamp}>'
 
-    def to_dict(self):
+    def clean(self):
+        """
+        Stamps the participant pair key used by the thread history index.
+        """
+        from app.models.conversations import Conversation # Imported here to keep model imports acyclic
+
+        self.pair_key = Conversation.make_pair_key(self._ref_id('sender'), self._ref_id('receiver'))
+
+    def _ref_id(self, field):
+        """Id held by a reference field, without dereferencing it."""
+        value = self._data.get(field)
+        return getattr(value, 'id', value)
+
+    @classmethod
+    def backfill_pair_keys(cls):
+        """
+        Sets pair_key on messages stored before it existed, with one
+        server-side update. Returns the number of messages updated.
+        """
+        lower = {'$cond': [{'$lt': ['$sender', '$receiver']}, '$sender', '$receiver']}
+        higher = {'$cond': [{'$lt': ['$sender', '$receiver']}, '$receiver', '$sender']}
+        result = cls._get_collection().update_many(
+            {'pair_key': {'$exists': False}},
+            [{'$set': {'pair_key': {'$concat': [{'$toString': lower}, ':', {'$toString': higher}]}}}]
+        )
+        return result.modified_count
+
+    @classmethod
+    def to_dicts(cls, messages):
+        """
+        Serialises many messages at once. Senders and receivers come from the
+        request's identity map (one $in query for any not yet loaded), and linked swaps, orders and donations (and
+        their listings) in one query per collection, instead of dereferencing
+        them per message. Use with a no_dereference() queryset.
+        """
+        from app.models.swaps import SwapRequest
+        from app.models.orders import Order
+        from app.models.donations import Donation
+        from app.models.listings import Listing
+
+        messages = list(messages)
+        users = get_user_loader().resolve_summaries(messages, 'sender', 'receiver')
+
+        swap_ids = {message._ref_id('swap_request') for message in messages} - {None}
+        order_ids = {message._ref_id('order') for message in messages} - {None}
+        donation_ids = {message._ref_id('donation') for message in messages} - {None}
+        swaps = {swap.id: swap for swap in SwapRequest.objects(id__in=list(swap_ids)).only('requester_listing', 'responder_listing').no_dereference()} if swap_ids else {}
+        orders = {order.id: order for order in Order.objects(id__in=list(order_ids)).only('listing').no_dereference()} if order_ids else {}
+        donations = {donation.id: donation for donation in Donation.objects(id__in=list(donation_ids)).only('donated_listing').no_dereference()} if donation_ids else {}
+
+        listing_ids = {swap.requester_listing.id for swap in swaps.values()} | {swap.responder_listing.id for swap in swaps.values()}
+        listing_ids |= {order.listing.id for order in orders.values()} | {donation.donated_listing.id for donation in donations.values()}
+        listings = {listing.id: listing for listing in Listing.objects(id__in=list(listing_ids)).only('id', 'title', 'price')} if listing_ids else {}
+
+        def title(listing_ref):
+            listing = listings.get(listing_ref.id)
+            return listing.title if listing else 'Unavailable listing'
+
+        link_titles = {}
+        for swap in swaps.values():
+            link_titles[('swap_request', swap.id)] = f"Swap: {title(swap.requester_listing)} <-> {title(swap.responder_listing)}"
+        for order in orders.values():
+            listing = listings.get(order.listing.id)
+            link_titles[('order', order.id)] = f"Order: {title(order.listing)} (R{listing.price if listing else ''})"
+        for donation in donations.values():
+            link_titles[('donation', donation.id)] = f"Donation: {title(donation.donated_listing)}"
+
+        return [message.to_dict(users=users, link_titles=link_titles) for message in messages]
+
+    def to_dict(self, users=None, link_titles=None):
         """
         Converts the Message object to a dictionary, useful for JSON serialization.
+        Pass `users` (user id -> User) and `link_titles` ((field, id) -> title),
+        as built by to_dicts, to serialise from preloaded batches instead of
+        dereferencing each reference.
         """
+        if users is None:
+            loader = get_user_loader()
+            sender, receiver = loader.resolve_summary(self, 'sender'), loader.resolve_summary(self, 'receiver')
+        else:
+            sender, receiver = users.get(self._ref_id('sender')), users.get(self._ref_id('receiver'))
         data = {
-            'id': self.id,
-            'sender_id': str(self.sender.id),
-            'receiver_id': str(self.receiver.id),
+            'id': str(self.id),
+            'sender_id': str(self._ref_id('sender')),
+            'receiver_id': str(self._ref_id('receiver')),
             'content': self.content,
             'timestamp': self.timestamp.isoformat() + 'Z', # ISO 8601 format with Z for UTC
             'read_status': self.read_status,
-            'sender_username': self.sender.username, # Include sender's username for display
-            'receiver_username': self.receiver.username # Include receiver's username for display
+            'sender_username': sender.username if sender else None, # Include sender's username for display
+            'receiver_username': receiver.username if receiver else None # Include receiver's username for display
         }
+        if link_titles is not None:
+            for field in ('swap_request', 'order', 'donation'):
+                link_id = self._ref_id(field)
+                if link_id:
+                    data[f'{field}_id'] = str(link_id)
+                    data[f'{field}_title'] = link_titles.get((field, link_id))
+            return data
         if self.swap_request:
             data['swap_request_id'] = str(self.swap_request.id)
             data['swap_request_title'] = f"Swap: {self.swap_request.requester_listing.title} <-> {self.swap_request.responder_listing.title}"
@@ -41,5 +139,5 @@ class Message(db.Document):
             data['order_title'] = f"Order: {self.order.listing.title} (R{self.order.listing.price})"
         if self.donation:
             data['donation_id'] = str(self.donation.id)
-            data['donation_title'] = f"Donation: {self.donation.listing.title}"
+            data['donation_title'] = f"Donation: {self.donation.donated_listing.title}"
         return data
\ No newline at end of file
@@ -27,6 +27,21 @@ class Notification(db.Document):
     notification_type = StringField(max_length=50, required=True, default='general')
     payload = DictField() # Stored as a dictionary directly
 
+    meta = {
+        'index_background': True,
+        'indexes': [
+            # Unread badge counts and the unread list
+            {'fields': ('user', 'is_read', '-timestamp')},
+            # Full notification history
+            {'fields': ('user', '-timestamp')},
+            # "Already notified about this listing?" checks in the saved search
+            # and wishlist match jobs
+            {'fields': ('notification_type', 'payload.listing_id')},
+            # Saved search emails still to be retried (a handful of documents at most)
+            {'fields': ('notification_type', 'timestamp'), 'partialFilterExpression': {'payload.email_sent': False}},
+        ]
+    }
+
     def __repr__(self):
         """
         String representation of the Notification object.
@@ -53,7 +68,7 @@ class Notification(db.Document):
         """
         return {
             'id': self.id,
-            'user_id': str(self.user.id),
+            'user_id': str(getattr(self._data.get('user'), 'id', self._data.get('user'))), # Without dereferencing the user
             'message': self.message,
             'timestamp': self.timestamp.isoformat() + 'Z',
             'is_read': self.is_read,
@@ -1,4 +1,5 @@
 from app.extensions import db
+from app.utils.user_loader import get_user_loader
 from datetime import datetime
 from mongoengine import ReferenceField
 
@@ -60,12 +61,15 @@ class Order(db.Document):
         """
         Converts the Order object to a dictionary.
         """
+        loader = get_user_loader()
+        buyer = loader.resolve_summary(self, 'buyer')
+        seller = loader.resolve_summary(self, 'seller')
         return {
             'id': str(self.id),
-            'buyer_id': str(self.buyer.id) if self.buyer else None,
-            'buyer_username': self.buyer.username if self.buyer else None,
-            'seller_id': str(self.seller.id) if self.seller else None,
-            'seller_username': self.seller.username if self.seller else None,
+            'buyer_id': str(buyer.id) if buyer else None,
+            'buyer_username': buyer.username if buyer else None,
+            'seller_id': str(seller.id) if seller else None,
+            'seller_username': seller.username if seller else None,
             'listing_id': str(self.listing.id) if self.listing else None,
             'listing_title': self.listing.title if self.listing else None,
             'quantity': self.quantity,
@@ -1,6 +1,7 @@
 # app/models/reviews.py
 from datetime import datetime
 from app.extensions import db
+from app.utils.user_loader import get_user_loader
 from mongoengine.fields import ReferenceField, IntField, StringField, BooleanField, DateTimeField
 
 class Review(db.Document):
@@ -26,12 +27,15 @@ class Review(db.Document):
         """
         Converts the Review object to a dictionary.
         """
+        loader = get_user_loader()
+        reviewer = loader.resolve_summary(self, 'reviewer')
+        reviewed_user = loader.resolve_summary(self, 'reviewed_user')
         return {
             'id': str(self.id),
-            'reviewer_id': str(self.reviewer.id),
-            'reviewer_username': self.reviewer.username,
-            'reviewed_user_id': str(self.reviewed_user.id),
-            'reviewed_user_username': self.reviewed_user.username,
+            'reviewer_id': str(reviewer.id),
+            'reviewer_username': reviewer.username,
+            'reviewed_user_id': str(reviewed_user.id),
+            'reviewed_user_username': reviewed_user.username,
             'comment': self.comment,
             'rating': self.rating,
             'is_positive': self.is_positive,
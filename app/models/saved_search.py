@@ -1,7 +1,7 @@
 # app/models/saved_search.py
 from datetime import datetime
 from app.extensions import db
-from mongoengine.fields import ReferenceField, IntField, StringField, DateTimeField
+from mongoengine.fields import ReferenceField, IntField, StringField, DateTimeField, DictField, ListField
 
 class SavedSearch(db.Document):
     user = ReferenceField('User', required=True)
@@ -9,6 +9,32 @@ class SavedSearch(db.Document):
     date_saved = DateTimeField(default=datetime.utcnow)
     name = StringField(max_length=100)
 
+    # Compiled form of search_query_params, kept up to date by clean().
+    # '*' means the search does not constrain that field.
+    uniform_type_key = StringField(default='*')
+    size_key = StringField(default='*')
+    gender_key = StringField(default='*')
+    condition_key = StringField(default='*')
+    listing_type_key = StringField(default='*')
+    price_buckets = ListField(IntField(), default=list) # Price buckets the search's price range overlaps
+    criteria = DictField() # Residual substring and exact price checks
+
+    meta = {
+        'index_background': True,
+        'indexes': [
+            {'fields': ('user', '-date_saved')},
+            # Percolation: find candidate searches for a new listing
+            {'fields': ('uniform_type_key', 'size_key', 'gender_key', 'condition_key', 'listing_type_key', 'price_buckets')},
+        ]
+    }
+
+    def clean(self):
+        """
+        Compiles search_query_params into the indexed percolation keys on every save.
+        """
+        from app.services.saved_search_percolator import saved_search_percolator
+        saved_search_percolator.compile_into(self)
+
     def __repr__(self):
         """
         String representation of the SavedSearch object.
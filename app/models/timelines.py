@@ -0,0 +1,26 @@
+# app/models/timelines.py
+from datetime import datetime
+from app.extensions import db
+from mongoengine.fields import ReferenceField, ListField, DictField, DateTimeField
+
+class Timeline(db.Document):
+    """
+    Timeline Model: A user's home timeline of new listings from the users they
+    follow, written ahead of time by the timeline fan-out job (see
+    app/services/timeline_service.py) so reading it is a single lookup.
+
+    Entries are kept newest first and capped at TIMELINE_MAX_ENTRIES. Each is
+    a plain dict: listing, author (ObjectIds), action_type, description and
+    created_at.
+    """
+    user = ReferenceField('User', required=True, unique=True)
+    entries = ListField(DictField())
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'timelines',
+        'index_background': True
+    }
+
+    def __repr__(self):
+        return f"Timeline(User: {self._data.get('user')}, Entries: {len(self.entries)})"
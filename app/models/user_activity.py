@@ -14,9 +14,17 @@ class UserActivity(db.Document):
 
     meta = {
         'collection': 'user_activities',
+        'index_background': True,
         'indexes': [
-            'action_type',
-            'timestamp',
+            # Activity feed: filter or sort by type, newest first, and the
+            # (timestamp, _id) keyset. The single-field timestamp index is not
+            # declared here: it carries the retention TTL and is managed by
+            # 'manage.py activities apply-retention'
+            {'fields': ('action_type', '-timestamp', '-id')},
+            {'fields': ('-timestamp', '-id')},
+            # Per-user history (recommendations) and followed-users activity panels
+            {'fields': ('user', 'action_type', '-timestamp')},
+            {'fields': ('user', '-timestamp')},
         ]
     }
 
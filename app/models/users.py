@@ -15,10 +15,8 @@ def load_user(user_id):
     Loads a user from the database given their ID.
     Required by Flask-Login.
     """
-    try:
-        return User.objects.get(id=user_id)
-    except User.DoesNotExist:
-        return None
+    from app.services.session_principal import session_principals
+    return session_principals.load(user_id)
 
 class User(db.Document, UserMixin):
     """
@@ -87,6 +85,10 @@ class User(db.Document, UserMixin):
     notify_new_follower = db.BooleanField(default=True)
     notify_admin_announcement = db.BooleanField(default=True)
 
+    # Denormalised count of unread notifications for the header badge,
+    # maintained by app.services.notification_counter
+    unread_notifications = db.IntField(default=0)
+
 
     # Payout details for sellers
     bank_name = db.StringField(max_length=100, required=False)
@@ -99,6 +101,20 @@ class User(db.Document, UserMixin):
 
     # New field for last seen timestamp
     last_seen = db.DateTimeField(default=datetime.utcnow)
+    # Refreshed by the presence tracker while the user has a socket open and
+    # cleared when they disconnect; unset means offline
+    online_until = db.DateTimeField()
+
+    # Set by the timeline fan-out job for accounts with more followers than
+    # TIMELINE_FANOUT_LIMIT: their listings are merged into followers'
+    # timelines at read time instead of being written to each one
+    timeline_fanout_on_read = db.BooleanField(default=False)
+
+    meta = {
+        'indexes': [
+            {'fields': ['timeline_fanout_on_read'], 'partialFilterExpression': {'timeline_fanout_on_read': True}}
+        ]
+    }
 
     # Relationships to other models
     # saved_searches = db.relationship('SavedSearch', backref='user_saver', lazy=True)
@@ -107,19 +123,13 @@ class User(db.Document, UserMixin):
 
     
 
-    def get_followed_users_listings(self):
+    def get_followed_users_listings(self, limit=None):
         """
-        Retrieves listings from users that the current user is following.
+        Retrieves listings from users that the current user is following,
+        newest first, from the user's precomputed timeline.
         """
-        followed_users_ids = [follow.followed.id for follow in Follow.objects(follower=self.id)]
-        if not followed_users_ids:
-            return []
-        
-        # Fetch listings from followed users, ordered by creation date
-        listings = Listing.objects(user__in=followed_users_ids).order_by('-date_posted')
-        return listings
-
-    
+        from app.services.timeline_service import timeline_service
+        return timeline_service.get_listings(self.id, limit=limit)
 
     # Relationships to other models
     # saved_searches = db.relationship('SavedSearch', backref='user_saver', lazy=True)
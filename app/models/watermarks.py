@@ -0,0 +1,69 @@
+# app/models/watermarks.py
+import os
+import socket
+from datetime import datetime, timedelta
+from app.extensions import db
+from mongoengine.errors import NotUniqueError
+from mongoengine.fields import StringField, DateTimeField, ObjectIdField
+from mongoengine.queryset.visitor import Q
+
+class Watermark(db.Document):
+    """
+    Watermark Model: The high-water mark of an incremental batch job.
+    Records the _id (and its generation time) of the last document a job
+    processed, plus a lease so that overlapping runs of the same job do not
+    process the same documents at the same time.
+    """
+    name = StringField(max_length=100, required=True, unique=True) # e.g. 'check_saved_searches'
+    last_date = DateTimeField()
+    last_id = ObjectIdField()
+    lease_owner = StringField(max_length=100)
+    lease_until = DateTimeField()
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {'collection': 'watermarks'}
+
+    def __repr__(self):
+        return f"Watermark('{self.name}', {self.last_date}, {self.last_id})"
+
+    @classmethod
+    def acquire(cls, name, owner, lease=timedelta(minutes=30)):
+        """
+        Takes the lease on the named watermark, creating it if needed.
+        Returns the Watermark, or None if another run currently holds it.
+        """
+        now = datetime.utcnow()
+        try:
+            return cls.objects(Q(name=name) & (Q(lease_until__exists=False) | Q(lease_until=None) | Q(lease_until__lt=now))).modify(
+                upsert=True,
+                new=True,
+                set__lease_owner=owner,
+                set__lease_until=now + lease
+            )
+        except NotUniqueError:
+            # The watermark exists and its lease is held by someone else
+            return None
+
+    @classmethod
+    def claim_interval(cls, name, interval):
+        """
+        Claims one run of a periodic job that every process schedules (e.g.
+        one scheduler per gunicorn worker). Returns True for the first caller
+        in each interval and False for the others. The lease is not released,
+        so it also keeps later callers out until the interval has nearly passed.
+        """
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        return cls.acquire(name, owner, lease=interval * 0.9) is not None
+
+    def advance(self, last_date, last_id):
+        """Moves the mark forward after a batch has been fully processed."""
+        self.last_date = last_date
+        self.last_id = last_id
+        Watermark.objects(id=self.id, lease_owner=self.lease_owner).update(
+            set__last_date=last_date,
+            set__last_id=last_id,
+            set__updated_at=datetime.utcnow()
+        )
+
+    def release(self):
+        Watermark.objects(id=self.id, lease_owner=self.lease_owner).update(unset__lease_owner=True, unset__lease_until=True)
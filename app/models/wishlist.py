@@ -8,6 +8,16 @@ class WishlistItem(db.Document):
     listing = ReferenceField('Listing', required=True)
     date_added = DateTimeField(default=datetime.utcnow)
 
+    meta = {
+        'index_background': True,
+        'indexes': [
+            # "Is this in my wishlist?" checks and the wishlist page
+            {'fields': ('user', 'listing')},
+            # Clean-up on listing deletion and wishlist match scripts
+            {'fields': ('listing',)},
+        ]
+    }
+
     def __repr__(self):
         """
         String representation of the WishlistItem object.
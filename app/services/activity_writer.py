@@ -0,0 +1,134 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from app.models.user_activity import UserActivity
+
+
+class ActivityWriter:
+    """
+    Buffers UserActivity records in memory and writes them from a background
+    thread, so logging an activity never waits on MongoDB.
+
+    record() only puts a dict on a bounded queue. The writer thread drains
+    it and writes with one insert_many whenever ACTIVITY_BATCH_SIZE records
+    are waiting or ACTIVITY_FLUSH_INTERVAL seconds have passed, and once more
+    when the process exits. If the queue is full (MongoDB down or too slow)
+    new records are dropped rather than blocking the request; dropped and
+    flushed records are counted in stats().
+    """
+
+    def __init__(self):
+        self._app = None
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.batch_size = 500
+        self.flush_interval = 2.0
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+
+    def init_app(self, app):
+        if self._app is not None:
+            return
+        self._app = app
+        self.batch_size = app.config.get('ACTIVITY_BATCH_SIZE', 500)
+        self.flush_interval = app.config.get('ACTIVITY_FLUSH_INTERVAL', 2.0)
+        self._queue = queue.Queue(maxsize=app.config.get('ACTIVITY_BUFFER_SIZE', 10000))
+        atexit.register(self.shutdown)
+
+    def record(self, **fields):
+        """
+        Queues one activity (UserActivity field values; pass the user's id,
+        not the document). Returns False if the record had to be dropped.
+        """
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enqueued': self.enqueued,
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+                'pending': self._queue.qsize() if self._queue else 0
+            }
+
+    def _ensure_thread(self):
+        # Started lazily, and restarted in a process forked after it started
+        # (e.g. gunicorn workers), since threads do not survive fork()
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='activity-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while not self._stop.is_set():
+            try:
+                batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0.05)))
+            except queue.Empty:
+                pass
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+        self._write(batch + self._drain())
+
+    def _drain(self):
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                return records
+
+    def _write(self, records):
+        for start in range(0, len(records), self.batch_size):
+            chunk = records[start:start + self.batch_size]
+            try:
+                UserActivity._get_collection().insert_many(
+                    [UserActivity(**record).to_mongo() for record in chunk],
+                    ordered=False
+                )
+            except Exception as e:
+                with self._lock:
+                    self.dropped += len(chunk)
+                self._app.logger.error(f"Failed to write {len(chunk)} user activities: {e}")
+                continue
+            with self._lock:
+                self.flushed += len(chunk)
+
+    def shutdown(self, timeout=10):
+        """Stops the writer thread and writes everything still queued."""
+        if self._queue is None:
+            return
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self._stop.set()
+            self._thread.join(timeout)
+        else:
+            self._write(self._drain())
+        stats = self.stats()
+        if stats['dropped']:
+            self._app.logger.warning(f"Activity writer stopped: {stats['flushed']} flushed, {stats['dropped']} dropped")
+
+activity_writer = ActivityWriter()
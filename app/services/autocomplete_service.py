@@ -0,0 +1,162 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from heapq import nlargest
+from flask import current_app
+from mongoengine import signals
+from app.models.listings import Listing
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = {'and', 'the', 'for', 'with', 'size', 'new', 'used', 'age'}
+
+
+def normalise(text):
+    """Lowercases text and collapses anything that is not a letter or digit into single spaces."""
+    return ' '.join(_TOKEN_RE.findall((text or '').lower()))
+
+
+class AutocompleteService:
+    """
+    In-memory prefix index powering the marketplace search box.
+
+    Keys are normalised title words, school names and brands of available
+    listings, kept in a sorted list so a prefix lookup is two binary searches.
+    Each key remembers how many listings contribute to it, which is what
+    suggestions are ranked by. The index is built on the first lookup in each
+    process, kept fresh from Listing post_save/post_delete signals in this
+    process and, once built, rebuilt on an interval to pick up writes made by
+    other workers. Processes that never suggest (CLI commands, the job
+    worker) never build it.
+    """
+    MIN_TOKEN_LENGTH = 3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []          # sorted normalised keys
+        self._entries = {}       # key -> {'display': str, 'count': int}
+        self._by_listing = {}    # listing id -> set of keys it contributed
+        self._build_lock = threading.Lock()
+        self._built = False
+        self._signals_connected = False
+
+    def init_app(self, app):
+        """Connects the Listing signals. The index itself is built on first lookup."""
+        if not self._signals_connected:
+            signals.post_save.connect(self._on_listing_saved, sender=Listing)
+            signals.post_delete.connect(self._on_listing_deleted, sender=Listing)
+            self._signals_connected = True
+
+    def _ensure_built(self):
+        """
+        Builds the index if this process has not yet. Concurrent first lookups
+        wait for one build; a failed build is logged and retried on the next
+        lookup. Returns whether the index is built.
+        """
+        if self._built:
+            return True
+        with self._build_lock:
+            if not self._built:
+                try:
+                    self.rebuild()
+                except Exception as e:
+                    current_app.logger.error(f"Failed to build autocomplete index: {e}")
+        return self._built
+
+    def refresh(self):
+        """Rebuilds the index if this process has built it; used by the scheduled job."""
+        if self._built:
+            self.rebuild()
+
+    def _keys_for(self, title, school_name, brand):
+        """Returns {key: display} for the terms a listing contributes."""
+        keys = {}
+        for token in _TOKEN_RE.findall((title or '').lower()):
+            if len(token) >= self.MIN_TOKEN_LENGTH and token not in _STOP_WORDS and not token.isdigit():
+                keys.setdefault(token, token)
+        for phrase in (school_name, brand):
+            key = normalise(phrase)
+            if key:
+                keys.setdefault(key, phrase.strip())
+        return keys
+
+    def _add(self, listing_id, keys):
+        for key, display in keys.items():
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = {'display': display, 'count': 1}
+                insort(self._keys, key)
+            else:
+                entry['count'] += 1
+        self._by_listing[listing_id] = set(keys)
+
+    def _remove(self, listing_id):
+        for key in self._by_listing.pop(listing_id, ()):
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            entry['count'] -= 1
+            if entry['count'] <= 0:
+                del self._entries[key]
+                index = bisect_left(self._keys, key)
+                if index < len(self._keys) and self._keys[index] == key:
+                    del self._keys[index]
+
+    def rebuild(self):
+        """
+        Rebuilds the whole index from the available listings in one projected query.
+        """
+        entries = {}
+        by_listing = {}
+        rows = Listing.objects(is_available=True).only('id', 'title', 'school_name', 'brand').as_pymongo()
+        for row in rows:
+            keys = self._keys_for(row.get('title'), row.get('school_name'), row.get('brand'))
+            for key, display in keys.items():
+                entry = entries.get(key)
+                if entry is None:
+                    entries[key] = {'display': display, 'count': 1}
+                else:
+                    entry['count'] += 1
+            by_listing[str(row['_id'])] = set(keys)
+
+        with self._lock:
+            self._entries = entries
+            self._by_listing = by_listing
+            self._keys = sorted(entries)
+            self._built = True
+        current_app.logger.info(f"Autocomplete index rebuilt with {len(entries)} terms from {len(by_listing)} listings.")
+
+    def index_listing(self, listing):
+        """
+        Adds or refreshes a single listing. Unavailable listings are removed instead.
+        """
+        listing_id = str(listing.id)
+        with self._lock:
+            self._remove(listing_id)
+            if listing.is_available:
+                self._add(listing_id, self._keys_for(listing.title, listing.school_name, listing.brand))
+
+    def remove_listing(self, listing_id):
+        with self._lock:
+            self._remove(str(listing_id))
+
+    def suggest(self, prefix, limit=8):
+        """
+        Returns up to `limit` completions for prefix, most common first.
+        """
+        key = normalise(prefix)
+        if not key or not self._ensure_built():
+            return []
+        with self._lock:
+            start = bisect_left(self._keys, key)
+            end = bisect_left(self._keys, key + '\uffff', lo=start)
+            matches = [self._entries[k] for k in self._keys[start:end]]
+        best = nlargest(limit, matches, key=lambda entry: entry['count'])
+        return [entry['display'] for entry in best]
+
+    def _on_listing_saved(self, sender, document, **kwargs):
+        self.index_listing(document)
+
+    def _on_listing_deleted(self, sender, document, **kwargs):
+        self.remove_listing(document.id)
+
+autocomplete_service = AutocompleteService()
@@ -15,6 +15,9 @@ def send_email(to, subject, template, **kwargs):
         subject (str): The subject of the email.
         template (str): The name of the HTML template to render for the email body.
         **kwargs: Additional keyword arguments to pass to the template.
+
+    Returns:
+        bool: True if the email was handed to the mail server.
     """
     msg = Message(
         subject,
@@ -25,5 +28,7 @@ def send_email(to, subject, template, **kwargs):
     try:
         mail.send(msg)
         print(f"Email sent to {to} with subject: {subject}")
+        return True
     except Exception as e:
         print(f"Failed to send email to {to}: {e}")
+        return False
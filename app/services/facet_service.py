@@ -0,0 +1,106 @@
+import re
+from app.models.listings import Listing
+from app.services.marketplace_cache import marketplace_cache
+from app.services.search_service import search_service
+from app.utils.cache import TTLCache
+
+
+class FacetService:
+    """
+    Computes per-value listing counts for the marketplace filter dropdowns.
+
+    All facets for a filter set come from a single $facet aggregation. Each
+    facet is counted with every active filter except its own, so picking
+    "Blue" still shows how many listings the other colours would give.
+    Brand and colour are filtered by case-insensitive substring, so their
+    values are merged case-insensitively and each is counted as the listings
+    that filter would return (a "Nike" count includes "nike" and "Nike Kids").
+    Results are cached per normalised filter signature under the marketplace
+    cache generation, so any listing write makes them unreachable.
+    """
+    FACET_FIELDS = marketplace_cache.CHOICE_FILTERS
+    # Facets the marketplace matches by substring rather than exact value
+    PARTIAL_MATCH_FIELDS = ('brand', 'color')
+
+    def __init__(self, cache_ttl=120, cache_size=512):
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def _field_condition(self, field, value):
+        if field in self.PARTIAL_MATCH_FIELDS or field == 'location':
+            return {'$regex': re.escape(value), '$options': 'i'}
+        return value
+
+    def _base_match(self, filters):
+        """Conditions shared by every facet: availability, text search, location and price."""
+        match = {'is_available': True}
+        # Same rule as the listing grid: terms normalise_term rejects are ignored
+        term = search_service.normalise_term(filters.get('search_term'))
+        if term is not None:
+            match['$text'] = {'$search': term}
+        if 'location' in filters:
+            match['location'] = self._field_condition('location', filters['location'])
+        price = {}
+        if 'min_price' in filters:
+            price['$gte'] = filters['min_price']
+        if 'max_price' in filters:
+            price['$lte'] = filters['max_price']
+        if price:
+            match['price'] = price
+        return match
+
+    def _build_pipeline(self, filters):
+        facets = {}
+        for field in self.FACET_FIELDS:
+            others = {
+                other: self._field_condition(other, filters[other])
+                for other in self.FACET_FIELDS
+                if other != field and other in filters
+            }
+            stages = [{'$match': others}] if others else []
+            stages += [
+                {'$group': {'_id': f'${field}', 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1, '_id': 1}},
+            ]
+            facets[field] = stages
+        return [{'$match': self._base_match(filters)}, {'$facet': facets}]
+
+    @staticmethod
+    def _substring_counts(rows):
+        """
+        Turns exact-value counts into the counts a case-insensitive substring
+        filter gives: spellings differing only in case are merged under the
+        most common one, and each value also counts the values containing it.
+        """
+        spellings = {}
+        for value, count in rows:
+            spellings.setdefault(value.lower(), []).append((count, value))
+        totals = {key: sum(count for count, _ in variants) for key, variants in spellings.items()}
+        merged = [
+            (max(variants, key=lambda variant: (variant[0], variant[1]))[1],
+             sum(total for other, total in totals.items() if key in other))
+            for key, variants in spellings.items()
+        ]
+        return sorted(merged, key=lambda row: (-row[1], row[0]))
+
+    def get_facets(self, filters):
+        """
+        Returns {field: [(value, count), ...]} for every facet field, most common
+        value first. Missing and empty values are left out.
+        """
+        key = (marketplace_cache.generation(), marketplace_cache.signature(filters))
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        result = next(iter(Listing.objects.aggregate(self._build_pipeline(filters))), {})
+        facets = {
+            field: [(row['_id'], row['count']) for row in result.get(field, []) if row['_id'] not in (None, '')]
+            for field in self.FACET_FIELDS
+        }
+        for field in self.PARTIAL_MATCH_FIELDS:
+            if field in facets:
+                facets[field] = self._substring_counts(facets[field])
+        self._cache.set(key, facets)
+        return facets
+
+facet_service = FacetService()
@@ -0,0 +1,180 @@
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from mongoengine.queryset.visitor import Q
+from app.models.jobs import Job
+
+
+class JobQueue:
+    """
+    A durable job queue stored in the `jobs` collection.
+
+    Web requests call enqueue() and return immediately; `manage.py run-worker`
+    claims jobs one at a time with an atomic find-and-modify, so any number of
+    workers can share the queue. Failed jobs are retried with exponential
+    backoff and moved to the 'dead' status (the dead-letter queue) after
+    max_attempts. Every attempt records its duration.
+
+    While a job runs, a heartbeat thread refreshes its heartbeat_at every
+    HEARTBEAT_INTERVAL, so a long job keeps its claim for as long as its
+    worker is alive. Only jobs whose heartbeat has stopped for STALE_AFTER
+    (the worker died) are claimed again.
+    """
+    RETRY_BASE_SECONDS = 10
+    HEARTBEAT_INTERVAL = timedelta(seconds=30)
+    # A running job whose worker has been silent this long is assumed lost
+    STALE_AFTER = timedelta(minutes=5)
+
+    def __init__(self):
+        self._tasks = {}
+
+    def task(self, name):
+        """
+        Decorator registering a function as the handler for jobs called `name`.
+        The function receives the job payload as keyword arguments.
+        """
+        def register(fn):
+            self._tasks[name] = fn
+            return fn
+        return register
+
+    def enqueue(self, name, max_attempts=5, delay=None, **payload):
+        """
+        Adds a job to the queue and returns it. Payload values must be BSON
+        serialisable, so pass ids as strings rather than documents.
+        """
+        if name not in self._tasks:
+            raise ValueError(f"Unknown job '{name}'")
+        run_after = datetime.utcnow() + delay if delay else datetime.utcnow()
+        job = Job(name=name, payload=payload, max_attempts=max_attempts, run_after=run_after)
+        job.save()
+        return job
+
+    def claim(self, worker_id):
+        """Atomically takes the oldest runnable job, or returns None if there is none."""
+        now = datetime.utcnow()
+        return Job.objects(status='queued', run_after__lte=now).order_by('run_after').modify(
+            new=True,
+            set__status='running',
+            set__locked_by=worker_id,
+            set__started_at=now,
+            set__heartbeat_at=now,
+            inc__attempts=1
+        )
+
+    def _heartbeat(self, job, stop):
+        """Refreshes heartbeat_at until `stop` is set, while the job is still ours."""
+        interval = self.HEARTBEAT_INTERVAL.total_seconds()
+        while not stop.wait(interval):
+            try:
+                Job.objects(id=job.id, status='running', locked_by=job.locked_by).update(set__heartbeat_at=datetime.utcnow())
+            except Exception:
+                # A missed beat is harmless; the next one retries
+                pass
+
+    def requeue_stale(self):
+        """
+        Returns jobs left 'running' by a crashed worker to the queue. Jobs that
+        have already used up their attempts (e.g. ones that keep killing their
+        worker) are dead-lettered instead. Returns the number requeued.
+        """
+        now = datetime.utcnow()
+        cutoff = now - self.STALE_AFTER
+        # Jobs claimed before heartbeats existed only have started_at
+        stale = Job.objects(
+            Q(heartbeat_at__lt=cutoff) | (Q(heartbeat_at__exists=False) & Q(started_at__lt=cutoff)),
+            status='running'
+        )
+        exhausted = {'$expr': {'$gte': ['$attempts', '$max_attempts']}}
+        dead = stale.filter(__raw__=exhausted).update(
+            set__status='dead',
+            set__finished_at=now,
+            set__last_error='Worker lost while running the job; attempts exhausted',
+            unset__locked_by=True
+        )
+        if dead:
+            current_app.logger.error(f"Dead-lettered {dead} stale jobs that had exhausted their attempts")
+        return stale.filter(__raw__={'$expr': {'$lt': ['$attempts', '$max_attempts']}}).update(
+            set__status='queued',
+            set__run_after=now,
+            unset__locked_by=True
+        )
+
+    def run_job(self, job):
+        """
+        Runs a claimed job and records the outcome: 'done', back to 'queued'
+        with a backoff delay, or 'dead' once its attempts are used up.
+        """
+        handler = self._tasks.get(job.name)
+        started = time.perf_counter()
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, stop), name=f'job-heartbeat-{job.id}', daemon=True)
+        heartbeat.start()
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job '{job.name}'")
+            handler(**(job.payload or {}))
+        except Exception as e:
+            stop.set()
+            duration_ms = (time.perf_counter() - started) * 1000
+            error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+            if job.attempts >= job.max_attempts:
+                Job.objects(id=job.id).update(
+                    set__status='dead',
+                    set__finished_at=datetime.utcnow(),
+                    set__duration_ms=duration_ms,
+                    set__last_error=error,
+                    unset__locked_by=True
+                )
+                current_app.logger.error(f"Job {job.name} ({job.id}) dead-lettered after {job.attempts} attempts: {error}")
+            else:
+                backoff = timedelta(seconds=self.RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+                Job.objects(id=job.id).update(
+                    set__status='queued',
+                    set__run_after=datetime.utcnow() + backoff,
+                    set__duration_ms=duration_ms,
+                    set__last_error=error,
+                    unset__locked_by=True
+                )
+                current_app.logger.warning(f"Job {job.name} ({job.id}) failed on attempt {job.attempts}, retrying in {backoff}: {error}")
+            return False
+
+        stop.set()
+        duration_ms = (time.perf_counter() - started) * 1000
+        Job.objects(id=job.id).update(
+            set__status='done',
+            set__finished_at=datetime.utcnow(),
+            set__duration_ms=duration_ms,
+            unset__locked_by=True
+        )
+        current_app.logger.info(f"Job {job.name} ({job.id}) done in {duration_ms:.1f} ms")
+        return True
+
+    def work(self, poll_interval=1.0, burst=False):
+        """
+        Processes jobs until interrupted. With burst=True, returns as soon as
+        the queue is empty instead of polling.
+        """
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        current_app.logger.info(f"Job worker {worker_id} started")
+        last_reap = 0
+        while True:
+            if time.monotonic() - last_reap > 60:
+                requeued = self.requeue_stale()
+                if requeued:
+                    current_app.logger.warning(f"Requeued {requeued} stale jobs")
+                last_reap = time.monotonic()
+
+            job = self.claim(worker_id)
+            if job is None:
+                if burst:
+                    return
+                time.sleep(poll_interval)
+                continue
+            self.run_job(job)
+
+job_queue = JobQueue()
@@ -0,0 +1,82 @@
+# Background jobs fanned out after a listing is created.
+# Enqueued by listings.create_listing and run by `manage.py run-worker`.
+from flask import current_app
+from app.models.listings import Listing
+from app.models.notifications import Notification
+from app.services.job_queue import job_queue
+from app.services.fraud_detection_service import FraudDetectionService
+from app.services.saved_search_percolator import saved_search_percolator
+import app.services.timeline_service  # noqa: F401  Registers the timeline jobs
+from app.utils.activity_logger import log_activity
+
+
+@job_queue.task('listing.analyze_fraud')
+def analyze_listing_fraud(listing_id):
+    FraudDetectionService.analyze_listing_for_suspicion(listing_id)
+
+
+@job_queue.task('activity.log')
+def log_activity_job(user_id, action_type, description, payload=None, ip_address=None):
+    # Written before the job is marked done, so a worker crash retries it
+    # instead of losing an event that was only in the in-memory buffer
+    log_activity(
+        user_id=user_id,
+        action_type=action_type,
+        description=description,
+        payload=payload,
+        ip_address=ip_address,
+        buffered=False
+    )
+
+
+@job_queue.task('listing.percolate_saved_searches')
+def notify_saved_search_matches(listing_id):
+    """
+    Notifies the owners of saved searches matched by a new listing.
+    """
+    from app.blueprints.notifications.routes import add_notifications_bulk
+
+    listing = Listing.objects(id=listing_id).first()
+    if not listing or not listing.is_available:
+        return
+
+    matches = saved_search_percolator.percolate(listing, exclude_user_id=listing.owner_id)
+
+    # One notification per (user, listing): users already notified, e.g. by an
+    # earlier attempt of this job that failed part-way, are skipped
+    entries = {}
+    for saved_search in matches:
+        user_id = getattr(saved_search._data.get('user'), 'id', saved_search._data.get('user'))
+        if user_id is not None and user_id not in entries:
+            entries[user_id] = {
+                'user_id': user_id,
+                'message': f"New listing matching your saved search '{saved_search.name or 'Unnamed Search'}': {listing.title}",
+                'notification_type': 'saved_search_match',
+                'payload': {'listing_id': str(listing.id)}
+            }
+    if entries:
+        for row in Notification.objects(
+            user__in=list(entries),
+            notification_type='saved_search_match',
+            payload__listing_id=str(listing.id)
+        ).only('user').as_pymongo():
+            entries.pop(row['user'], None)
+    add_notifications_bulk(entries.values())
+    current_app.logger.info(f"Listing {listing.id} matched {len(matches)} saved searches, notified {len(entries)} users")
+
+
+def enqueue_listing_created(listing, ip_address=None):
+    """
+    Queues all side effects of a newly created listing.
+    """
+    job_queue.enqueue('listing.analyze_fraud', listing_id=str(listing.id))
+    job_queue.enqueue(
+        'activity.log',
+        user_id=str(listing.owner_id),
+        action_type='listing_created',
+        description=f"Created new listing: '{listing.title}' (ID: {listing.id})",
+        payload={'listing_id': str(listing.id), 'listing_type': listing.listing_type},
+        ip_address=ip_address
+    )
+    job_queue.enqueue('listing.percolate_saved_searches', listing_id=str(listing.id))
+    job_queue.enqueue('timeline.fan_out_listing', listing_id=str(listing.id))
@@ -0,0 +1,86 @@
+from flask import current_app
+from mongoengine import signals
+from app.extensions import cache
+from app.models.listings import Listing
+from app.utils.cache import TTLCache, bump_generation, generation_timeout, read_generation
+
+
+class MarketplaceCache:
+    """
+    Caches rendered-ready marketplace pages keyed on the canonical filter set.
+
+    Pages live in a size-bounded, per-worker LRU. Invalidation is by
+    generation: every key embeds the current listings generation, which is
+    kept in the Flask-Caching backend and bumped on Listing post_save and
+    post_delete. Bumping never touches the cached pages; entries from old
+    generations simply stop being asked for and fall out of the LRU. With a
+    shared backend (e.g. CACHE_TYPE=RedisCache) one bump invalidates every
+    worker at once. With the default per-process SimpleCache other workers
+    only move on when their own counter expires, after LOCAL_GENERATION_TTL
+    seconds (see app.utils.cache.generation_timeout).
+    """
+    GENERATION_KEY = 'marketplace:listings_generation'
+    TEXT_FILTERS = ('search_term', 'location')
+    CHOICE_FILTERS = ('uniform_type', 'condition', 'size', 'gender', 'listing_type', 'brand', 'color')
+    PRICE_FILTERS = ('min_price', 'max_price')
+
+    def __init__(self, maxsize=256, ttl=300):
+        self._pages = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generation_timeout = 0
+        self._signals_connected = False
+
+    def init_app(self, app):
+        self._generation_timeout = generation_timeout(app.config)
+        if not self._signals_connected:
+            signals.post_save.connect(self._on_listing_changed, sender=Listing)
+            signals.post_delete.connect(self._on_listing_changed, sender=Listing)
+            self._signals_connected = True
+
+    def normalise_filters(self, args):
+        """
+        Reduces request args to the marketplace filters that actually constrain
+        the result set: blanks and 'All' are dropped, text is whitespace-collapsed
+        and prices are parsed. Equal filter sets always normalise to equal dicts.
+        """
+        filters = {}
+        for key in self.TEXT_FILTERS + self.CHOICE_FILTERS:
+            value = ' '.join((args.get(key) or '').split())
+            if value and value != 'All':
+                filters[key] = value
+        for key in self.PRICE_FILTERS:
+            try:
+                value = float(args.get(key))
+            except (TypeError, ValueError):
+                continue
+            filters[key] = value
+        return filters
+
+    def signature(self, filters):
+        """Returns a hashable, order-independent key for a normalised filter dict."""
+        return tuple(sorted(filters.items()))
+
+    def generation(self):
+        """Returns the current listings generation."""
+        return read_generation(cache, self.GENERATION_KEY, self._generation_timeout)
+
+    def invalidate(self):
+        """Moves every worker on to a new generation."""
+        try:
+            bump_generation(cache, self.GENERATION_KEY, self._generation_timeout)
+        except Exception as e:
+            current_app.logger.error(f"Failed to bump marketplace cache generation: {e}")
+            self._pages.clear()
+
+    def page_key(self, filters, sort_by, after=None, before=None):
+        return (self.generation(), self.signature(filters), sort_by, after, before)
+
+    def get_page(self, key):
+        return self._pages.get(key)
+
+    def set_page(self, key, page):
+        self._pages.set(key, page)
+
+    def _on_listing_changed(self, sender, document, **kwargs):
+        self.invalidate()
+
+marketplace_cache = MarketplaceCache()
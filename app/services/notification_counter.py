@@ -0,0 +1,135 @@
+from mongoengine import signals
+from pymongo import UpdateOne
+from app.models.notifications import Notification
+from app.models.users import User
+from app.services.session_principal import session_principals
+
+
+class NotificationCounter:
+    """
+    Maintains User.unread_notifications, the denormalised count of a user's
+    unread notifications shown in the header badge.
+
+    Notifications created with save() are counted through the Notification
+    post_save signal. Bulk inserts, read-state changes and deletions adjust the
+    counter explicitly through incr_many(), decr() and delete(); there is no
+    post_delete signal, since connecting one makes MongoEngine delete
+    querysets document by document. Every update is a single atomic $inc or $set on the
+    user document, so concurrent writers never lose counts; reconcile()
+    recomputes the counters from the notifications themselves to repair any
+    drift (e.g. from writes that bypass this class). Run the
+    backfill-notification-counters command once before deploying code that
+    reads the counter, so existing users start from their real count.
+    """
+
+    def __init__(self):
+        self._signals_connected = False
+
+    def init_app(self, app):
+        if not self._signals_connected:
+            signals.post_save.connect(self._on_notification_saved, sender=Notification)
+            self._signals_connected = True
+
+    def _user_id(self, user):
+        return getattr(user, 'id', user)
+
+    def get(self, user):
+        """Returns the stored unread count for a user (or user id)."""
+        doc = User.objects(id=self._user_id(user)).only('unread_notifications').as_pymongo().first()
+        return max((doc or {}).get('unread_notifications', 0), 0)
+
+    def get_many(self, users):
+        """Returns {user_id: unread count} for several users in one query."""
+        return {
+            doc['_id']: max(doc.get('unread_notifications', 0), 0)
+            for doc in User.objects(id__in=[self._user_id(user) for user in users]).only('unread_notifications').as_pymongo()
+        }
+
+    def incr(self, user, by=1):
+        User.objects(id=self._user_id(user)).update_one(inc__unread_notifications=by)
+        session_principals.invalidate(self._user_id(user))
+
+    def incr_many(self, counts):
+        """
+        Increments several users' counters in one round trip. `counts` maps a
+        user (or user id) to the number of new unread notifications.
+        """
+        operations = [
+            UpdateOne({'_id': self._user_id(user)}, {'$inc': {'unread_notifications': count}})
+            for user, count in counts.items() if count
+        ]
+        if operations:
+            User._get_collection().bulk_write(operations, ordered=False)
+            for user, count in counts.items():
+                if count:
+                    session_principals.invalidate(self._user_id(user))
+
+    def decr(self, user, by=1):
+        """Decrements a user's counter, never taking it below zero."""
+        user_id = self._user_id(user)
+        if not User.objects(id=user_id, unread_notifications__gte=by).update_one(dec__unread_notifications=by):
+            User.objects(id=user_id).update_one(set__unread_notifications=0)
+        session_principals.invalidate(user_id)
+
+    def delete(self, notifications):
+        """
+        Deletes a Notification queryset in one operation and decrements each
+        owner's counter by the unread notifications removed. Returns the
+        number of notifications deleted.
+        """
+        unread = {
+            row['_id']: row['count']
+            for row in notifications.filter(is_read=False).aggregate([
+                {'$group': {'_id': '$user', 'count': {'$sum': 1}}}
+            ])
+        }
+        deleted = notifications.delete()
+        for user_id, count in unread.items():
+            if user_id is not None:
+                self.decr(user_id, count)
+        return deleted
+
+    def reconcile(self):
+        """
+        Recomputes every user's counter from the unread notifications with one
+        aggregation and one bulk write. Returns the number of users corrected.
+
+        The stored counters are read before the notifications are counted and
+        each correction is a compare-and-set against the value read, so a
+        counter moved by a concurrent incr() or decr() is left alone rather
+        than overwritten with a count that may already be stale; the next run
+        picks it up. Users whose document predates the counter (no
+        unread_notifications field) are read as None and set as well.
+        """
+        stored = {
+            doc['_id']: doc.get('unread_notifications')
+            for doc in User.objects(unread_notifications__ne=0).only('id', 'unread_notifications').as_pymongo()
+        }
+        counts = {
+            row['_id']: row['count']
+            for row in Notification.objects(is_read=False).aggregate([
+                {'$group': {'_id': '$user', 'count': {'$sum': 1}}}
+            ])
+        }
+        corrections = {
+            user_id: (stored.get(user_id, 0), counts.get(user_id, 0))
+            for user_id in set(stored) | set(counts)
+            if user_id is not None and stored.get(user_id, 0) != counts.get(user_id, 0)
+        }
+        if not corrections:
+            return 0
+        result = User._get_collection().bulk_write([
+            UpdateOne({'_id': user_id, 'unread_notifications': expected}, {'$set': {'unread_notifications': count}})
+            for user_id, (expected, count) in corrections.items()
+        ], ordered=False)
+        for user_id in corrections:
+            session_principals.invalidate(user_id)
+        return result.modified_count
+
+    def _on_notification_saved(self, sender, document, created=False, **kwargs):
+        if created and not document.is_read:
+            # Raw reference value, so the user is never dereferenced here
+            self.incr(document._data.get('user'))
+
+
+notification_counter = NotificationCounter()
@@ -0,0 +1,121 @@
+import atexit
+import threading
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from app.models.users import User
+
+
+class PresenceTracker:
+    """
+    Tracks which users have an open SocketIO connection.
+
+    Online state lives in memory on each worker: connect() and disconnect()
+    only touch dicts, so a reconnect storm costs no database writes.
+    Everything is written to MongoDB by flush(), run periodically by the
+    scheduler, as batched updates: one bulk write for users who have
+    disconnected since the last flush and one update_many refreshing everyone
+    still connected to this worker.
+
+    Other workers see a user as online through User.online_until, which every
+    flush pushes ONLINE_WINDOW ahead for the users connected to this worker,
+    so presence lapses on its own if a worker dies. A user whose last socket
+    on this worker closed has online_until cleared by the next flush, but only
+    if it is still the value this worker wrote: a later refresh by another
+    worker the user is still connected to is left in place.
+    """
+    # How long a flushed connection keeps a user online without another flush
+    ONLINE_WINDOW = timedelta(minutes=5)
+
+    def __init__(self):
+        self._connections = {} # user id -> number of open sockets on this worker
+        self._pending = {} # user id -> last_seen not yet written
+        self._written = {} # user id -> online_until last written for a user connected here
+        self._departed = {} # user id -> online_until to clear at the next flush
+        self._lock = threading.Lock()
+        self._app = None
+
+    def init_app(self, app):
+        if self._app is None:
+            self._app = app
+            atexit.register(self._flush_at_exit)
+
+    def connect(self, user_id):
+        with self._lock:
+            self._connections[user_id] = self._connections.get(user_id, 0) + 1
+            self._pending[user_id] = datetime.utcnow()
+            self._departed.pop(user_id, None)
+
+    def disconnect(self, user_id):
+        with self._lock:
+            remaining = self._connections.get(user_id, 0) - 1
+            if remaining > 0:
+                self._connections[user_id] = remaining
+            else:
+                self._connections.pop(user_id, None)
+                written = self._written.pop(user_id, None)
+                if written is not None:
+                    self._departed[user_id] = written
+            self._pending[user_id] = datetime.utcnow()
+
+    def is_connected(self, user_id):
+        """Whether the user has a socket open on this worker."""
+        return user_id in self._connections
+
+    def online_now(self, user_ids=None):
+        """
+        Returns the ids of users online now, optionally restricted to user_ids:
+        those connected to this worker plus those whose online_until (set by
+        every worker's flush, cleared on disconnect) has not yet passed.
+        """
+        with self._lock:
+            local = set(self._connections)
+        query = User.objects(online_until__gt=datetime.utcnow())
+        if user_ids is not None:
+            user_ids = set(user_ids)
+            local &= user_ids
+            remaining = user_ids - local
+            if not remaining:
+                return local
+            query = query.filter(id__in=list(remaining))
+        return local | set(query.scalar('id'))
+
+    def flush(self):
+        """
+        Writes pending last_seen values, clears the presence of users who left
+        this worker and refreshes connected users. Returns the number of users
+        written.
+        """
+        now = datetime.utcnow()
+        online_until = now + self.ONLINE_WINDOW
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            departed, self._departed = self._departed, {}
+            connected = set(self._connections)
+            # Recorded before writing, so a disconnect during this flush
+            # clears the value being written now
+            for user_id in connected:
+                self._written[user_id] = online_until
+
+        # Users still connected are covered by the refresh below
+        operations = [
+            UpdateOne({'_id': user_id}, {'$set': {'last_seen': last_seen}})
+            for user_id, last_seen in pending.items() if user_id not in connected
+        ]
+        operations += [
+            UpdateOne({'_id': user_id, 'online_until': {'$lte': written}}, {'$unset': {'online_until': ''}})
+            for user_id, written in departed.items()
+        ]
+        if operations:
+            User._get_collection().bulk_write(operations, ordered=False)
+        if connected:
+            User.objects(id__in=list(connected)).update(set__last_seen=now, set__online_until=online_until)
+        return len(operations) + len(connected)
+
+    def _flush_at_exit(self):
+        try:
+            with self._app.app_context():
+                self.flush()
+        except Exception as e:
+            self._app.logger.error(f"Failed to flush presence at shutdown: {e}")
+
+presence_tracker = PresenceTracker()
@@ -1,81 +1,311 @@
+import io
+import threading
+import time
+from datetime import timedelta
+import gridfs
+import numpy as np
+from bson import ObjectId
+from flask import current_app
+from mongoengine.connection import get_db
+from pymongo import DESCENDING
+from scipy import sparse
 from app.models.user_activity import UserActivity
 from app.models.listings import Listing
 from app.models.wishlist import WishlistItem
 from app.models.users import User
-from mongoengine.queryset.visitor import Q
+from app.models.watermarks import Watermark
+
+
+class ListingFeatureIndex:
+    """
+    Feature vectors of every available listing, built by one process and
+    shared with the others through GridFS.
+
+    Each listing is a row of a sparse CSR matrix with one column per
+    (attribute, value) pair in FEATURES plus one per price bucket, i.e. a
+    one-hot encoding, L2-normalised so that listings with fewer attributes
+    filled in are not penalised. Scoring every listing against a preference
+    vector is then a single sparse matrix-vector product.
+
+    sync() runs in every worker: the worker that claims the rebuild interval
+    scans the listings and publishes the matrix, the others load the latest
+    published one if it is newer than theirs. A snapshot replaces the previous
+    one in a single assignment, so readers never see a partial load. Requests
+    never build or load: until a snapshot is loaded, snapshot() returns None,
+    starts one sync in the background, and callers fall back to other results.
+    """
+    FEATURES = ('uniform_type', 'size', 'gender', 'school_name', 'brand', 'color')
+    # Upper bounds of the sale price buckets; swaps and donations form their own bucket
+    PRICE_BUCKETS = (50, 100, 200, 400)
+    # Weight of recency when scores tie, small enough never to outrank a shared feature
+    RECENCY_WEIGHT = 1e-3
+    SNAPSHOT_BUCKET = 'feature_snapshots'
+    SNAPSHOT_NAME = 'listing_features'
+    REBUILD_INTERVAL = timedelta(minutes=15)
+    # Published versions kept, so a worker still downloading the previous one is not cut off
+    KEEP_VERSIONS = 2
 
-class RecommendationService:
     def __init__(self):
-        pass
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._file_id = None
+        self._warming = False
 
-    def get_recommendations(self, user: User, limit: int = 10) -> list[Listing]:
-        recommended_listings = []
-        viewed_categories = set()
-        viewed_brands = set()
-        wishlist_categories = set()
-        wishlist_brands = set()
-
-        # 1. Get preferences from UserActivity (browsing history)
-        recent_activities = UserActivity.objects(user=user).order_by('-timestamp').limit(50)
-        for activity in recent_activities:
-            if activity.action_type == 'viewed_listing' and activity.payload and 'listing_id' in activity.payload:
-                try:
-                    listing = Listing.objects.get(id=activity.payload['listing_id'])
-                    viewed_categories.add(listing.uniform_type)
-                    if listing.brand: # Check if brand exists
-                        viewed_brands.add(listing.brand)
-                except Listing.DoesNotExist:
-                    continue
-
-        # 2. Get preferences from Wishlist
-        user_wishlist = WishlistItem.objects(user=user).first()
-        if user_wishlist:
-            for item in user_wishlist.items:
-                wishlist_categories.add(item.category)
-                if item.brand: # Check if brand exists
-                    wishlist_brands.add(item.brand)
-
-        all_preferred_categories = list(viewed_categories.union(wishlist_categories))
-        all_preferred_brands = list(viewed_brands.union(wishlist_brands))
-
-        # Build a query for recommendations
-        query_filters = Q()
-
-        if all_preferred_categories:
-            query_filters |= Q(uniform_type__in=all_preferred_categories)
-        if all_preferred_brands:
-            query_filters |= Q(brand__in=all_preferred_brands)
-
-        # Exclude listings already viewed by the user (optional, but good for fresh recommendations)
-        viewed_listing_ids = [activity.payload['listing_id'] for activity in recent_activities if activity.action_type == 'viewed_listing' and activity.payload and 'listing_id' in activity.payload]
-        if viewed_listing_ids:
-            query_filters &= Q(id__nin=viewed_listing_ids)
-
-        # Exclude listings already in the user's wishlist
-        if user_wishlist:
-            wishlist_listing_ids = [item.listing.id for item in user_wishlist.items if item.listing]
-            if wishlist_listing_ids:
-                query_filters &= Q(id__nin=wishlist_listing_ids)
-
-        # Fetch recommendations
-        if query_filters:
-            recommended_listings = Listing.objects(query_filters).limit(limit)
-        else:
-            # Fallback: if no strong preferences, recommend popular or newest listings
-            recommended_listings = Listing.objects().order_by('-created_at').limit(limit)
-
-        return list(recommended_listings)
+    @classmethod
+    def price_bucket(cls, price):
+        if not price or price <= 0:
+            return 'price:free'
+        for upper in cls.PRICE_BUCKETS:
+            if price < upper:
+                return f'price:<{upper}'
+        return f'price:{cls.PRICE_BUCKETS[-1]}+'
 
-    def get_similar_listings(self, listing: Listing, limit: int = 5) -> list[Listing]:
+    @classmethod
+    def feature_keys(cls, listing):
+        """The feature columns a listing (a raw document) sets, as (attribute, value) keys."""
+        keys = [
+            (field, value.strip().lower())
+            for field in cls.FEATURES
+            for value in [listing.get(field)]
+            if isinstance(value, str) and value.strip()
+        ]
+        keys.append(('price', cls.price_bucket(listing.get('price'))))
+        return keys
+
+    def _files(self):
+        return gridfs.GridFS(get_db(), collection=self.SNAPSHOT_BUCKET)
+
+    def sync(self):
         """
-        Gets listings similar to a given listing based on category and brand.
+        Publishes a fresh snapshot if this process claims the rebuild interval,
+        otherwise loads the latest published one. Returns (listings, seconds)
+        for a rebuild, or None.
         """
-        query_filters = Q(
-            Q(uniform_type=listing.uniform_type) |
-            Q(brand=listing.brand)
+        with self._lock:
+            if Watermark.claim_interval('rebuild_listing_features', self.REBUILD_INTERVAL):
+                return self._publish()
+            self._refresh()
+            return None
+
+    def _publish(self):
+        count, seconds = self._build()
+        files = self._files()
+        self._file_id = files.put(self._dump(self._snapshot), filename=self.SNAPSHOT_NAME)
+        stale = files.find({'filename': self.SNAPSHOT_NAME}).sort('uploadDate', DESCENDING).skip(self.KEEP_VERSIONS)
+        for old in stale:
+            files.delete(old._id)
+        return count, seconds
+
+    def _refresh(self):
+        """Loads the latest published snapshot unless it is the one already held."""
+        latest = self._files().find_one({'filename': self.SNAPSHOT_NAME}, sort=[('uploadDate', DESCENDING)])
+        if latest is None or latest._id == self._file_id:
+            return False
+        self._snapshot = self._undump(latest.read())
+        self._file_id = latest._id
+        return True
+
+    def _warm(self, app):
+        with app.app_context():
+            try:
+                self.sync()
+            except Exception as e:
+                current_app.logger.error(f"Could not load recommendation features: {e}")
+            finally:
+                self._warming = False
+
+    @staticmethod
+    def _dump(snapshot):
+        matrix = snapshot['matrix']
+        keys = sorted(snapshot['columns'], key=snapshot['columns'].get)
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            data=matrix.data, indices=matrix.indices, indptr=matrix.indptr, shape=np.asarray(matrix.shape),
+            column_fields=np.asarray([field for field, _ in keys], dtype=str),
+            column_values=np.asarray([value for _, value in keys], dtype=str),
+            ids=np.asarray([str(listing_id) for listing_id in snapshot['ids']], dtype=str),
+            owners=snapshot['owners'],
+            recency=snapshot['recency']
         )
-        # Exclude the current listing itself
-        query_filters &= Q(id__ne=listing.id)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _undump(blob):
+        arrays = np.load(io.BytesIO(blob), allow_pickle=False)
+        ids = [ObjectId(listing_id) for listing_id in arrays['ids']]
+        return {
+            'matrix': sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(arrays['shape'])),
+            'columns': {
+                (str(field), str(value)): column
+                for column, (field, value) in enumerate(zip(arrays['column_fields'], arrays['column_values']))
+            },
+            'ids': ids,
+            'positions': {listing_id: position for position, listing_id in enumerate(ids)},
+            'owners': arrays['owners'],
+            'recency': arrays['recency']
+        }
+
+    def _build(self):
+        started = time.perf_counter()
+        columns = {}
+        rows, cols = [], []
+        ids, owners, posted = [], [], []
+        listings = Listing.objects(is_available=True).only('id', 'user', 'price', 'date_posted', *self.FEATURES).as_pymongo()
+        for row_index, listing in enumerate(listings):
+            ids.append(listing['_id'])
+            owners.append(listing.get('user'))
+            posted.append(listing['date_posted'].timestamp() if listing.get('date_posted') else 0.0)
+            for key in self.feature_keys(listing):
+                rows.append(row_index)
+                cols.append(columns.setdefault(key, len(columns)))
+
+        data = np.ones(len(rows), dtype=np.float32)
+        matrix = sparse.csr_matrix((data, (rows, cols)), shape=(len(ids), max(len(columns), 1)), dtype=np.float32)
+        norms = np.sqrt(np.asarray(matrix.getnnz(axis=1), dtype=np.float32))
+        norms[norms == 0] = 1.0
+        matrix = sparse.csr_matrix(matrix.multiply((1.0 / norms)[:, None]), dtype=np.float32)
+
+        posted = np.asarray(posted, dtype=np.float64)
+        span = (posted.max() - posted.min()) if len(posted) else 0.0
+        recency = (posted - posted.min()) / span if span > 0 else np.zeros(len(posted))
+
+        snapshot = {
+            'matrix': matrix,
+            'columns': columns,
+            'ids': ids,
+            'positions': {listing_id: position for position, listing_id in enumerate(ids)},
+            'owners': np.asarray([str(owner) for owner in owners]),
+            'recency': (recency * self.RECENCY_WEIGHT).astype(np.float32)
+        }
+        self._snapshot = snapshot
+        return len(ids), time.perf_counter() - started
 
-        similar_listings = Listing.objects(query_filters).limit(limit)
-        return list(similar_listings)
\ No newline at end of file
+    def snapshot(self):
+        """
+        Returns the loaded snapshot, or None while there is none yet, in which
+        case one sync is started in a background thread.
+        """
+        snapshot = self._snapshot
+        if snapshot is None and not self._warming:
+            self._warming = True
+            threading.Thread(target=self._warm, args=(current_app._get_current_object(),), daemon=True).start()
+        return snapshot
+
+    def vector(self, listings, weights):
+        """
+        Sums the one-hot features of the given raw listing documents into a
+        preference vector, each listing weighted by weights[listing id].
+        Returns None while no snapshot is loaded.
+        """
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return None
+        vector = np.zeros(snapshot['matrix'].shape[1], dtype=np.float32)
+        for listing in listings:
+            weight = weights.get(listing['_id'], 0.0)
+            for key in self.feature_keys(listing):
+                column = snapshot['columns'].get(key)
+                if column is not None:
+                    vector[column] += weight
+        return vector
+
+    def top_k(self, vector, k, exclude_ids=(), exclude_owner=None):
+        """
+        Scores every listing against `vector` and returns the ids of the k
+        best-scoring ones (best first), skipping exclude_ids, listings owned
+        by exclude_owner and listings that share no feature with the vector.
+        """
+        snapshot = self.snapshot()
+        if snapshot is None or vector is None or k <= 0 or not snapshot['ids'] or not vector.any():
+            return []
+        scores = snapshot['matrix'].dot(vector)
+        matched = scores > 0
+        scores = scores + snapshot['recency']
+        scores[~matched] = -np.inf
+        if exclude_owner is not None:
+            scores[snapshot['owners'] == str(exclude_owner)] = -np.inf
+        for listing_id in exclude_ids:
+            position = snapshot['positions'].get(listing_id)
+            if position is not None:
+                scores[position] = -np.inf
+
+        k = min(k, len(scores))
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [snapshot['ids'][position] for position in candidates if np.isfinite(scores[position])]
+
+listing_features = ListingFeatureIndex()
+
+
+class RecommendationService:
+    # How strongly each signal pulls the preference vector
+    VIEW_WEIGHT = 1.0
+    WISHLIST_WEIGHT = 3.0
+    RECENT_ACTIVITY_LIMIT = 50
+
+    def __init__(self, index=None):
+        self.index = index or listing_features
+
+    def _preferences(self, user):
+        """
+        Returns ({listing id: weight}, raw listing documents) for the listings
+        the user has recently viewed or wishlisted, fetched with one query per
+        source plus one batched listing query.
+        """
+        weights = {}
+        activities = UserActivity.objects(user=user.id, action_type='viewed_listing') \
+            .only('payload').order_by('-timestamp').limit(self.RECENT_ACTIVITY_LIMIT).as_pymongo()
+        for activity in activities:
+            listing_id = str((activity.get('payload') or {}).get('listing_id'))
+            if ObjectId.is_valid(listing_id):
+                listing_id = ObjectId(listing_id)
+                weights[listing_id] = weights.get(listing_id, 0.0) + self.VIEW_WEIGHT
+        for item in WishlistItem.objects(user=user.id).only('listing').as_pymongo():
+            listing_id = item.get('listing')
+            if listing_id is not None:
+                weights[listing_id] = weights.get(listing_id, 0.0) + self.WISHLIST_WEIGHT
+        if not weights:
+            return weights, []
+        listings = Listing.objects(id__in=list(weights)).only('id', 'price', *ListingFeatureIndex.FEATURES).as_pymongo()
+        return weights, list(listings)
+
+    @staticmethod
+    def _load(listing_ids):
+        """
+        Fetches Listings by id in one query, keeping the given order. The
+        feature snapshot can be minutes old, so listings sold or withdrawn
+        since it was built are dropped here.
+        """
+        if not listing_ids:
+            return []
+        listings = {listing.id: listing for listing in Listing.objects(id__in=listing_ids, is_available=True)}
+        return [listings[listing_id] for listing_id in listing_ids if listing_id in listings]
+
+    def get_recommendations(self, user: User, limit: int = 10) -> list[Listing]:
+        weights, listings = self._preferences(user)
+        recommended_ids = []
+        if listings:
+            vector = self.index.vector(listings, weights)
+            # Listings already viewed or wishlisted are not recommended again
+            recommended_ids = self.index.top_k(vector, limit, exclude_ids=list(weights), exclude_owner=user.id)
+
+        recommended = self._load(recommended_ids)
+        if len(recommended) < limit:
+            # Not enough preference signal, or no features loaded yet: fill up with the newest listings
+            newest = Listing.objects(
+                is_available=True,
+                user__ne=user.id,
+                id__nin=list(weights) + [listing.id for listing in recommended]
+            ).order_by('-date_posted').limit(limit - len(recommended))
+            recommended.extend(newest)
+        return recommended
+
+    def get_similar_listings(self, listing: Listing, limit: int = 5) -> list[Listing]:
+        """
+        Gets listings similar to a given listing, by the features they share.
+        """
+        raw = {field: getattr(listing, field) for field in ListingFeatureIndex.FEATURES}
+        raw.update(_id=listing.id, price=listing.price)
+        vector = self.index.vector([raw], {listing.id: 1.0})
+        return self._load(self.index.top_k(vector, limit, exclude_ids=[listing.id]))
@@ -0,0 +1,186 @@
+import threading
+from bisect import bisect_right
+from urllib.parse import parse_qs
+from mongoengine.queryset.visitor import Q
+from app.models.saved_search import SavedSearch
+
+
+class SavedSearchPercolator:
+    """
+    Reverse search: given a new listing, find the saved searches it matches.
+
+    Every saved search is compiled once, when it is saved, into:
+      * one key per equality filter (uniform_type, size, gender, condition,
+        listing_type), holding the wanted value or ANY_VALUE;
+      * the list of price buckets its [min_price, max_price] interval overlaps,
+        or [ANY_BUCKET] when it has no price bounds;
+      * a residual `criteria` dict for the substring, school and exact price
+        checks.
+    A listing is then matched with one indexed query that only returns
+    candidate searches, and only those are tested against their criteria.
+    Searches stored before they were compiled are compiled on the first
+    percolation in each process, so they keep matching without a migration.
+
+    The rules are the marketplace grid's, since that is where searches are
+    saved from: location, brand and colour match case-insensitive substrings
+    (the grid's icontains). The grid has no school filter; a `school` param
+    is matched exactly against school_name.
+    """
+    ANY_VALUE = '*'
+    ANY_BUCKET = -1
+    EQUALITY_FIELDS = ('uniform_type', 'size', 'gender', 'condition', 'listing_type')
+    SUBSTRING_FIELDS = ('location', 'brand', 'color')
+    # Lower edges of the price buckets (ZAR); the last bucket is open-ended
+    SCHOOL_PARAM = r'(^|&)school=(?!All(&|$))[^&]'
+    PRICE_BUCKET_EDGES = (0, 50, 100, 150, 200, 300, 400, 500, 750, 1000, 1500, 2000, 3000, 5000)
+
+    def __init__(self):
+        self._compiled = False
+        self._compile_lock = threading.Lock()
+
+    def price_bucket(self, price):
+        return max(bisect_right(self.PRICE_BUCKET_EDGES, price) - 1, 0)
+
+    def _first(self, params, key):
+        values = params.get(key)
+        if not values or values[0] == 'All':
+            return None
+        return values[0]
+
+    def _price(self, params, key):
+        value = self._first(params, key)
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None # Ignore invalid price values
+
+    def compile_into(self, saved_search):
+        """
+        Parses saved_search.search_query_params and stores the compiled
+        predicate on the document (keys, price buckets and criteria).
+        """
+        params = parse_qs(saved_search.search_query_params or '')
+
+        for field in self.EQUALITY_FIELDS:
+            setattr(saved_search, f"{field}_key", self._first(params, field) or self.ANY_VALUE)
+
+        criteria = {}
+        terms = [term.lower() for term in params.get('search_term', []) if term.strip()]
+        if terms:
+            criteria['search_terms'] = terms
+        for field in self.SUBSTRING_FIELDS:
+            value = self._first(params, field)
+            if value:
+                criteria[field] = value.lower()
+        school = self._first(params, 'school')
+        if school:
+            criteria['school'] = school
+
+        min_price = self._price(params, 'min_price')
+        max_price = self._price(params, 'max_price')
+        if min_price is not None:
+            criteria['min_price'] = min_price
+        if max_price is not None:
+            criteria['max_price'] = max_price
+
+        if min_price is None and max_price is None:
+            saved_search.price_buckets = [self.ANY_BUCKET]
+        else:
+            low = self.price_bucket(min_price) if min_price is not None else 0
+            high = self.price_bucket(max_price) if max_price is not None else len(self.PRICE_BUCKET_EDGES) - 1
+            saved_search.price_buckets = list(range(low, high + 1))
+
+        saved_search.criteria = criteria
+        return saved_search
+
+    def candidates(self, listing, exclude_user_id=None):
+        """
+        Returns the saved searches whose equality keys and price buckets admit
+        the listing, via the compound index on SavedSearch. References are left
+        undereferenced; use search.user.id for the owner's id.
+        """
+        self._ensure_compiled()
+        filters = {
+            f"{field}_key__in": [getattr(listing, field), self.ANY_VALUE]
+            for field in self.EQUALITY_FIELDS
+        }
+        if listing.price is not None:
+            # Listings without a price (swaps, donations) ignore price bounds
+            filters['price_buckets__in'] = [self.price_bucket(listing.price), self.ANY_BUCKET]
+        query = SavedSearch.objects(**filters)
+        if exclude_user_id is not None:
+            query = query.filter(user__ne=exclude_user_id)
+        return query.no_dereference()
+
+    def matches(self, criteria, listing):
+        """Applies the residual (non-indexed) part of a compiled predicate to a listing."""
+        terms = criteria.get('search_terms')
+        if terms:
+            haystacks = [(getattr(listing, field) or '').lower() for field in ('title', 'description', 'school_name', 'brand')]
+            if not any(term in haystack for term in terms for haystack in haystacks):
+                return False
+        for field in self.SUBSTRING_FIELDS:
+            wanted = criteria.get(field)
+            if wanted and wanted not in (getattr(listing, field) or '').lower():
+                return False
+        if 'school' in criteria and listing.school_name != criteria['school']:
+            return False
+        if listing.price is not None:
+            if 'min_price' in criteria and listing.price < criteria['min_price']:
+                return False
+            if 'max_price' in criteria and listing.price > criteria['max_price']:
+                return False
+        return True
+
+    def percolate(self, listing, exclude_user_id=None):
+        """
+        Returns the saved searches matched by a listing, in O(candidates).
+        """
+        return [
+            search for search in self.candidates(listing, exclude_user_id=exclude_user_id)
+            if self.matches(search.criteria or {}, listing)
+        ]
+
+    def _uncompiled(self):
+        """
+        Searches stored before percolation existed, or compiled before the
+        school criterion was (a school param other than 'All' but no criterion).
+        """
+        return Q(uniform_type_key__exists=False) | (
+            Q(search_query_params__regex=self.SCHOOL_PARAM) & Q(criteria__school__exists=False)
+        )
+
+    def _ensure_compiled(self):
+        """
+        Compiles any uncompiled searches before the first percolation. New
+        searches are compiled when saved, so once none are left the check is
+        not repeated in this process.
+        """
+        if self._compiled:
+            return
+        with self._compile_lock:
+            if not self._compiled:
+                if SavedSearch.objects(self._uncompiled()).only('id').first() is not None:
+                    self.compile_all(only_missing=True)
+                self._compiled = True
+
+    def compile_all(self, only_missing=True):
+        """
+        Compiles saved searches stored before percolation existed (or all of
+        them). Returns the number of searches updated.
+        """
+        query = SavedSearch.objects(self._uncompiled()) if only_missing else SavedSearch.objects()
+        updated = 0
+        for saved_search in query.no_dereference():
+            self.compile_into(saved_search)
+            # Written explicitly: legacy documents load the '*' defaults, so a
+            # plain save() would not see the keys as changed.
+            SavedSearch.objects(id=saved_search.id).update(
+                set__price_buckets=saved_search.price_buckets,
+                set__criteria=saved_search.criteria,
+                **{f"set__{field}_key": getattr(saved_search, f"{field}_key") for field in self.EQUALITY_FIELDS}
+            )
+            updated += 1
+        return updated
+
+saved_search_percolator = SavedSearchPercolator()
@@ -0,0 +1,41 @@
+class SearchService:
+    """
+    Full-text search over listings, backed by the weighted text index declared
+    on the Listing model. MongoDB applies English stemming and stop words at
+    both index and query time, so "blazers" matches "blazer", and ranks hits by
+    the weighted term frequency of the matching fields.
+    """
+    SORT_NEWEST = 'newest'
+    SORT_RELEVANCE = 'relevance'
+    SORT_OPTIONS = (SORT_NEWEST, SORT_RELEVANCE)
+
+    def normalise_term(self, search_term):
+        """
+        Collapses whitespace and drops terms that are too short to be meaningful.
+        Returns None when there is nothing left to search for.
+        """
+        if not search_term:
+            return None
+        term = ' '.join(search_term.split())
+        return term if len(term) >= 2 else None
+
+    def filter(self, queryset, search_term):
+        """
+        Restricts a Listing queryset to documents matching search_term via the text index.
+        """
+        term = self.normalise_term(search_term)
+        if term is None:
+            return queryset
+        return queryset.search_text(term)
+
+    def rank(self, queryset, search_term):
+        """
+        Restricts a Listing queryset to documents matching search_term and orders
+        them by text relevance, with premium and newer listings winning ties.
+        """
+        term = self.normalise_term(search_term)
+        if term is None:
+            return queryset
+        return queryset.search_text(term).order_by('$text_score', '-is_premium', '-date_posted')
+
+search_service = SearchService()
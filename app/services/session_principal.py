@@ -0,0 +1,142 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import current_app
+from flask_login import UserMixin
+from mongoengine import signals
+from app.extensions import cache
+from app.models.users import User
+from app.utils.cache import TTLCache, bump_generation, generation_timeout, read_generation
+from app.utils.user_loader import get_user
+
+
+class SessionUser(UserMixin):
+    """
+    The lightweight principal Flask-Login exposes as current_user.
+
+    It holds only the fields needed for authentication and the navbar
+    (SessionPrincipalCache.FIELDS). Reading or writing any other attribute,
+    or calling a User method that needs one, loads the full User document
+    once (through the request's identity map) and delegates to it, so routes
+    that need the whole user keep working unchanged. It is not a document:
+    query, compare and assign reference fields by current_user.id (a
+    ReferenceField accepts the id), and call get_full_user() only where a
+    User document is genuinely required.
+    """
+    _is_session_principal = True
+
+    def __init__(self, data):
+        object.__setattr__(self, '_principal_data', data)
+        object.__setattr__(self, '_full_user', None)
+
+    @property
+    def id(self):
+        return self._principal_data['_id']
+
+    pk = id
+
+    def get_id(self):
+        return str(self.id)
+
+    def has_role(self, role_name):
+        return self._principal_data.get('role') == role_name
+
+    def get_full_user(self):
+        """Loads (once) and returns the complete User document."""
+        if self._full_user is None:
+            object.__setattr__(self, '_full_user', get_user(self.id))
+        return self._full_user
+
+    def __getattr__(self, name):
+        data = self._principal_data
+        if name in data and name in User._fields:
+            return data[name]
+        if name in SessionPrincipalCache.FIELDS:
+            # Not stored (e.g. legacy documents): the field's default applies
+            return User._fields[name].default
+        user = self.get_full_user()
+        if user is None:
+            raise AttributeError(name)
+        return getattr(user, name)
+
+    def __setattr__(self, name, value):
+        user = self.get_full_user()
+        setattr(user, name, value)
+        if name in self._principal_data:
+            self._principal_data[name] = value
+
+    def __eq__(self, other):
+        other_id = getattr(other, 'id', other)
+        return other_id is not None and self.id == other_id
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"SessionUser('{self._principal_data.get('username')}', '{self._principal_data.get('role')}')"
+
+
+class SessionPrincipalCache:
+    """
+    Per-worker cache of session principals, so that an authenticated request
+    costs no MongoDB query until a route actually needs the full user.
+
+    Principals are projected to FIELDS and kept in a TTL-bounded LRU. Each
+    entry is stamped with the user's version, held in the Flask-Caching
+    backend and bumped whenever the user document changes (User post_save and
+    post_delete, and counter updates made with atomic queries), so with a
+    shared backend a change invalidates the principal on every worker at once.
+    With a per-process backend the versions expire after LOCAL_GENERATION_TTL
+    seconds, so a role, ban or active-state change made in another worker is
+    picked up within that time (see app.utils.cache.generation_timeout).
+    """
+    FIELDS = ('username', 'email', 'image_file', 'role', 'active', 'is_banned', 'onboarding_completed', 'unread_notifications')
+    VERSION_KEY = 'session_user:version:{}'
+
+    def __init__(self, maxsize=4096, ttl=60):
+        self._principals = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._version_timeout = 0
+        self._signals_connected = False
+
+    def init_app(self, app):
+        self._version_timeout = generation_timeout(app.config)
+        if not self._signals_connected:
+            signals.post_save.connect(self._on_user_changed, sender=User)
+            signals.post_delete.connect(self._on_user_changed, sender=User)
+            self._signals_connected = True
+
+    def version(self, user_id):
+        return read_generation(cache, self.VERSION_KEY.format(user_id), self._version_timeout)
+
+    def invalidate(self, user_id):
+        """Moves the user on to a new version, dropping every worker's cached principal."""
+        try:
+            bump_generation(cache, self.VERSION_KEY.format(user_id), self._version_timeout)
+        except Exception as e:
+            current_app.logger.error(f"Failed to bump session principal version for user {user_id}: {e}")
+            self._principals.clear()
+
+    def load(self, user_id):
+        """Returns the SessionUser for user_id, or None if the user does not exist."""
+        try:
+            user_id = ObjectId(str(user_id))
+        except (InvalidId, TypeError):
+            return None
+        version = self.version(user_id)
+        entry = self._principals.get(user_id)
+        if entry is None or entry[0] != version:
+            data = User.objects(id=user_id).only(*self.FIELDS).as_pymongo().first()
+            if data is None:
+                return None
+            entry = (version, data)
+            self._principals.set(user_id, entry)
+        # Each request gets its own copy, so attribute writes stay local to it
+        return SessionUser(dict(entry[1]))
+
+    def _on_user_changed(self, sender, document, **kwargs):
+        if document.id is not None:
+            self.invalidate(document.id)
+
+session_principals = SessionPrincipalCache()
@@ -0,0 +1,242 @@
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.models.follows import Follow
+from app.models.listings import Listing
+from app.models.timelines import Timeline
+from app.models.users import User
+from app.services.job_queue import job_queue
+from app.utils.cache import TTLCache
+
+DUPLICATE_KEY = 11000
+
+
+class TimelineService:
+    """
+    Home timelines of new listings from followed users (fan-out on write).
+
+    When a listing is created the 'timeline.fan_out_listing' job pushes an
+    entry onto the timeline of every follower of its owner, in batched
+    upserts that keep each timeline sorted newest first and capped at
+    TIMELINE_MAX_ENTRIES, so reading a timeline is one lookup by user.
+
+    Writing to every follower does not scale for accounts with a very large
+    following. Owners with more than TIMELINE_FANOUT_LIMIT followers are
+    flagged (User.timeline_fanout_on_read) and skipped; their recent listings
+    are fetched when a follower reads the timeline and merged in (fan-out on
+    read).
+
+    A user with no timeline yet (e.g. one whose follows predate timelines) has
+    it seeded on first read, so feeds do not depend on rebuild-timelines
+    having been run.
+    """
+    WRITE_BATCH_SIZE = 1000
+
+    def __init__(self):
+        self.max_entries = 500
+        self.fanout_limit = 5000
+        # Ids of the fan-out-on-read owners; a short-lived per-worker copy
+        self._read_authors = TTLCache(maxsize=1, ttl=60)
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('TIMELINE_MAX_ENTRIES', 500)
+        self.fanout_limit = app.config.get('TIMELINE_FANOUT_LIMIT', 5000)
+
+    @staticmethod
+    def _entry(listing):
+        return {
+            'listing': listing['_id'],
+            'author': listing.get('user'),
+            'action_type': 'listing_created',
+            'description': f"Created new listing: '{listing.get('title')}'",
+            'created_at': listing.get('date_posted') or datetime.utcnow()
+        }
+
+    def _push(self, user_id, entries):
+        """An upsert adding entries to one timeline, unless the first is already there."""
+        return UpdateOne(
+            # A retried job finds its entry already present; the upsert then
+            # collides with the existing timeline and is ignored below
+            {'user': user_id, 'entries.listing': {'$ne': entries[0]['listing']}},
+            {
+                '$push': {'entries': {'$each': entries, '$sort': {'created_at': -1}, '$slice': self.max_entries}},
+                '$set': {'updated_at': datetime.utcnow()}
+            },
+            upsert=True
+        )
+
+    def _write(self, pushes):
+        """
+        Applies (user id, entries) pushes in batched bulk writes. Returns the
+        number of timelines written.
+        """
+        written = 0
+        for start in range(0, len(pushes), self.WRITE_BATCH_SIZE):
+            written += self._write_batch(pushes[start:start + self.WRITE_BATCH_SIZE])
+        return written
+
+    def _write_batch(self, pushes, retry=True):
+        try:
+            result = Timeline._get_collection().bulk_write([self._push(user_id, entries) for user_id, entries in pushes], ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != DUPLICATE_KEY for error in errors):
+                raise
+            written = e.details.get('nModified', 0) + e.details.get('nUpserted', 0)
+            # A duplicate key means the filter matched no timeline: either the
+            # entry is already there (a retried job), or another fan-out
+            # created the timeline at the same moment, in which case the push
+            # is retried once against the timeline that now exists
+            collided = [pushes[error['index']] for error in errors]
+            present = {
+                timeline['user']
+                for timeline in Timeline._get_collection().find(
+                    {'$or': [{'user': user_id, 'entries.listing': entries[0]['listing']} for user_id, entries in collided]},
+                    {'user': 1}
+                )
+            }
+            lost = [push for push in collided if push[0] not in present]
+            if lost and retry:
+                written += self._write_batch(lost, retry=False)
+            return written
+        return result.modified_count + result.upserted_count
+
+    def fan_out_listing(self, listing_id):
+        """
+        Adds a new listing to the timelines of its owner's followers.
+        Returns the number of timelines written (0 for fan-out-on-read owners).
+        """
+        listing = Listing.objects(id=listing_id).only('id', 'user', 'title', 'date_posted').as_pymongo().first()
+        if not listing or not listing.get('user'):
+            return 0
+        author_id = listing['user']
+
+        followers = Follow.objects(followed=author_id)
+        read_side = followers.count() > self.fanout_limit
+        User.objects(id=author_id, timeline_fanout_on_read__ne=read_side).update_one(set__timeline_fanout_on_read=read_side)
+        if read_side:
+            return 0
+
+        entry = self._entry(listing)
+        return self._write([(row['follower'], [entry]) for row in followers.only('follower').as_pymongo()])
+
+    def backfill(self, follower_id, followed_id):
+        """Adds the recent listings of a newly followed user to the follower's timeline."""
+        if User.objects(id=followed_id, timeline_fanout_on_read=True).count():
+            return 0
+        present = self._timeline_entries(follower_id)
+        present_ids = {entry['listing'] for entry in present}
+        entries = [
+            self._entry(listing)
+            for listing in Listing.objects(user=followed_id).only('id', 'user', 'title', 'date_posted')
+                .order_by('-date_posted').limit(self.max_entries).as_pymongo()
+            if listing['_id'] not in present_ids
+        ]
+        if not entries:
+            return 0
+        return self._write([(follower_id, entries)])
+
+    def remove_author(self, follower_id, followed_id):
+        """Removes an unfollowed user's entries from the follower's timeline."""
+        Timeline._get_collection().update_one(
+            {'user': follower_id},
+            {'$pull': {'entries': {'author': followed_id}}}
+        )
+
+    def _timeline_entries(self, user_id):
+        timeline = Timeline._get_collection().find_one({'user': user_id}, {'entries': 1})
+        if timeline is None:
+            return self._seed(user_id)
+        return timeline.get('entries', [])
+
+    def _seed(self, user_id):
+        """
+        Creates the timeline of a user who has none yet (e.g. one who followed
+        people before timelines existed) from the recent listings of everyone
+        they follow, with one query per collection. Returns its entries.
+        """
+        authors = set(self._fanout_on_read_authors())
+        followed = [
+            row['followed']
+            for row in Follow.objects(follower=user_id).only('followed').as_pymongo()
+            if row['followed'] not in authors
+        ]
+        entries = [
+            self._entry(listing)
+            for listing in Listing.objects(user__in=followed).only('id', 'user', 'title', 'date_posted')
+                .order_by('-date_posted').limit(self.max_entries).as_pymongo()
+        ] if followed else []
+        try:
+            # Skipped if a fan-out has meanwhile added any of these listings
+            Timeline._get_collection().update_one(
+                {'user': user_id, 'entries.listing': {'$nin': [entry['listing'] for entry in entries]}},
+                {
+                    '$push': {'entries': {'$each': entries, '$sort': {'created_at': -1}, '$slice': self.max_entries}},
+                    '$set': {'updated_at': datetime.utcnow()}
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Another request or fan-out created the timeline first
+            return self._timeline_entries(user_id)
+        return entries
+
+    def _fanout_on_read_authors(self):
+        authors = self._read_authors.get('authors')
+        if authors is None:
+            authors = list(User.objects(timeline_fanout_on_read=True).scalar('id'))
+            self._read_authors.set('authors', authors)
+        return authors
+
+    def get_entries(self, user_id, limit=None):
+        """
+        Returns the user's timeline entries, newest first: the stored timeline
+        merged with recent listings from followed fan-out-on-read owners.
+        Entries of listings that have since been deleted are left out.
+        """
+        entries = self._merged_entries(user_id, limit)
+        listing_ids = [entry['listing'] for entry in entries]
+        existing = set(Listing.objects(id__in=listing_ids).scalar('id')) if listing_ids else set()
+        return [entry for entry in entries if entry['listing'] in existing]
+
+    def _merged_entries(self, user_id, limit=None):
+        limit = min(limit or self.max_entries, self.max_entries)
+        entries = self._timeline_entries(user_id)
+
+        authors = self._fanout_on_read_authors()
+        if authors:
+            followed = [
+                row['followed']
+                for row in Follow.objects(follower=user_id, followed__in=authors).only('followed').as_pymongo()
+            ]
+            if followed:
+                seen = {entry['listing'] for entry in entries}
+                entries = entries + [
+                    self._entry(listing)
+                    for listing in Listing.objects(user__in=followed).only('id', 'user', 'title', 'date_posted')
+                        .order_by('-date_posted').limit(limit).as_pymongo()
+                    if listing['_id'] not in seen
+                ]
+                entries.sort(key=lambda entry: entry['created_at'], reverse=True)
+        return entries[:limit]
+
+    def get_listings(self, user_id, limit=None):
+        """Returns the Listings on the user's timeline, newest first, skipping deleted ones."""
+        listing_ids = [entry['listing'] for entry in self._merged_entries(user_id, limit=limit)]
+        if not listing_ids:
+            return []
+        listings = {listing.id: listing for listing in Listing.objects(id__in=listing_ids)}
+        return [listings[listing_id] for listing_id in listing_ids if listing_id in listings]
+
+timeline_service = TimelineService()
+
+
+@job_queue.task('timeline.fan_out_listing')
+def fan_out_listing_job(listing_id):
+    timeline_service.fan_out_listing(listing_id)
+
+
+@job_queue.task('timeline.backfill')
+def backfill_timeline_job(follower_id, followed_id):
+    timeline_service.backfill(ObjectId(follower_id), ObjectId(followed_id))
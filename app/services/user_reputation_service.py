@@ -1,5 +1,5 @@
 # app/services/user_reputation_service.py
-from app.models.users import User
+from app.utils.user_loader import get_user
 from app.models.reviews import Review
 from app.models.disputes import Dispute # Assuming Dispute model is used for dispute-based score
 from app.extensions import db # Assuming db is needed for queries
@@ -9,7 +9,7 @@ def update_user_trust_score(user_id):
     Recalculates and updates a user's trust score based on their reviews,
     transaction history, and dispute resolution.
     """
-    user = User.objects.get(id=user_id)
+    user = get_user(user_id)
     if not user:
         return
 
@@ -67,7 +67,7 @@ def increment_transaction_count(user_id):
     """
     Increments the total_transactions count for a user.
     """
-    user = User.objects.get(id=user_id)
+    user = get_user(user_id)
     if user:
         user.total_transactions += 1
         user.save()
@@ -78,7 +78,7 @@ def update_dispute_counts(user_id, resolution_status):
     Updates dispute counts for a user based on the resolution status.
     'resolved_in_favor_of_initiator' or 'resolved_in_favor_of_respondent'
     """
-    user = User.objects.get(id=user_id)
+    user = get_user(user_id)
     if user:
         if resolution_status == 'resolved_in_favor_of_initiator':
             # If user is initiator and it's in their favor, or user is respondent and it's against them
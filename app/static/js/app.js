@@ -12,7 +12,9 @@ if ('serviceWorker' in navigator) {
 
 // Socket.IO Client-side Logic
 document.addEventListener('DOMContentLoaded', function() {
-    const socket = io(); // Connect to the Socket.IO server
+    // Websocket only: long-polling requests would need sticky sessions to keep
+    // reaching the worker that owns the session when several workers serve SocketIO
+    const socket = io({transports: ['websocket']}); // Connect to the Socket.IO server
 
     // Function to display a Bootstrap Toast notification
     function showToast(message, title = 'Notification', category = 'info') {
@@ -1,14 +1,30 @@
 # app/utils/activity_logger.py
 from flask import request, current_app
+from app.services.activity_writer import activity_writer
 from app.models.user_activity import UserActivity
 from app.extensions import db
 import json
 from datetime import datetime
-from app.models.users import User # Import User model
+from app.utils.user_loader import UserLoader
 
-def log_activity(user_id, action_type, description, payload=None, request_obj=None):
+def get_client_ip(request_obj):
     """
-    Logs a user's activity to the database.
+    Returns the client's IP address for a request, honouring X-Forwarded-For.
+    """
+    # Attempt to get the real IP address, considering proxies
+    ip_address = request_obj.headers.get('X-Forwarded-For', request_obj.remote_addr)
+    # If X-Forwarded-For contains multiple IPs, take the first one
+    if ip_address and ',' in ip_address:
+        ip_address = ip_address.split(',')[0].strip()
+    return ip_address
+
+def log_activity(user_id, action_type, description, payload=None, request_obj=None, ip_address=None, buffered=True):
+    """
+    Logs a user's activity. The record is handed to the buffered activity
+    writer and written to the database in the background, so this adds no
+    database round trip to the calling request. Callers that must not lose
+    the record (e.g. durable background jobs) pass buffered=False to write it
+    synchronously; errors then propagate to the caller.
 
     Args:
         user_id (int): The ID of the user performing the action.
@@ -16,35 +32,34 @@ def log_activity(user_id, action_type, description, payload=None, request_obj=No
         description (str): A human-readable summary of the action.
         payload (dict, optional): Additional structured data related to the action. Defaults to None.
         request_obj (flask.Request, optional): The Flask request object to extract IP address. Defaults to None.
+        ip_address (str, optional): The client IP, for callers running outside the request (e.g. background jobs).
+            Ignored when request_obj is given. Defaults to None.
+        buffered (bool, optional): Queue the record for the background writer. Defaults to True.
     """
-    ip_address = None
     if request_obj:
-        # Attempt to get the real IP address, considering proxies
-        ip_address = request_obj.headers.get('X-Forwarded-For', request_obj.remote_addr)
-        # If X-Forwarded-For contains multiple IPs, take the first one
-        if ip_address and ',' in ip_address:
-            ip_address = ip_address.split(',')[0].strip()
+        ip_address = get_client_ip(request_obj)
 
-    # Fetch the User object if user_id is provided
-    user_obj = None
+    # Only the id is stored; the user is not fetched
+    user_ref = None
     if user_id:
-        try:
-            user_obj = User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            current_app.logger.warning(f"User with ID {user_id} not found for activity logging.")
-            user_obj = None # Ensure user_obj is None if user not found
+        user_ref = UserLoader.normalise_id(user_id)
+        if user_ref is None:
+            current_app.logger.warning(f"Invalid user ID {user_id} for activity logging.")
 
-    try:
-        activity = UserActivity(
-            user=user_obj, # Pass the User object here
-            action_type=action_type,
-            description=description,
-            timestamp=datetime.utcnow(),
-            ip_address=ip_address,
-            payload=payload
-        )
-        activity.save()
+    record = dict(
+        user=user_ref,
+        action_type=action_type,
+        description=description,
+        timestamp=datetime.utcnow(),
+        ip_address=ip_address,
+        payload=payload
+    )
+    if not buffered:
+        UserActivity(**record).save()
         current_app.logger.debug(f"Activity logged: User {user_id}, Type: {action_type}, Desc: {description}")
-    except Exception as e:
-        current_app.logger.error(f"Failed to log user activity for user {user_id}, action {action_type}: {e}")
+        return
 
+    if activity_writer.record(**record):
+        current_app.logger.debug(f"Activity queued: User {user_id}, Type: {action_type}, Desc: {description}")
+    else:
+        current_app.logger.warning(f"Activity buffer full; dropped activity for user {user_id}, action {action_type}")
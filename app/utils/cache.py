@@ -0,0 +1,114 @@
+# app/utils/cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    A small thread-safe, per-process cache with a size bound, least-recently-used
+    eviction and a time-to-live on every entry.
+    """
+    def __init__(self, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for key, or default if it is missing or expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Flask-Caching backends whose state lives inside one process
+PROCESS_LOCAL_CACHE_TYPES = {'SimpleCache', 'simple', 'NullCache', 'null'}
+
+
+def cache_is_shared(config):
+    """Whether the configured Flask-Caching backend is shared between processes."""
+    cache_type = str(config.get('CACHE_TYPE') or 'SimpleCache')
+    return cache_type.rsplit('.', 1)[-1] not in PROCESS_LOCAL_CACHE_TYPES
+
+
+def require_shared_cache(config, reason):
+    """
+    Raises RuntimeError unless the Flask-Caching backend is shared. Only
+    called when REQUIRE_SHARED_CACHE is set: without a shared backend the
+    generation counters fall back to per-process expiry (see
+    generation_timeout), which bounds staleness instead of removing it.
+    """
+    if not cache_is_shared(config):
+        raise RuntimeError(
+            f"CACHE_TYPE={config.get('CACHE_TYPE')} is local to one process, but {reason}. "
+            "Set CACHE_TYPE=RedisCache and CACHE_REDIS_URL (or another shared backend)."
+        )
+
+
+def generation_timeout(config):
+    """
+    Lifetime of a generation counter in the Flask-Caching backend. A shared
+    backend keeps counters until they are bumped (0, no expiry). A per-process
+    backend cannot see bumps made by other workers, so its counters expire
+    after LOCAL_GENERATION_TTL seconds and are re-seeded from the clock: every
+    worker then moves on to a new generation within that time.
+    """
+    if cache_is_shared(config):
+        return 0
+    return int(config.get('LOCAL_GENERATION_TTL', 15))
+
+
+def _clock_generation():
+    return int(time.time() * 1000)
+
+
+def read_generation(backend, key, timeout):
+    """
+    Returns the generation stored under key. A missing counter (first use,
+    expired, or evicted by the backend) is seeded from the clock so it can
+    never fall back to a generation that was already used.
+    """
+    value = backend.get(key)
+    if value is None:
+        value = _clock_generation()
+        backend.set(key, value, timeout=timeout)
+    return value
+
+
+def bump_generation(backend, key, timeout):
+    """Moves key on to a new generation."""
+    if timeout == 0:
+        # Atomic on shared backends, so concurrent bumps are never lost
+        if backend.inc(key) is None:
+            backend.set(key, _clock_generation(), timeout=0)
+        return
+    # inc() would reset a per-process counter to the default timeout
+    backend.set(key, max(_clock_generation(), (backend.get(key) or 0) + 1), timeout=timeout)
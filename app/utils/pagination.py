@@ -0,0 +1,211 @@
+# app/utils/pagination.py
+import base64
+from bson import json_util
+from mongoengine.queryset.visitor import Q
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(values):
+    """
+    Encodes a list of sort key values into an opaque, URL-safe cursor token.
+    Datetimes and ObjectIds survive the round trip via bson.json_util.
+    """
+    raw = json_util.dumps(list(values)).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decodes a cursor token produced by encode_cursor back into its sort key values.
+    Raises InvalidCursor if the token has been tampered with or truncated.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if not isinstance(values, list):
+        raise InvalidCursor("Malformed cursor: expected a list of sort values")
+    return values
+
+
+class KeysetPage:
+    """
+    A single page of results produced by paginate_keyset.
+    The total is computed lazily (only if a template asks for it) and is capped,
+    so rendering page N costs the same as rendering page 1.
+    """
+    def __init__(self, items, base_query, next_cursor=None, prev_cursor=None, count_cap=1000):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self._base_query = base_query
+        self._count_cap = count_cap
+        self._total = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def total(self):
+        """
+        Number of matching documents, counted at most up to count_cap + 1.
+        Check total_is_estimate to know whether the real figure is larger.
+        """
+        if self._total is None:
+            self._total = self._base_query.limit(self._count_cap + 1).count(with_limit_and_skip=True)
+        return min(self._total, self._count_cap)
+
+    @property
+    def total_is_estimate(self):
+        _ = self.total
+        return self._total > self._count_cap
+
+    def freeze(self, items):
+        """
+        Returns a copy of this page holding `items` (typically serialised dicts)
+        with the total resolved up front, detached from the queryset so it can
+        be cached and reused by later requests.
+        """
+        _ = self.total
+        frozen = KeysetPage(items, None, next_cursor=self.next_cursor, prev_cursor=self.prev_cursor, count_cap=self._count_cap)
+        frozen._total = self._total
+        return frozen
+
+
+def _parse_sort(sort):
+    """Turns ('-is_premium', 'date_posted') into [('is_premium', True), ('date_posted', False)]."""
+    return [(key.lstrip('-+'), key.startswith('-')) for key in sort]
+
+
+def _keyset_filter(sort_fields, values, backwards):
+    """
+    Builds the Q expression selecting documents strictly after (or, when going
+    backwards, strictly before) the given sort key values.
+    For sort (a desc, b desc, id desc) this expands to
+    a < va OR (a == va AND (b < vb OR (b == vb AND id < vid))).
+    """
+    expression = None
+    for i, (field, descending) in enumerate(sort_fields):
+        value = values[i]
+        towards_lower = descending != backwards
+        if isinstance(value, bool):
+            # Booleans only have two values; using $ne also picks up documents
+            # where the flag was never written.
+            if value is towards_lower:
+                step = Q(**{f"{field}__ne": value})
+            else:
+                step = None
+        else:
+            step = Q(**{f"{field}__{'lt' if towards_lower else 'gt'}": value})
+
+        if step is not None:
+            for j, (prev_field, _) in enumerate(sort_fields[:i]):
+                step &= Q(**{prev_field: values[j]})
+            expression = step if expression is None else expression | step
+    return expression
+
+
+def paginate_keyset(query, sort, per_page, after=None, before=None, count_cap=1000):
+    """
+    Paginates a MongoEngine queryset by keyset (seek) rather than skip/limit.
+
+    Args:
+        query (QuerySet): The filtered queryset to paginate.
+        sort (tuple): Sort keys in MongoEngine notation, e.g. ('-is_premium', '-date_posted', '-id').
+            The last key must be unique (normally the id) so the ordering is total.
+        per_page (int): Number of items per page.
+        after (str, optional): Cursor of the last item on the previous page; fetches the next page.
+        before (str, optional): Cursor of the first item on the following page; fetches the previous page.
+        count_cap (int, optional): Upper bound for the lazy total count.
+
+    Returns:
+        KeysetPage: The page of items along with next/previous cursors.
+
+    Raises:
+        InvalidCursor: If after or before cannot be decoded.
+    """
+    sort_fields = _parse_sort(sort)
+    backwards = before is not None and after is None
+    cursor = before if backwards else after
+
+    page_query = query
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(sort_fields):
+            raise InvalidCursor("Cursor does not match the sort order")
+        keyset = _keyset_filter(sort_fields, values, backwards)
+        if keyset is None:
+            return KeysetPage([], query, count_cap=count_cap)
+        page_query = page_query.filter(keyset)
+
+    if backwards:
+        order = [('' if descending else '-') + field for field, descending in sort_fields]
+    else:
+        order = [('-' if descending else '') + field for field, descending in sort_fields]
+
+    rows = list(page_query.order_by(*order).limit(per_page + 1))
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def key_of(doc):
+        return [getattr(doc, field) for field, _ in sort_fields]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            next_cursor = encode_cursor(key_of(rows[-1]))
+            prev_cursor = encode_cursor(key_of(rows[0])) if has_more else None
+        else:
+            next_cursor = encode_cursor(key_of(rows[-1])) if has_more else None
+            prev_cursor = encode_cursor(key_of(rows[0])) if cursor else None
+
+    return KeysetPage(rows, query, next_cursor=next_cursor, prev_cursor=prev_cursor, count_cap=count_cap)
+
+
+def paginate_ranked(query, per_page, after=None, before=None, count_cap=1000):
+    """
+    Paginates a queryset whose order cannot be expressed as a keyset, such as
+    one sorted by MongoDB's $text_score. The cursor carries the offset instead
+    of sort values, so it stays opaque to clients and interchangeable with the
+    keyset cursors in templates. Ranked result sets are bounded by the search
+    match set, so the skip cost stays small.
+
+    Args:
+        query (QuerySet): The already ordered queryset to paginate.
+        per_page (int): Number of items per page.
+        after (str, optional): Cursor returned as next_cursor by the previous page.
+        before (str, optional): Cursor returned as prev_cursor by the following page.
+        count_cap (int, optional): Upper bound for the lazy total count.
+
+    Returns:
+        KeysetPage: The page of items along with next/previous cursors.
+
+    Raises:
+        InvalidCursor: If after or before cannot be decoded.
+    """
+    cursor = after or before
+    offset = 0
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+            raise InvalidCursor("Cursor does not hold a result offset")
+        offset = values[0]
+
+    rows = list(query.skip(offset).limit(per_page + 1))
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    next_cursor = encode_cursor([offset + per_page]) if has_more else None
+    prev_cursor = encode_cursor([max(offset - per_page, 0)]) if offset > 0 else None
+    return KeysetPage(rows, query, next_cursor=next_cursor, prev_cursor=prev_cursor, count_cap=count_cap)
@@ -0,0 +1,162 @@
+# app/utils/user_loader.py
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import g, has_request_context
+
+
+class UserLoader:
+    """
+    An identity map and batching loader for User documents.
+
+    Within a request every user is loaded at most once: load() and
+    load_many() return the same User instance for the same id, including
+    users that turned out not to exist, and load_many() fetches all ids not
+    yet seen with a single $in query. Code that already holds a full User
+    (e.g. one it has just created) can hand it over with prime().
+
+    Only full documents go into the map, never projections or session
+    principals, so callers may modify and save the users they get back.
+
+    Serialisers that only show who someone is use the summary methods
+    instead (load_summaries(), resolve_summary(), resolve_summaries()), which
+    fetch just SUMMARY_FIELDS into a separate map. A summary is never handed
+    out where a full document is asked for; a full document already loaded
+    is reused as a summary.
+    """
+    SUMMARY_FIELDS = ('id', 'username', 'image_file')
+
+    def __init__(self):
+        self._users = {}
+        self._summaries = {}
+
+    @staticmethod
+    def normalise_id(user_id):
+        """Returns user_id as an ObjectId (accepting Users, DBRefs and strings), or None if invalid."""
+        user_id = getattr(user_id, 'id', user_id)
+        if user_id is None or isinstance(user_id, ObjectId):
+            return user_id
+        try:
+            return ObjectId(str(user_id))
+        except (InvalidId, TypeError):
+            return None
+
+    def prime(self, user):
+        if user is not None and user.id is not None and not getattr(user, '_is_session_principal', False):
+            self._users[user.id] = user
+        return user
+
+    def load(self, user_id):
+        user_id = self.normalise_id(user_id)
+        if user_id is None:
+            return None
+        if user_id not in self._users:
+            self.load_many([user_id])
+        return self._users[user_id]
+
+    def load_many(self, user_ids):
+        """Returns {ObjectId: User} for the given ids, querying only those not yet loaded."""
+        from app.models.users import User # Imported here; users.py imports modules that use this one
+
+        ids = {self.normalise_id(user_id) for user_id in user_ids} - {None}
+        missing = [user_id for user_id in ids if user_id not in self._users]
+        if missing:
+            for user in User.objects(id__in=missing):
+                self._users[user.id] = user
+            for user_id in missing:
+                self._users.setdefault(user_id, None)
+        return {user_id: self._users[user_id] for user_id in ids if self._users[user_id] is not None}
+
+    def resolve(self, document, field):
+        """
+        Returns the User a reference field on `document` points to, through the
+        identity map rather than by dereferencing the field.
+        """
+        from app.models.users import User
+
+        value = document._data.get(field)
+        if isinstance(value, User):
+            return self.prime(value)
+        return self.load(value)
+
+    def resolve_many(self, documents, *fields):
+        """
+        Loads every user referenced by `fields` across `documents` with one $in
+        query, so that later resolve() calls on them are served from the map.
+        """
+        return self.load_many(
+            document._data.get(field)
+            for document in documents
+            for field in fields
+            if document._data.get(field) is not None
+        )
+
+    def load_summaries(self, user_ids):
+        """
+        Returns {ObjectId: User} for the given ids, each a full document if one
+        is already loaded and otherwise a read-only projection to
+        SUMMARY_FIELDS. Ids not yet seen are fetched with one projected $in query.
+        """
+        from app.models.users import User
+
+        ids = {self.normalise_id(user_id) for user_id in user_ids} - {None}
+        missing = [user_id for user_id in ids if user_id not in self._users and user_id not in self._summaries]
+        if missing:
+            for user in User.objects(id__in=missing).only(*self.SUMMARY_FIELDS):
+                self._summaries[user.id] = user
+            for user_id in missing:
+                self._summaries.setdefault(user_id, None)
+        summaries = {}
+        for user_id in ids:
+            user = self._users.get(user_id) or self._summaries.get(user_id)
+            if user is not None:
+                summaries[user_id] = user
+        return summaries
+
+    def resolve_summary(self, document, field):
+        """Like resolve(), but returns a summary (see load_summaries) of the referenced user."""
+        from app.models.users import User
+
+        value = document._data.get(field)
+        if isinstance(value, User):
+            return value
+        user_id = self.normalise_id(value)
+        if user_id is None:
+            return None
+        return self.load_summaries([user_id]).get(user_id)
+
+    def resolve_summaries(self, documents, *fields):
+        """Like resolve_many(), but loads summaries (see load_summaries)."""
+        return self.load_summaries(
+            document._data.get(field)
+            for document in documents
+            for field in fields
+            if document._data.get(field) is not None
+        )
+
+    def clear(self):
+        self._users.clear()
+        self._summaries.clear()
+
+
+def get_user_loader():
+    """
+    Returns the UserLoader for the current request, creating it on first use.
+    Outside a request (scripts, background jobs) a fresh loader is returned
+    each time, so nothing is cached across unrelated units of work.
+    """
+    if not has_request_context():
+        return UserLoader()
+    loader = g.get('_user_loader')
+    if loader is None:
+        loader = g._user_loader = UserLoader()
+    return loader
+
+
+def get_user(user_id):
+    """Loads a User by id (or reference) at most once per request; None if it does not exist."""
+    return get_user_loader().load(user_id)
+
+
+def get_users(user_ids):
+    """Loads several Users with at most one query per request; returns {ObjectId: User}."""
+    return get_user_loader().load_many(user_ids)
@@ -3,13 +3,33 @@ import os
 from mongoengine import connect
 from dotenv import load_dotenv # Import load_dotenv
 from app.config import Config # Import Config class
+from app.utils.cache import cache_is_shared, require_shared_cache
 
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
+# SocketIO needs an async worker class ('eventlet' or 'gevent') to hold many
+# long-lived connections per worker. With more than one worker, set
+# SOCKETIO_MESSAGE_QUEUE so emits reach every worker, and have clients use the
+# websocket transport (or put a sticky-session load balancer in front), since
+# long-polling requests must keep hitting the worker that owns the session.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+if worker_class in ('eventlet', 'gevent'):
+    workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+else:
+    workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
 bind = "0.0.0.0:$PORT"
 accesslog = 'logs/app.log'
 errorlog = 'logs/app.log'
 
+def on_starting(server):
+    # Cache invalidation only reaches every worker at once through a shared backend
+    if workers > 1 and not cache_is_shared({'CACHE_TYPE': Config.CACHE_TYPE}):
+        if Config.REQUIRE_SHARED_CACHE:
+            require_shared_cache({'CACHE_TYPE': Config.CACHE_TYPE}, f"gunicorn is configured with {workers} workers")
+        server.log.warning(
+            f"CACHE_TYPE={Config.CACHE_TYPE} is local to each of the {workers} workers: cached pages and "
+            f"sessions may be up to {Config.LOCAL_GENERATION_TTL}s stale. Set CACHE_TYPE=RedisCache and CACHE_REDIS_URL to avoid this."
+        )
+
 def post_fork(server, worker):
     # Load environment variables for the worker process
     load_dotenv()
@@ -2,6 +2,13 @@ import click
 from flask.cli import FlaskGroup
 from app import create_app
 from scripts.process_payouts import process_payouts
+from scripts.manage_indexes import indexes
+from scripts.compile_saved_searches import compile_saved_searches
+from scripts.run_worker import run_worker
+from scripts.rebuild_conversations import rebuild_conversations
+from scripts.rollup_activities import activities
+from scripts.rebuild_timelines import rebuild_timelines
+from scripts.backfill_notification_counters import backfill_notification_counters
 
 # Create an application instance
 # app = create_app() # No longer needed here, FlaskGroup handles it
@@ -15,6 +22,13 @@ def cli():
 
 # Register commands
 cli.add_command(process_payouts, name='process-payouts')
+cli.add_command(indexes, name='indexes')
+cli.add_command(compile_saved_searches, name='compile-saved-searches')
+cli.add_command(run_worker, name='run-worker')
+cli.add_command(rebuild_conversations, name='rebuild-conversations')
+cli.add_command(activities, name='activities')
+cli.add_command(rebuild_timelines, name='rebuild-timelines')
+cli.add_command(backfill_notification_counters, name='backfill-notification-counters')
 
 if __name__ == '__main__':
     cli() 
\ No newline at end of file
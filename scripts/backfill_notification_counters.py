@@ -0,0 +1,29 @@
+import os
+import sys
+import click # Import click
+from flask.cli import with_appcontext
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.notification_counter import notification_counter
+
+
+@click.command()
+@with_appcontext
+def backfill_notification_counters():
+    """
+    Sets every user's unread notification counter from their unread
+    notifications. Run once before deploying code that reads the counter;
+    the hourly reconcile keeps it correct afterwards.
+    """
+    print("Backfilling unread notification counters...")
+    corrected = notification_counter.reconcile()
+    print(f"Set the counter for {corrected} users.")
+
+
+if __name__ == "__main__":
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        backfill_notification_counters()
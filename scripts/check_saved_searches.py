@@ -1,126 +1,192 @@
 import sys
 import os
-from datetime import datetime, timedelta
-from urllib.parse import parse_qs
+import socket
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
 from flask import url_for
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app import create_app
-from app.models.saved_search import SavedSearch
 from app.models.listings import Listing
 from app.models.notifications import Notification
-from app.extensions import db
+from app.services.notification_counter import notification_counter
+from app.models.users import User
+from app.models.saved_search import SavedSearch
+from app.models.watermarks import Watermark
 from app.services.email_service import send_email
+from app.services.saved_search_percolator import saved_search_percolator
+from mongoengine.queryset.visitor import Q
+
+WATERMARK_NAME = 'check_saved_searches'
+BATCH_SIZE = 500
+# How far back the very first run looks
+INITIAL_WINDOW = timedelta(hours=24)
+# Each run re-reads listings whose _id was generated this long before the
+# mark. An _id is assigned when the listing is inserted, but an insert that
+# was in flight during the previous run can still commit with a slightly
+# older _id; re-reading is safe because notifications are deduplicated.
+OVERLAP = timedelta(minutes=5)
+# Emails that failed are retried by later runs for this long
+EMAIL_RETRY_WINDOW = timedelta(days=1)
+
+
+def _listings_after(watermark, after_id=None):
+    """
+    Listings inserted after the watermark, in _id order so the mark can be
+    advanced batch by batch. `after_id` continues from the previous batch
+    of the same run.
+    """
+    if after_id is not None:
+        start = Q(id__gt=after_id)
+    elif watermark.last_id is None:
+        start = Q(id__gte=ObjectId.from_datetime(datetime.now(timezone.utc) - INITIAL_WINDOW))
+    else:
+        start = Q(id__gt=ObjectId.from_datetime(watermark.last_id.generation_time - OVERLAP))
+    return Listing.objects(start).order_by('id').limit(BATCH_SIZE)
+
+
+def _user_id(notification):
+    """The notified user's id, read from the stored reference without loading the user."""
+    ref = notification._data.get('user')
+    return getattr(ref, 'id', ref)
+
+
+def _send_emails(notifications):
+    """
+    Emails the owners of saved search notifications and marks each one whose
+    email went out (or whose user has no address) with payload.email_sent.
+    Users, searches and listings are loaded with one query per collection.
+    """
+    if not notifications:
+        return
+    users = {user.id: user for user in User.objects(id__in=list({_user_id(n) for n in notifications}))}
+    searches = {
+        str(search.id): search
+        for search in SavedSearch.objects(id__in=[n.payload.get('search_id') for n in notifications]).no_dereference()
+    }
+    listings = {
+        str(listing.id): listing
+        for listing in Listing.objects(id__in=[n.payload.get('listing_id') for n in notifications])
+    }
+    sent = []
+    for n in notifications:
+        user = users.get(_user_id(n))
+        search, listing = searches.get(n.payload.get('search_id')), listings.get(n.payload.get('listing_id'))
+        # Send email notification
+        if not user or not user.email or not search or not listing or send_email(
+            to=user.email,
+            subject=f"New Listing Match: {listing.title}",
+            template='emails/new_listing_match.html',
+            user=user,
+            search=search,
+            listing=listing,
+            listing_url=n.payload.get('listing_url')
+        ):
+            sent.append(n.id)
+    if sent:
+        Notification.objects(id__in=sent).update(set__payload__email_sent=True)
+
+
+def _resend_owed_emails():
+    """Retries the emails of recent notifications whose email did not go out."""
+    owed = list(Notification.objects(
+        notification_type='new_listing_match',
+        payload__email_sent=False,
+        timestamp__gte=datetime.utcnow() - EMAIL_RETRY_WINDOW
+    ).only('id', 'user', 'payload').no_dereference())
+    _send_emails(owed)
+    return len(owed)
+
+
+def _process_batch(listings):
+    """
+    Matches a batch of listings against the saved searches and writes one
+    notification per new (user, listing) pair. Returns the number created.
+
+    Matching follows the saved search percolator, i.e. the marketplace grid's
+    rules (see SavedSearchPercolator). Notifications are written before their
+    emails are sent and record the email's delivery (payload.email_sent), so
+    an email that fails is retried by the next run rather than lost behind
+    the notification dedupe.
+    """
+    matches = []
+    for listing in listings:
+        if not listing.is_available:
+            continue
+        for search in saved_search_percolator.percolate(listing, exclude_user_id=listing.owner_id):
+            matches.append((search, listing))
+    if not matches:
+        return 0
+
+    # One query for every notification already sent about listings in this batch
+    listing_ids = [str(listing.id) for listing in listings]
+    already_notified = {
+        (str(n.user.id), n.payload.get('listing_id'))
+        for n in Notification.objects(
+            notification_type='new_listing_match',
+            payload__listing_id__in=listing_ids
+        ).only('user', 'payload').no_dereference()
+    }
+
+    new_notifications = []
+    for search, listing in matches:
+        key = (str(search.user.id), str(listing.id))
+        if key in already_notified:
+            continue
+        already_notified.add(key)
+        listing_url = url_for('listings.listing_detail', listing_id=str(listing.id), _external=True)
+        message = f"New listing matching your saved search '{search.name}': {listing.title}. View here: {listing_url}"
+        new_notifications.append(Notification(
+            user=search.user.id,
+            message=message,
+            notification_type='new_listing_match',
+            payload={'listing_id': str(listing.id), 'search_id': str(search.id), 'listing_url': listing_url, 'email_sent': False}
+        ))
+
+    if not new_notifications:
+        return 0
+    ids = Notification.objects.insert(new_notifications, load_bulk=False)
+    for notification, notification_id in zip(new_notifications, ids):
+        notification.id = notification_id
+    notification_counter.incr_many(Counter(_user_id(notification) for notification in new_notifications))
+    _send_emails(new_notifications)
+    return len(new_notifications)
+
 
 def check_saved_searches():
     app = create_app()
     with app.app_context():
         print("Starting saved search check...")
 
-        # Define the time window for new listings (e.g., last 24 hours)
-        time_window = datetime.utcnow() - timedelta(hours=24)
-        new_listings = Listing.objects(date_posted__gte=time_window)
-
-        saved_searches = SavedSearch.objects.all()
-
-        for search in saved_searches:
-            user = search.user
-            search_params = parse_qs(search.search_query_params)
-            
-            # Convert list values from parse_qs to single values for easier comparison
-            for key, value in search_params.items():
-                if isinstance(value, list) and len(value) == 1:
-                    search_params[key] = value[0]
-                elif isinstance(value, list) and len(value) > 1:
-                    # For now, we'll just take the first, but this could be expanded
-                    search_params[key] = value[0]
-
-            matching_listings = []
-            for listing in new_listings:
-                is_match = True
-                
-                # Apply filters based on search_params
-                if 'uniform_type' in search_params and search_params['uniform_type'] != 'All':
-                    if listing.uniform_type != search_params['uniform_type']:
-                        is_match = False
-                
-                if 'size' in search_params and search_params['size'] != 'All':
-                    if listing.size != search_params['size']:
-                        is_match = False
-                
-                if 'school' in search_params and search_params['school'] != 'All':
-                    if listing.school_name != search_params['school']:
-                        is_match = False
-                
-                if 'brand' in search_params and search_params['brand'] != 'All':
-                    if listing.brand != search_params['brand']:
-                        is_match = False
-
-                if 'condition' in search_params and search_params['condition'] != 'All':
-                    if listing.condition != search_params['condition']:
-                        is_match = False
-
-                if 'color' in search_params and search_params['color'] != 'All':
-                    if listing.color != search_params['color']:
-                        is_match = False
-                
-                # Price range filtering
-                if 'min_price' in search_params and listing.price is not None:
-                    try:
-                        min_price = float(search_params['min_price'])
-                        if listing.price < min_price:
-                            is_match = False
-                    except ValueError:
-                        pass # Ignore invalid price values
-                
-                if 'max_price' in search_params and listing.price is not None:
-                    try:
-                        max_price = float(search_params['max_price'])
-                        if listing.price > max_price:
-                            is_match = False
-                    except ValueError:
-                        pass # Ignore invalid price values
-
-                if is_match:
-                    matching_listings.append(listing)
-            
-            for matched_listing in matching_listings:
-                # Check if notification already exists for this user, listing, and search
-                existing_notification = Notification.objects(
-                    user=user,
-                    notification_type='new_listing_match',
-                    payload__listing_id=str(matched_listing.id)
-                ).first()
-
-                if not existing_notification:
-                    listing_url = url_for('listings.listing_detail', listing_id=str(matched_listing.id), _external=True)
-                    message = f"New listing matching your saved search '{search.name}': {matched_listing.title}. View here: {listing_url}"
-                    notification = Notification(
-                        user=user,
-                        message=message,
-                        notification_type='new_listing_match',
-                        payload={'listing_id': str(matched_listing.id), 'search_id': str(search.id), 'listing_url': listing_url}
-                    )
-                    notification.save()
-                    print(f"Notification created for {user.username}: {message}")
-
-                    # Send email notification
-                    if user.email:
-                        send_email(
-                            to=user.email,
-                            subject=f"New Listing Match: {matched_listing.title}",
-                            template='emails/new_listing_match.html',
-                            user=user,
-                            search=search,
-                            listing=matched_listing,
-                            listing_url=listing_url
-                        )
-                else:
-                    print(f"Notification already exists for {user.username} for listing {matched_listing.id}")
-
-        print("Saved search check completed.")
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        watermark = Watermark.acquire(WATERMARK_NAME, owner)
+        if watermark is None:
+            print("Another saved search check is already running. Skipping.")
+            return
+
+        processed = created = 0
+        after_id = None
+        try:
+            retried = _resend_owed_emails()
+            if retried:
+                print(f"Retried {retried} saved search emails.")
+            while True:
+                listings = list(_listings_after(watermark, after_id))
+                if not listings:
+                    break
+                created += _process_batch(listings)
+                processed += len(listings)
+                # Only advance once the batch's notifications are written
+                after_id = listings[-1].id
+                if watermark.last_id is None or after_id > watermark.last_id:
+                    watermark.advance(after_id.generation_time.replace(tzinfo=None), after_id)
+        finally:
+            watermark.release()
+
+        print(f"Saved search check completed: {processed} listings checked, {created} notifications.")
 
 if __name__ == "__main__":
-    check_saved_searches()
\ No newline at end of file
+    check_saved_searches()
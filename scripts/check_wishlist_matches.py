@@ -1,5 +1,6 @@
 import sys
 import os
+from collections import Counter
 from datetime import datetime, timedelta
 from flask import url_for
 
@@ -10,8 +11,7 @@ from app import create_app
 from app.models.wishlist import WishlistItem
 from app.models.listings import Listing
 from app.models.notifications import Notification
-from app.services.notification_service import add_notification
-from app.extensions import db
+from app.services.notification_counter import notification_counter
 
 def check_wishlist_matches():
     app = create_app()
@@ -21,99 +21,63 @@ def check_wishlist_matches():
         # Define the time window for new listings (e.g., last 24 hours)
         # This ensures we only check against recently added listings
         time_window = datetime.utcnow() - timedelta(hours=24)
-        new_listings = Listing.objects(date_posted__gte=time_window).all()
+        # One projected query; 'user' comes back as the owner's ObjectId
+        listings_by_id = {
+            listing['_id']: listing
+            for listing in Listing.objects(date_posted__gte=time_window, is_available=True).only('id', 'title', 'user').as_pymongo()
+        }
+        if not listings_by_id:
+            print("No new listings. Wishlist match check completed.")
+            return
 
-        wishlist_items = WishlistItem.objects(notification_sent=False).all()
+        # Wishlist items saved against one of the new listings, via the listing index;
+        # each is matched with a single dict probe
+        matches = []
+        for wishlist_item in WishlistItem.objects(listing__in=list(listings_by_id)).only('id', 'user', 'listing').as_pymongo():
+            listing = listings_by_id.get(wishlist_item['listing'])
+            # Don't notify users about their own listings
+            if listing and listing.get('user') != wishlist_item['user']:
+                matches.append((wishlist_item, listing))
 
-        for wishlist_item in wishlist_items:
-            user = wishlist_item.user
-            
-            # Skip if the wishlist item is for a specific listing that already exists
-            if wishlist_item.listing and wishlist_item.listing in new_listings:
-                # If it's a specific listing and it's new, we should notify
-                # But we also need to ensure we don't notify the listing owner about their own listing
-                if wishlist_item.listing.user.id != user.id:
-                    # Check if notification already exists for this user and specific listing
-                    existing_notification = Notification.objects(
-                        user=user,
-                        notification_type='wishlist_match',
-                        payload__wishlist_item_id=str(wishlist_item.id),
-                        payload__listing_id=str(wishlist_item.listing.id)
-                    ).first()
+        if not matches:
+            print("No wishlist matches. Wishlist match check completed.")
+            return
 
-                    if not existing_notification:
-                        listing_url = url_for('listings.listing_detail', listing_id=str(wishlist_item.listing.id), _external=True)
-                        message = f"A listing matching your wishlist is available: {wishlist_item.listing.title}. View here: {listing_url}"
-                        
-                        send_notification(
-                            user=user,
-                            message=message,
-                            notification_type='wishlist_match',
-                            payload={
-                                'wishlist_item_id': str(wishlist_item.id),
-                                'listing_id': str(wishlist_item.listing.id),
-                                'listing_url': listing_url
-                            }
-                        )
-                        wishlist_item.notification_sent = True
-                        wishlist_item.save()
-                        print(f"Notification created for {user.username} for specific listing: {wishlist_item.listing.title}")
-                continue # Move to the next wishlist item
+        # One query for every wishlist notification already sent about these listings
+        already_notified = {
+            (n['user'], n['payload'].get('wishlist_item_id'), n['payload'].get('listing_id'))
+            for n in Notification.objects(
+                notification_type='wishlist_match',
+                payload__listing_id__in=[str(listing_id) for listing_id in listings_by_id]
+            ).only('user', 'payload').as_pymongo()
+        }
 
-            # For general wishlist items (not tied to a specific listing)
-            matching_listings = []
-            for listing in new_listings:
-                # Skip if the listing is by the same user who created the wishlist
-                if listing.user.id == user.id:
-                    continue
+        new_notifications = []
+        notified_now = []
+        for wishlist_item, listing in matches:
+            key = (wishlist_item['user'], str(wishlist_item['_id']), str(listing['_id']))
+            if key in already_notified:
+                continue
+            already_notified.add(key)
+            notified_now.append(key)
+            listing_url = url_for('listings.listing_detail', listing_id=str(listing['_id']), _external=True)
+            message = f"A new listing matching your wishlist is available: {listing['title']}. View here: {listing_url}"
+            new_notifications.append(Notification(
+                user=wishlist_item['user'],
+                message=message,
+                notification_type='wishlist_match',
+                payload={
+                    'wishlist_item_id': str(wishlist_item['_id']),
+                    'listing_id': str(listing['_id']),
+                    'listing_url': listing_url
+                }
+            ))
 
-                is_match = True
-                
-                if wishlist_item.item_category and listing.uniform_type != wishlist_item.item_category:
-                    is_match = False
-                if wishlist_item.item_type and listing.item_type != wishlist_item.item_type:
-                    is_match = False
-                if wishlist_item.item_size and listing.size != wishlist_item.item_size:
-                    is_match = False
-                if wishlist_item.school_name and listing.school_name != wishlist_item.school_name:
-                    is_match = False
-                if wishlist_item.condition and listing.condition != wishlist_item.condition:
-                    is_match = False
-                
-                if is_match:
-                    matching_listings.append(listing)
-            
-            for matched_listing in matching_listings:
-                # Check if notification already exists for this user, wishlist item, and matched listing
-                existing_notification = Notification.objects(
-                    user=user,
-                    notification_type='wishlist_match',
-                    payload__wishlist_item_id=str(wishlist_item.id),
-                    payload__listing_id=str(matched_listing.id)
-                ).first()
+        if new_notifications:
+            Notification.objects.insert(new_notifications, load_bulk=False)
+            notification_counter.incr_many(Counter(user_id for user_id, _, _ in notified_now))
 
-                if not existing_notification:
-                    listing_url = url_for('listings.listing_detail', listing_id=str(matched_listing.id), _external=True)
-                    message = f"A new listing matching your wishlist is available: {matched_listing.title}. View here: {listing_url}"
-                    
-                    add_notification(
-                        user_id=user.id,
-                        message=message,
-                        notification_type='wishlist_match',
-                        payload={
-                            'wishlist_item_id': str(wishlist_item.id),
-                            'listing_id': str(matched_listing.id),
-                            'listing_url': listing_url
-                        }
-                    )
-                    # We don't set wishlist_item.notification_sent = True here
-                    # because a general wishlist item can match multiple listings over time.
-                    # The notification check above prevents duplicates for the same match.
-                    print(f"Notification created for {user.username} for general wishlist item: {matched_listing.title}")
-                else:
-                    print(f"Notification already exists for {user.username} for wishlist item {wishlist_item.id} and listing {matched_listing.id}")
-
-        print("Wishlist match check completed.")
+        print(f"Wishlist match check completed: {len(listings_by_id)} new listings, {len(matches)} matches, {len(new_notifications)} notifications.")
 
 if __name__ == "__main__":
     check_wishlist_matches()
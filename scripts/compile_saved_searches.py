@@ -0,0 +1,26 @@
+import os
+import sys
+import click # Import click
+from flask.cli import with_appcontext
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.saved_search_percolator import saved_search_percolator
+
+
+@click.command()
+@click.option('--all', 'recompile_all', is_flag=True, help='Recompile every saved search, not only uncompiled ones.')
+@with_appcontext
+def compile_saved_searches(recompile_all):
+    """Compiles saved searches into the indexed predicates used for percolation."""
+    print("Compiling saved searches...")
+    updated = saved_search_percolator.compile_all(only_missing=not recompile_all)
+    print(f"Compiled {updated} saved searches.")
+
+
+if __name__ == "__main__":
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        compile_saved_searches()
@@ -0,0 +1,91 @@
+import os
+import sys
+import click # Import click
+from flask.cli import with_appcontext
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models.listings import Listing
+from app.models.messages import Message
+from app.models.notifications import Notification
+from app.models.wishlist import WishlistItem
+from app.models.saved_search import SavedSearch
+from app.models.user_activity import UserActivity
+from app.models.follows import Follow
+from app.models.users import User
+from app.models.jobs import Job
+from app.models.conversations import Conversation
+from app.models.activity_rollups import ActivityRollup
+from app.models.timelines import Timeline
+
+# Models whose declared meta['indexes'] make up the index plan
+INDEXED_MODELS = [Listing, Message, Notification, WishlistItem, SavedSearch, UserActivity, Follow, User, Job, Conversation, ActivityRollup, Timeline]
+
+
+def _format_index(index):
+    return ', '.join(f"{field}: {direction}" for field, direction in index)
+
+
+@click.group()
+def indexes():
+    """Build, diff and audit the MongoDB indexes declared on the models."""
+    pass
+
+
+@indexes.command()
+@with_appcontext
+def build():
+    """Creates every declared index. Builds run in the background so collections stay writable."""
+    for model in INDEXED_MODELS:
+        collection = model._get_collection_name()
+        print(f"Ensuring indexes on {collection}...")
+        try:
+            model.ensure_indexes()
+        except Exception as e:
+            print(f"Failed to build indexes on {collection}: {e}")
+    print("Index build requests submitted.")
+
+
+@indexes.command()
+@with_appcontext
+def diff():
+    """Compares the declared index plan with the indexes that exist in the database."""
+    in_sync = True
+    for model in INDEXED_MODELS:
+        collection = model._get_collection_name()
+        result = model.compare_indexes()
+        for index in result['missing']:
+            in_sync = False
+            print(f"[missing] {collection}: ({_format_index(index)})")
+        for index in result['extra']:
+            in_sync = False
+            print(f"[extra]   {collection}: ({_format_index(index)})")
+    if in_sync:
+        print("Database indexes match the declared plan.")
+
+
+@indexes.command()
+@with_appcontext
+def unused():
+    """Lists indexes that have served no operations since the server started, via $indexStats."""
+    found = False
+    for model in INDEXED_MODELS:
+        collection = model._get_collection()
+        for stats in collection.aggregate([{'$indexStats': {}}]):
+            if stats['name'] == '_id_':
+                continue
+            ops = stats.get('accesses', {}).get('ops', 0)
+            since = stats.get('accesses', {}).get('since')
+            if ops == 0:
+                found = True
+                print(f"[unused] {collection.name}.{stats['name']} (no operations since {since})")
+    if not found:
+        print("Every index has been used since the server started.")
+
+
+if __name__ == "__main__":
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        indexes()
@@ -0,0 +1,29 @@
+import os
+import sys
+import click # Import click
+from flask.cli import with_appcontext
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models.conversations import Conversation
+from app.models.messages import Message
+
+
+@click.command()
+@with_appcontext
+def rebuild_conversations():
+    """Rebuilds the inbox conversation summaries and backfills message pair keys."""
+    print("Backfilling message pair keys...")
+    updated = Message.backfill_pair_keys()
+    print(f"Backfilled {updated} messages.")
+    print("Rebuilding conversation summaries...")
+    written = Conversation.rebuild_all()
+    print(f"Rebuilt {written} conversations.")
+
+
+if __name__ == "__main__":
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        rebuild_conversations()
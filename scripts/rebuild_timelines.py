@@ -0,0 +1,29 @@
+import os
+import sys
+import click # Import click
+from flask.cli import with_appcontext
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models.follows import Follow
+from app.services.timeline_service import timeline_service
+
+
+@click.command()
+@with_appcontext
+def rebuild_timelines():
+    """Fills follower timelines from existing follows. Safe to re-run; listings already present are skipped."""
+    print("Backfilling follower timelines...")
+    follows = written = 0
+    for row in Follow.objects.only('follower', 'followed').as_pymongo():
+        written += timeline_service.backfill(row['follower'], row['followed'])
+        follows += 1
+    print(f"Processed {follows} follows, wrote {written} timelines.")
+
+
+if __name__ == "__main__":
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        rebuild_timelines()
@@ -0,0 +1,90 @@
+import os
+import sys
+from datetime import datetime, timedelta
+import click # Import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models.activity_rollups import ActivityRollup
+from app.models.user_activity import UserActivity
+
+
+@click.group()
+def activities():
+    """Roll up user activity and manage its retention."""
+    pass
+
+
+@activities.command()
+@click.option('--days', default=2, show_default=True, help='Number of days to roll up, ending with today.')
+@with_appcontext
+def rollup(days):
+    """Recomputes the daily activity rollups for the last N days (including today)."""
+    today = ActivityRollup.day_start(datetime.utcnow())
+    start = today - timedelta(days=max(days, 1) - 1)
+    print(f"Rolling up activity from {start.date()} to {today.date()}...")
+    # Days whose raw events may already have expired are left as they are
+    retention = timedelta(days=current_app.config['ACTIVITY_RETENTION_DAYS'])
+    written = ActivityRollup.rollup(start, today + timedelta(days=1), retention=retention)
+    print(f"Wrote {written} rollup rows.")
+
+
+def _raw_activities():
+    """
+    The user_activities collection without mongoengine's automatic index
+    creation, which would otherwise run before the retention index is fixed up.
+    """
+    return UserActivity._get_db()[UserActivity._get_collection_name()]
+
+
+@activities.command('apply-retention')
+@click.option('--chunk-days', default=30, show_default=True, help='Days rolled up per aggregation while back-filling.')
+@with_appcontext
+def apply_retention(chunk_days):
+    """
+    Sets the TTL of the user_activities timestamp index to ACTIVITY_RETENTION_DAYS.
+    The whole history is rolled up first, so nothing is lost when the TTL
+    starts deleting raw events. Converts an existing plain timestamp index in
+    place (collMod), or creates it.
+    """
+    seconds = current_app.config['ACTIVITY_RETENTION_DAYS'] * 24 * 3600
+    collection = _raw_activities()
+    existing = next(
+        (index for index in collection.list_indexes() if list(index['key'].items()) == [('timestamp', 1)]),
+        None
+    )
+    # Once a TTL is active, days it has started deleting must not be rolled up again
+    active = existing.get('expireAfterSeconds') if existing is not None else None
+    retention = timedelta(seconds=active) if active is not None else None
+
+    oldest = collection.find_one({'timestamp': {'$ne': None}}, {'timestamp': 1}, sort=[('timestamp', 1)])
+    if oldest is not None:
+        start = ActivityRollup.day_start(oldest['timestamp'])
+        end = ActivityRollup.day_start(datetime.utcnow()) + timedelta(days=1)
+        print(f"Back-filling rollups from {start.date()}...")
+        written = 0
+        while start < end:
+            chunk_end = min(start + timedelta(days=max(chunk_days, 1)), end)
+            written += ActivityRollup.rollup(start, chunk_end, retention=retention)
+            start = chunk_end
+        print(f"Wrote {written} rollup rows.")
+
+    if existing is None:
+        collection.create_index([('timestamp', 1)], expireAfterSeconds=seconds, background=True)
+        print(f"Created TTL index on user_activities.timestamp ({seconds}s).")
+        return
+    collection.database.command('collMod', collection.name, index={
+        'keyPattern': {'timestamp': 1},
+        'expireAfterSeconds': seconds
+    })
+    print(f"Set TTL of user_activities.{existing['name']} to {seconds}s.")
+
+
+if __name__ == "__main__":
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        activities()
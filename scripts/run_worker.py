@@ -0,0 +1,39 @@
+import os
+import sys
+import click # Import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.job_queue import job_queue
+# Importing the job modules registers their tasks with the queue
+import app.services.listing_jobs  # noqa: F401
+
+
+@click.command()
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to wait between polls when the queue is empty.')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty instead of polling forever.')
+@with_appcontext
+def run_worker(poll_interval, burst):
+    """Runs background jobs from the Mongo-backed job queue."""
+    # Jobs emit SocketIO events (e.g. saved search alerts); from a separate
+    # process they only reach clients through the message queue
+    if not current_app.config.get('SOCKETIO_MESSAGE_QUEUE'):
+        raise click.ClickException(
+            "SOCKETIO_MESSAGE_QUEUE is not set, so real-time notifications sent by jobs "
+            "would never reach a client. Point it at the broker the web workers use."
+        )
+    print("Starting job worker...")
+    try:
+        job_queue.work(poll_interval=poll_interval, burst=burst)
+    except KeyboardInterrupt:
+        print("Job worker stopped.")
+
+
+if __name__ == "__main__":
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        run_worker()
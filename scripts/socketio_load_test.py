@@ -0,0 +1,101 @@
+import os
+import sys
+import threading
+import time
+import click # Import click
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import socketio
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+@click.command()
+@click.option('--url', default='http://localhost:5000', show_default=True, help='Base URL of the deployment under test.')
+@click.option('--clients', default=500, show_default=True, help='Number of concurrent SocketIO connections to open.')
+@click.option('--hold', default=30, show_default=True, help='Seconds to keep every connection open.')
+@click.option('--ramp', default=10, show_default=True, help='Seconds over which connections are opened.')
+@click.option('--message-queue', default=None, help='Broker URL (SOCKETIO_MESSAGE_QUEUE) used to broadcast a probe event through every worker.')
+@click.option('--channel', default='flask-socketio', show_default=True, help='SOCKETIO_CHANNEL of the deployment.')
+def socketio_load_test(url, clients, hold, ramp, message_queue, channel):
+    """
+    Opens many concurrent SocketIO connections against a running deployment
+    and reports how many it sustained, connect latency and, when a message
+    queue is given, how many clients received a broadcast published through
+    the queue (which checks fan-out across workers).
+    """
+    lock = threading.Lock()
+    connect_times = []
+    failures = []
+    received = set()
+    connected_clients = []
+
+    def open_client(index):
+        client = socketio.Client(reconnection=False)
+
+        @client.on('load_test_probe')
+        def on_probe(data):
+            with lock:
+                received.add(index)
+
+        started = time.perf_counter()
+        try:
+            # Websocket only: no long-polling, so no sticky sessions are needed
+            client.connect(url, transports=['websocket'], wait_timeout=10)
+        except Exception as e:
+            with lock:
+                failures.append(str(e))
+            return
+        with lock:
+            connect_times.append(time.perf_counter() - started)
+            connected_clients.append(client)
+
+    print(f"Opening {clients} connections to {url} over {ramp}s...")
+    threads = []
+    delay = ramp / clients if clients else 0
+    for index in range(clients):
+        thread = threading.Thread(target=open_client, args=(index,), daemon=True)
+        thread.start()
+        threads.append(thread)
+        time.sleep(delay)
+    for thread in threads:
+        thread.join()
+
+    alive = sum(1 for client in connected_clients if client.connected)
+    print(f"Connected {len(connect_times)}/{clients} ({len(failures)} failed), {alive} still connected.")
+    print(f"Connect latency: p50 {_percentile(connect_times, 0.5) * 1000:.0f} ms, "
+          f"p95 {_percentile(connect_times, 0.95) * 1000:.0f} ms, p99 {_percentile(connect_times, 0.99) * 1000:.0f} ms")
+
+    if message_queue:
+        # A write-only emitter publishes through the broker, exactly like an
+        # emit from a web or job worker; every server worker delivers it to
+        # the clients it holds.
+        from flask_socketio import SocketIO
+        emitter = SocketIO(message_queue=message_queue, channel=channel)
+        emitter.emit('load_test_probe', {'sent_at': time.time()})
+        time.sleep(5)
+        print(f"Broadcast through the message queue reached {len(received)}/{alive} clients.")
+
+    print(f"Holding connections for {hold}s...")
+    time.sleep(hold)
+    dropped = sum(1 for client in connected_clients if not client.connected)
+    print(f"Dropped during hold: {dropped}")
+
+    for client in connected_clients:
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+    if failures:
+        print(f"First failure: {failures[0]}")
+
+
+if __name__ == "__main__":
+    socketio_load_test()